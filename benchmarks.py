@@ -0,0 +1,1280 @@
+"""
+Benchmarks for ScriptLauncher's storage and replay paths.
+
+Usage:
+    python benchmarks.py            # run every benchmark
+    python benchmarks.py codec ...  # run only the named benchmarks
+
+Nothing here touches the user's presets; benchmarks that need a presets
+folder point utils.PRESETS_FOLDER at a temporary directory of synthetic files.
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def make_recording(event_count, seed=0):
+    """ Builds a synthetic recording shaped like a real one (mostly mouse_move). """
+    rng = random.Random(seed)
+    events = []
+    t = time.time()
+    x, y = 800, 450
+    pressed_key = None
+    for i in range(event_count):
+        t += rng.uniform(0.004, 0.012) # ~125 Hz pointer polling
+        roll = rng.random()
+        if roll < 0.94:
+            x = min(max(x + rng.randint(-6, 6), 0), 1919)
+            y = min(max(y + rng.randint(-6, 6), 0), 1079)
+            events.append({'type': 'mouse_move', 'x': x, 'y': y, 'time': t})
+        elif roll < 0.96:
+            pressed = i % 2 == 0
+            events.append({'type': 'mouse_click', 'x': x, 'y': y, 'button': 'Button.left',
+                           'pressed': pressed, 'time': t})
+        elif roll < 0.97:
+            events.append({'type': 'mouse_scroll', 'x': x, 'y': y, 'dx': 0,
+                           'dy': rng.choice((-1, 1)), 'time': t})
+        elif pressed_key is None:
+            pressed_key = rng.choice(("'a'", "'z'", "Key.shift", "Key.enter", "'1'"))
+            events.append({'type': 'key_press', 'key': pressed_key, 'time': t})
+        else:
+            events.append({'type': 'key_release', 'key': pressed_key, 'time': t})
+            pressed_key = None
+    events.append({'type': 'void', 'time': t + 0.1})
+    return events
+
+
+def _timeit(func, repeat=3):
+    """ Returns the best wall time of func() over a few runs, in seconds. """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _fmt_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+@contextlib.contextmanager
+def temp_presets_folder():
+    """ Points utils at an empty temporary presets folder for the duration. """
+    import utils
+    root = tempfile.mkdtemp(prefix="slaunch_bench_")
+    folder = os.path.join(root, "presets")
+    os.makedirs(folder)
+    original = (utils.PRESETS_FOLDER, utils.PRESET_INDEX_FILE, utils.preset_state,
+                utils.PRESET_DB_FILE, utils._preset_db, utils.PRESET_BACKEND)
+    utils.PRESETS_FOLDER = folder
+    utils.PRESET_INDEX_FILE = os.path.join(root, "preset_index.json")
+    utils.preset_state = utils.PresetStateStore(os.path.join(root, "preset_state.jsonl"))
+    utils.PRESET_DB_FILE = os.path.join(root, "presets.sqlite3")
+    utils._preset_db = None
+    utils.PRESET_BACKEND = "files"
+    try:
+        yield folder
+    finally:
+        if utils._preset_db is not None:
+            utils._preset_db.close()
+        (utils.PRESETS_FOLDER, utils.PRESET_INDEX_FILE, utils.preset_state,
+         utils.PRESET_DB_FILE, utils._preset_db, utils.PRESET_BACKEND) = original
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_codec():
+    """ record= section: indented JSON vs packed encoding (size and parse time). """
+    from event_codec import decode_record_section, write_record_section
+
+    print(f"{'events':>9} | {'json size':>10} {'packed size':>11} | "
+          f"{'json parse':>10} {'packed parse':>12} | {'json write':>10} {'packed write':>12}")
+    for count in (10_000, 100_000, 1_000_000):
+        events = make_recording(count)
+
+        def write_json():
+            buf = io.StringIO()
+            json.dump(events, buf, indent=2)
+            buf.write("\n")
+            return buf.getvalue()
+
+        def write_packed():
+            buf = io.StringIO()
+            write_record_section(buf, events, compression=False)
+            return buf.getvalue()
+
+        json_text = write_json()
+        packed_text = write_packed()
+        assert decode_record_section(packed_text) == events, "packed encoding is not lossless"
+        assert decode_record_section(json_text) == events
+
+        repeat = 1 if count >= 1_000_000 else 3
+        json_parse = _timeit(lambda: decode_record_section(json_text), repeat)
+        packed_parse = _timeit(lambda: decode_record_section(packed_text), repeat)
+        json_write = _timeit(write_json, repeat)
+        packed_write = _timeit(write_packed, repeat)
+        print(f"{count:>9} | {_fmt_size(len(json_text)):>10} {_fmt_size(len(packed_text)):>11} | "
+              f"{json_parse * 1000:>8.1f}ms {packed_parse * 1000:>10.1f}ms | "
+              f"{json_write * 1000:>8.1f}ms {packed_write * 1000:>10.1f}ms")
+
+
+def _check_stale_handle():
+    """ A handle from before its file was rewritten must return the new recording, not its cached one. """
+    import utils
+
+    with temp_presets_folder(), contextlib.redirect_stdout(io.StringIO()):
+        preset = {'title': "Macro", 'type': 'recorded', 'icon': 'none', 'how_many': 1,
+                  'recorded_events': make_recording(3000)}
+        utils.save_preset(preset)
+        old_handle = utils.load_preset(preset['file_name'])['recorded_events']
+        assert len(old_handle.load()) == 3001 # Now cached
+        utils.save_preset(dict(preset, recorded_events=make_recording(100, seed=1)))
+        assert len(old_handle.load()) == 101, "stale recording returned from the cache"
+        utils._recorded_events_cache.clear()
+
+
+def bench_lazy_load():
+    """ load_presets startup cost with long recordings: eager decode vs lazy handles. """
+    import utils
+
+    preset_count, event_count = 24, 20_000
+    with temp_presets_folder():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(preset_count):
+                utils.save_preset({'title': f"Macro {i}", 'type': 'recorded', 'icon': 'none',
+                                   'recorded_events': make_recording(event_count, seed=i), 'how_many': 1})
+
+            def lazy():
+                return utils.load_presets()
+
+            def eager():
+                # What the old load_presets did: every recording decoded and kept
+                presets = utils.load_presets()
+                for preset in presets:
+                    preset['recorded_events'] = utils.get_recorded_events(preset)
+                return presets
+
+            def play_each():
+                # Lazy load, then use every recording once (e.g. replaying them all)
+                presets = utils.load_presets()
+                for preset in presets:
+                    utils.get_recorded_events(preset)
+                return presets
+
+            def measure(func, cache_limit):
+                utils.set_recorded_events_cache_limit(cache_limit)
+                utils._recorded_events_cache.clear()
+                start = time.perf_counter()
+                func()
+                elapsed = time.perf_counter() - start
+                utils._recorded_events_cache.clear()
+                tracemalloc.start()
+                result = func()
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                del result
+                return elapsed, current
+
+            lazy_time, lazy_mem = measure(lazy, 4)
+            eager_time, eager_mem = measure(eager, None)
+            capped_time, capped_mem = measure(play_each, 4)
+        utils.set_recorded_events_cache_limit(4)
+        utils._recorded_events_cache.clear()
+
+    print(f"{preset_count} recorded presets x {event_count} events")
+    print(f"  startup, lazy handles          : {lazy_time * 1000:8.1f}ms  resident {_fmt_size(lazy_mem)}")
+    print(f"  startup, eager decode (old)    : {eager_time * 1000:8.1f}ms  resident {_fmt_size(eager_mem)}")
+    print(f"  lazy + use all, LRU cap of 4   : {capped_time * 1000:8.1f}ms  resident {_fmt_size(capped_mem)}")
+    _check_stale_handle()
+
+
+def write_synthetic_presets(folder, count, recorded_events=200):
+    """ Writes a mix of standard, on/off and recorded presets straight to disk. """
+    from event_codec import write_record_section
+    recording = make_recording(recorded_events)
+    for i in range(count):
+        with open(os.path.join(folder, f"preset{i + 1}.slaunch"), "w", encoding='utf-8') as f:
+            f.write(f"title=Preset {i}\n")
+            kind = i % 3
+            if kind == 0:
+                f.write("type=standard\nicon=002-terminal.png\n")
+                f.write(f"script=\necho 'preset {i}'\ncd ~/projects && make build\n")
+            elif kind == 1:
+                f.write("type=on_off\nicon=006-vpn.png\n")
+                f.write("script_on=\nsudo systemctl start vpn\nscript_off=\nsudo systemctl stop vpn\n")
+                f.write("on_off_state=False\n")
+            else:
+                f.write("type=recorded\nicon=018-bot.png\nscript=\nhow_many=1\nrecord=\n")
+                write_record_section(f, recording)
+
+
+def bench_index():
+    """ load_presets with the metadata index: no index vs cold (build) vs warm. """
+    import utils
+
+    print(f"{'presets':>8} | {'no index':>9} {'cold':>9} {'warm':>9} {'1 changed':>10}")
+    for count in (1_000, 10_000):
+        with temp_presets_folder() as folder:
+            write_synthetic_presets(folder, count)
+            with contextlib.redirect_stdout(io.StringIO()):
+                def no_index():
+                    original = utils._load_preset_index, utils._save_preset_index
+                    utils._load_preset_index, utils._save_preset_index = (lambda: {}), (lambda entries: None)
+                    try:
+                        return utils.load_presets()
+                    finally:
+                        utils._load_preset_index, utils._save_preset_index = original
+
+                def cold():
+                    if os.path.exists(utils.PRESET_INDEX_FILE):
+                        os.remove(utils.PRESET_INDEX_FILE)
+                    return utils.load_presets()
+
+                def touch_one():
+                    path = os.path.join(folder, "preset1.slaunch")
+                    with open(path, "a", encoding='utf-8') as f:
+                        f.write("# edited\n")
+                    return utils.load_presets()
+
+                no_index_time = _timeit(no_index)
+                cold_time = _timeit(cold)
+                warm_time = _timeit(utils.load_presets)
+                changed_time = _timeit(touch_one)
+                assert len(utils.load_presets()) == count
+        print(f"{count:>8} | {no_index_time * 1000:>7.1f}ms {cold_time * 1000:>7.1f}ms "
+              f"{warm_time * 1000:>7.1f}ms {changed_time * 1000:>8.1f}ms")
+
+
+def bench_grid():
+    """ Per-edit latency of the preset grid with 600 presets: full reload vs incremental. """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication # type: ignore
+    import utils
+    import main
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    count = 600
+    with temp_presets_folder() as folder:
+        write_synthetic_presets(folder, count, recorded_events=50)
+        with contextlib.redirect_stdout(io.StringIO()):
+            window = main.MainWindow()
+            app.processEvents()
+
+            def full_reload():
+                window.load_and_display_presets()
+                app.processEvents() # Let deleteLater() run
+
+            def edit_first():
+                data = utils.load_preset("preset1.slaunch")
+                data['title'] += "!"
+                utils.save_preset(data)
+                window.handle_preset_saved(data)
+                app.processEvents()
+
+            def add_and_delete():
+                ok, data = utils.save_preset({'title': "New", 'type': 'standard', 'icon': 'none',
+                                              'script': "echo new"})
+                window.handle_preset_saved(data) # Inserted near the front ("preset601" < "preset61")
+                app.processEvents()
+                utils.delete_preset(data['file_name'])
+                window.remove_preset(data['file_name'])
+                app.processEvents()
+
+            reload_time = _timeit(full_reload, 5)
+            edit_time = _timeit(edit_first, 5)
+            add_delete_time = _timeit(add_and_delete, 5)
+            assert len(window.preset_widgets) == count
+            window.close()
+            window.deleteLater()
+            app.processEvents()
+
+    print(f"{count} presets")
+    print(f"  full reload (old path for every edit) : {reload_time * 1000:8.1f}ms")
+    print(f"  edit one preset in place              : {edit_time * 1000:8.1f}ms")
+    print(f"  insert + delete one preset            : {add_delete_time * 1000:8.1f}ms")
+
+
+def bench_toggle():
+    """ Cost of one on/off toggle: rewriting the preset file vs appending to the state journal. """
+    import utils
+
+    with temp_presets_folder():
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok, preset = utils.save_preset({'title': "VPN", 'type': 'on_off', 'icon': 'none',
+                                            'script_on': "sudo systemctl start vpn\n" * 50,
+                                            'script_off': "sudo systemctl stop vpn\n" * 50})
+            toggles = 2000
+
+            def rewrite_file():
+                for i in range(toggles):
+                    preset['on_off_state'] = i % 2 == 0
+                    utils.save_preset(preset)
+
+            def journal():
+                for i in range(toggles):
+                    utils.set_on_off_state(preset['file_name'], i % 2 == 0)
+
+            rewrite_time = _timeit(rewrite_file, 1)
+            journal_time = _timeit(journal, 1)
+    print(f"  save_preset per toggle (old)  : {rewrite_time / toggles * 1e6:8.1f}us")
+    print(f"  state journal per toggle      : {journal_time / toggles * 1e6:8.1f}us")
+
+
+def _legacy_parse(preset_path, file_name):
+    """ The pre-streaming load_presets body: readlines(), += per line, joined JSON lines. """
+    with open(preset_path, "r", encoding='utf-8') as f:
+        lines = f.readlines()
+    preset_data = {'file_name': file_name, 'title': lines[0].strip().replace("title=", ""),
+                   'type': lines[1].strip().replace("type=", ""), 'icon': lines[2].strip().replace("icon=", ""),
+                   'script': "", 'script_on': "", 'script_off': "", 'on_off_state': False,
+                   'recorded_events': None, 'how_many': 1}
+    current_section = None
+    json_lines = []
+    in_record_section = False
+    for line in lines[3:]:
+        stripped_line = line.strip()
+        if stripped_line == "record=":
+            in_record_section = True
+            current_section = None
+            continue
+        if in_record_section:
+            json_lines.append(line)
+            continue
+        if stripped_line == "script=":
+            current_section = "script"
+            continue
+        elif stripped_line == "script_on=":
+            current_section = "script_on"
+            continue
+        elif stripped_line == "script_off=":
+            current_section = "script_off"
+            continue
+        elif stripped_line.startswith("on_off_state="):
+            preset_data['on_off_state'] = stripped_line.replace("on_off_state=", "") == "True"
+            current_section = None
+            continue
+        elif stripped_line.startswith("how_many="):
+            preset_data['how_many'] = int(stripped_line.replace("how_many=", ""))
+            current_section = None
+            continue
+        if current_section:
+            preset_data[current_section] += line
+    for name in ('script', 'script_on', 'script_off'):
+        preset_data[name] = preset_data[name].rstrip('\n')
+    if preset_data['type'] == "recorded" and json_lines:
+        preset_data['recorded_events'] = json.loads("".join(json_lines))
+    return preset_data
+
+
+# Script lines that look like the replay settings of recorded presets
+_SETTING_LIKE_SCRIPT_LINES = (
+    "speed=10",
+    "max_idle_gap=3",
+    "loop_gap=2",
+    "postprocess=repair",
+)
+
+
+def _check_setting_like_scripts():
+    """ Scripts assigning shell variables named like preset settings must survive a save/parse round trip. """
+    import utils
+    from slaunch_format import new_preset_data, parse_preset_stream
+
+    script = "\n".join(("echo start",) + _SETTING_LIKE_SCRIPT_LINES + ("echo $speed",))
+    for preset_type, fields in (("standard", ('script',)), ("on_off", ('script_on', 'script_off'))):
+        preset = new_preset_data(f"{preset_type}.slaunch")
+        preset['type'] = preset_type
+        for field in fields:
+            preset[field] = script
+        text = io.StringIO()
+        utils._write_preset(text, preset, None)
+        parsed, _ = parse_preset_stream(io.BytesIO(text.getvalue().encode('utf-8')), preset['file_name'])
+        for field in fields:
+            assert parsed[field] == script, f"{preset_type} {field} was cut short: {parsed[field]!r}"
+        assert parsed['speed'] == preset['speed'] and parsed['max_idle_gap'] == preset['max_idle_gap']
+        assert parsed['loop_gap'] == preset['loop_gap'] and parsed['postprocess'] == preset['postprocess']
+
+
+def bench_parser():
+    """ Full .slaunch parse: legacy readlines/+= parser vs the streaming reader. """
+    from event_codec import write_record_section
+    from slaunch_format import parse_preset_stream
+
+    root = tempfile.mkdtemp(prefix="slaunch_bench_")
+    try:
+        recording = make_recording(100_000)
+        script = "".join(f"echo 'step {i}' && ./run_task --id {i} --verbose\n" for i in range(50_000))
+        cases = []
+
+        path = os.path.join(root, "big_script.slaunch")
+        with open(path, "w", encoding='utf-8') as f:
+            f.write(f"title=Big script\ntype=standard\nicon=none\nscript=\n{script}")
+        cases.append(("standard, 50k-line script", path, True))
+
+        path = os.path.join(root, "json_record.slaunch")
+        with open(path, "w", encoding='utf-8') as f:
+            f.write("title=JSON\ntype=recorded\nicon=none\nscript=\nhow_many=1\nrecord=\n")
+            json.dump(recording, f, indent=2)
+        cases.append(("recorded, 100k events (JSON)", path, True))
+
+        path = os.path.join(root, "packed_record.slaunch")
+        with open(path, "w", encoding='utf-8') as f:
+            f.write("title=Packed\ntype=recorded\nicon=none\nscript=\nhow_many=1\nrecord=\n")
+            write_record_section(f, recording)
+        cases.append(("recorded, 100k events (packed)", path, False)) # Legacy can't read it
+
+        def streaming(path):
+            with open(path, "rb") as f:
+                return parse_preset_stream(f, os.path.basename(path), read_record=True)[0]
+
+        for label, path, legacy_readable in cases:
+            stream_time = _timeit(lambda: streaming(path))
+            legacy_text = "       n/a"
+            if legacy_readable:
+                legacy = _legacy_parse(path, os.path.basename(path))
+                parsed = streaming(path)
+                assert {key: parsed[key] for key in legacy} == legacy # Fields added since are not in the legacy dict
+                legacy_time = _timeit(lambda: _legacy_parse(path, os.path.basename(path)))
+                legacy_text = f"{legacy_time * 1000:8.1f}ms"
+            print(f"  {label:<32}: legacy {legacy_text}  streaming {stream_time * 1000:8.1f}ms")
+        _check_setting_like_scripts()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_parallel():
+    """ Serial vs thread-pool load_presets (index disabled), local disk and simulated network latency. """
+    import utils
+
+    original_index = utils._load_preset_index, utils._save_preset_index
+    original_read = utils._read_preset_file
+
+    def slow_read(preset_path, file_name):
+        time.sleep(0.002) # ~2 ms per open, like an SMB/NFS home directory
+        return original_read(preset_path, file_name)
+
+    print(f"{'presets':>8} {'latency':>8} | {'serial':>9} {'parallel':>9} {'auto':>9} {'workers':>7}")
+    utils._load_preset_index, utils._save_preset_index = (lambda: {}), (lambda entries: None)
+    try:
+        for count in (10, 50, 200, 1_000):
+            with temp_presets_folder() as folder:
+                write_synthetic_presets(folder, count)
+                for latency in (False, True):
+                    utils._read_preset_file = slow_read if latency else original_read
+                    try:
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            serial_time = _timeit(lambda: utils.load_presets(parallel=False))
+                            parallel_time = _timeit(lambda: utils.load_presets(parallel=True))
+                            auto_time = _timeit(utils.load_presets)
+                            assert [p['file_name'] for p in utils.load_presets(parallel=True)] == \
+                                [p['file_name'] for p in utils.load_presets(parallel=False)]
+                    finally:
+                        utils._read_preset_file = original_read
+                    print(f"{count:>8} {'2ms' if latency else '-':>8} | {serial_time * 1000:>7.1f}ms "
+                          f"{parallel_time * 1000:>7.1f}ms {auto_time * 1000:>7.1f}ms "
+                          f"{utils._load_worker_count(count):>7}")
+    finally:
+        utils._load_preset_index, utils._save_preset_index = original_index
+
+
+def bench_store():
+    """ .slaunch folder (with index) vs SQLite store: migrate, load, search, bulk edit. """
+    import utils
+
+    print(f"{'presets':>8} {'backend':>8} | {'migrate':>9} {'load':>9} {'search':>9} {'bulk 100':>9}")
+    for count in (1_000, 10_000):
+        with temp_presets_folder() as folder:
+            write_synthetic_presets(folder, count)
+            targets = [f"preset{i}.slaunch" for i in range(1, 101)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                utils.load_presets() # Build the metadata index first
+                results = {'files': ['-']}
+                for backend in ('files', 'sqlite'):
+                    utils.PRESET_BACKEND = backend
+                    if backend == 'sqlite':
+                        start = time.perf_counter()
+                        utils.get_preset_db() # Opens + migrates the folder
+                        results[backend] = [f"{(time.perf_counter() - start) * 1000:7.1f}ms"]
+                    load_time = _timeit(utils.load_presets)
+                    search_time = _timeit(lambda: utils.search_presets("preset 12", "recorded"))
+                    bulk_time = _timeit(lambda: utils.bulk_update_presets(targets, {'icon': 'none'}), repeat=1)
+                    assert len(utils.load_presets()) == count
+                    results[backend] += [f"{t * 1000:7.1f}ms" for t in (load_time, search_time, bulk_time)]
+            for backend, cells in results.items():
+                print(f"{count:>8} {backend:>8} | " + " ".join(f"{c:>9}" for c in cells))
+
+
+def bench_compression():
+    """ Recording section size, save time and load time: JSON vs packed vs packed+zlib/lzma. """
+    import utils
+    import event_codec
+
+    formats = [
+        ('json', None),
+        ('packed', False),
+        ('packed+zlib', 'zlib'),
+        ('packed+lzma', 'lzma'),
+        ('json+zlib', 'json+zlib'),
+    ]
+    print(f"{'events':>9} {'format':>12} | {'file size':>10} {'save':>9} {'list':>9} {'replay load':>11}")
+    for count in (10_000, 100_000, 1_000_000):
+        events = make_recording(count)
+        unpackable = [dict(e, extra=1) for e in events] # Forces the JSON fallback
+        repeat = 1 if count >= 1_000_000 else 3
+        for label, compression in formats:
+            with temp_presets_folder() as folder:
+                preset = {'title': "Macro", 'type': 'recorded', 'icon': 'none', 'how_many': 1,
+                          'file_name': "macro.slaunch"}
+                if label == 'json':
+                    preset['recorded_events'] = events
+                    original_min = event_codec.PACKED_MIN_EVENTS
+                    event_codec.PACKED_MIN_EVENTS = float('inf') # Old format: always indented JSON
+                elif label == 'json+zlib':
+                    preset['recorded_events'] = unpackable
+                else:
+                    preset['recorded_events'] = events
+                original_compression = event_codec.RECORD_COMPRESSION
+                event_codec.RECORD_COMPRESSION = compression if compression in ('zlib', 'lzma') else (
+                    'zlib' if label == 'json+zlib' else None)
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        save_time = _timeit(lambda: utils.save_preset(dict(preset)), repeat)
+                        utils.set_recorded_events_cache_limit(0) # Measure real decodes
+                        list_time = _timeit(lambda: utils.load_preset("macro.slaunch"), repeat)
+                        load_time = _timeit(lambda: utils.get_recorded_events(utils.load_preset("macro.slaunch")), repeat)
+                        loaded = utils.get_recorded_events(utils.load_preset("macro.slaunch"))
+                        assert loaded == preset['recorded_events'], f"{label} is not lossless"
+                finally:
+                    utils.set_recorded_events_cache_limit(4)
+                    event_codec.RECORD_COMPRESSION = original_compression
+                    if label == 'json':
+                        event_codec.PACKED_MIN_EVENTS = original_min
+                size = os.path.getsize(os.path.join(folder, "macro.slaunch"))
+            print(f"{count:>9} {label:>12} | {_fmt_size(size):>10} {save_time * 1000:>7.1f}ms "
+                  f"{list_time * 1000:>7.2f}ms {load_time * 1000:>9.1f}ms")
+
+
+def bench_archive():
+    """ Onboarding 300 presets: one file at a time + full reload vs one streamed bundle import. """
+    import utils
+    import preset_archive
+
+    count = 300
+    with temp_presets_folder() as source:
+        write_synthetic_presets(source, count)
+        bundle = os.path.join(os.path.dirname(source), "library.zip")
+        with contextlib.redirect_stdout(io.StringIO()):
+            export_time = _timeit(lambda: preset_archive.export_library(utils.load_presets(), bundle), repeat=1)
+        bundle_size = os.path.getsize(bundle)
+        files = sorted(os.path.join(source, f) for f in os.listdir(source) if f.endswith(".slaunch"))
+
+        for backend in ('files', 'sqlite'):
+            with temp_presets_folder():
+                utils.PRESET_BACKEND = backend
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    for path in files: # Old flow: one import, then a full reload, per preset
+                        utils.import_preset_file(path)
+                        utils.load_presets()
+                    one_by_one = time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    imported, skipped = preset_archive.import_library(bundle)
+                    loaded = [utils.load_preset(name) for name in imported] # What the grid gets
+                    bulk = time.perf_counter() - start
+                    assert len(loaded) == count and not skipped
+            print(f"  {backend:>6}: one by one {one_by_one * 1000:8.1f}ms   bundle {bulk * 1000:7.1f}ms")
+    print(f"  export of {count} presets to .zip: {export_time * 1000:.1f}ms ({_fmt_size(bundle_size)})")
+
+
+class _NullController:
+    """ Stand-in for the pynput controllers: accepts every call, does nothing. """
+    position = (0, 0)
+
+    def press(self, target):
+        pass
+
+    def release(self, target):
+        pass
+
+    def scroll(self, dx, dy):
+        pass
+
+
+def _legacy_play_sequence(events, speed_factor=1.0, stop_event=None):
+    """ The pre-plan replay loop: per-event dict lookups, button/key parsing, time subtraction. """
+    from recording_module import MouseController, KeyboardController, Button, _parse_key, _release_keys_buttons
+    mouse_controller = MouseController()
+    keyboard_controller = KeyboardController()
+    if not events:
+        return
+
+    # Store original start time for relative calculations
+    recording_start_time = events[0]['time']
+    replay_start_time = time.time() # Wall clock time when replay sequence begins
+
+    replay_pressed_keys = set()
+    replay_pressed_buttons = set()
+
+    # --- Moved the finally block inside the try ---
+    try:
+        for event in events:
+            # --- Check stop event at the beginning of each event processing ---
+            if stop_event and stop_event.is_set():
+                print("Stop signal detected during sequence playback (start of loop).")
+                break # Exit the loop immediately
+
+            # Calculate the target execution time for this event relative to replay start
+            time_since_recording_start = event['time'] - recording_start_time
+            scaled_delay = time_since_recording_start / speed_factor
+            target_execution_time = replay_start_time + scaled_delay
+
+            # Wait until the target time, checking stop_event
+            current_time = time.time()
+            wait_time = target_execution_time - current_time
+
+            if wait_time > 0:
+                interrupted = False
+                if stop_event:
+                    # Wait for the calculated duration OR until stop_event is set
+                    interrupted = stop_event.wait(timeout=wait_time)
+                else:
+                    time.sleep(wait_time) # Fallback if no stop_event provided
+
+                if interrupted:
+                    print("Stop signal detected during delay.")
+                    break # Exit loop if stopped during wait
+
+            # --- Check stop event again right before executing the action ---
+            if stop_event and stop_event.is_set():
+                 print("Stop signal detected before event execution.")
+                 break
+
+            # --- Execute Event ---
+            try:
+                if event['type'] == 'mouse_move':
+                    mouse_controller.position = (event['x'], event['y'])
+                elif event['type'] == 'mouse_click':
+                    try:
+                        button_str = event['button'].split('.')[-1]
+                        button = getattr(Button, button_str)
+                    except (AttributeError, IndexError):
+                        print(f"Warning: Unknown button type '{event['button']}' in recording. Skipping.")
+                        continue
+
+                    if event['pressed']:
+                        mouse_controller.press(button)
+                        replay_pressed_buttons.add(button)
+                    else:
+                        # Check if button is actually pressed before releasing
+                        if button in replay_pressed_buttons:
+                            mouse_controller.release(button)
+                            replay_pressed_buttons.discard(button)
+                        else:
+                            # This can happen if the recording started with a button already down
+                            # or if the stop happened between press/release. Just log it.
+                            print(f"Warning: Attempted to release button {button} which wasn't tracked as pressed.")
+
+                elif event['type'] == 'key_press':
+                     key = _parse_key(event['key'])
+                     if key:
+                         keyboard_controller.press(key)
+                         replay_pressed_keys.add(event['key']) # Store the string representation
+                elif event['type'] == 'key_release':
+                     key = _parse_key(event['key'])
+                     if key:
+                         # Check if key is actually pressed before releasing
+                         if event['key'] in replay_pressed_keys:
+                             keyboard_controller.release(key)
+                             replay_pressed_keys.discard(event['key'])
+                         else:
+                             print(f"Warning: Attempted to release key {event['key']} which wasn't tracked as pressed.")
+
+                elif event['type'] == 'mouse_scroll':
+                    mouse_controller.scroll(event['dx'], event['dy'])
+                elif event['type'] == 'void':
+                    pass # Do nothing for void events
+            except Exception as e:
+                # Log error but continue replay if possible? Or break? For now, log and continue.
+                print(f"Error replaying event: {event}. Error: {e}")
+                # Consider adding 'break' here if errors should stop the sequence
+
+    finally:
+        # Ensure keys/buttons pressed *during this sequence* are released at the end,
+        # even if stopped prematurely by the stop_event or an error.
+        print("_play_sequence finally block: Releasing potentially stuck keys/buttons...")
+        _release_keys_buttons(keyboard_controller, mouse_controller, replay_pressed_keys, replay_pressed_buttons)
+
+
+def bench_replay():
+    """ Per-event replay dispatch: legacy dict/string loop vs precompiled replay plan (no waits, null controllers). """
+    import recording_module
+
+    original = recording_module.MouseController, recording_module.KeyboardController
+    recording_module.MouseController = recording_module.KeyboardController = _NullController
+    try:
+        print(f"{'events':>9} | {'compile':>9} | {'legacy':>12} {'plan':>12} | {'speedup':>7}")
+        typing = [{'type': 'key_press' if i % 2 == 0 else 'key_release', 'key': "Key.shift" if i % 4 < 2 else "'a'",
+                   'time': 1000.0 + i * 0.01} for i in range(100_000)]
+        for label, events in (("10000", make_recording(10_000)), ("100000", make_recording(100_000)),
+                              ("typing", typing)):
+            count = len(events)
+            speed = 1e12 # Every target time is already past: measures dispatch only
+            with contextlib.redirect_stdout(io.StringIO()):
+                compile_time = _timeit(lambda: recording_module.compile_replay_plan(events))
+                plan = recording_module.compile_replay_plan(events)
+                legacy_time = _timeit(lambda: _legacy_play_sequence(events, speed))
+                plan_time = _timeit(lambda: recording_module._play_plan(plan, speed))
+            print(f"{label:>9} | {compile_time * 1000:>7.1f}ms | "
+                  f"{legacy_time / count * 1e9:>8.0f}ns/ev {plan_time / count * 1e9:>8.0f}ns/ev | "
+                  f"{legacy_time / plan_time:>6.1f}x")
+    finally:
+        recording_module.MouseController, recording_module.KeyboardController = original
+
+
+class _TimestampController(_NullController):
+    """ Null controller that records when each mouse move lands (perf_counter_ns). """
+    landed = []
+
+    @property
+    def position(self):
+        return (0, 0)
+
+    @position.setter
+    def position(self, value):
+        _TimestampController.landed.append(time.perf_counter_ns())
+
+
+def bench_scheduler():
+    """ Replay timing of a fast drag (1 move every 2 ms): legacy wall-clock waits vs monotonic hybrid scheduler. """
+    import threading
+    import recording_module
+
+    count, interval = 500, 0.002
+    drag = [{'type': 'mouse_move', 'x': i, 'y': i, 'time': 1000.0 + i * interval} for i in range(count)]
+    plan = recording_module.compile_replay_plan(drag)
+    expected_ns = [round(i * interval * 1e9) for i in range(count)]
+
+    def lateness(landed):
+        late = sorted(max(0, (t - landed[0]) - e) / 1000 for t, e in zip(landed, expected_ns))
+        return sum(late) / len(late), late[int(len(late) * 0.99)], late[-1]
+
+    runs = [
+        ("legacy time.time + wait", lambda stop: _legacy_play_sequence(drag, 1.0, stop)),
+        ("plan, sleep only", lambda stop: recording_module._play_plan(plan, 1.0, stop, spin_budget=0)),
+        ("plan, 2 ms spin", lambda stop: recording_module._play_plan(plan, 1.0, stop, spin_budget=0.002)),
+    ]
+    original = recording_module.MouseController, recording_module.KeyboardController
+    recording_module.MouseController = _TimestampController
+    recording_module.KeyboardController = _NullController
+    try:
+        print(f"{'scheduler':>24} | {'duration':>9} {'mean late':>10} {'p99 late':>9} {'max late':>9} | {'cpu':>6} | {'stop':>7}")
+        for label, run in runs:
+            _TimestampController.landed = []
+            stop = threading.Event()
+            with contextlib.redirect_stdout(io.StringIO()):
+                cpu_start, wall_start = time.process_time(), time.perf_counter()
+                run(stop)
+                wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+                mean_late, p99_late, max_late = lateness(_TimestampController.landed)
+
+                # Stop responsiveness: set the stop event mid-replay, time until the pass returns
+                stop = threading.Event()
+                stopped_at = []
+                timer = threading.Timer(0.3, lambda: (stopped_at.append(time.perf_counter()), stop.set()))
+                timer.start()
+                run(stop)
+                stop_latency = time.perf_counter() - stopped_at[0]
+            print(f"{label:>24} | {wall * 1000:>7.0f}ms {mean_late:>8.0f}us {p99_late:>7.0f}us {max_late:>7.0f}us | "
+                  f"{cpu / wall * 100:>5.0f}% | {stop_latency * 1000:>5.2f}ms")
+        print(f"  (recorded duration {(count - 1) * interval * 1000:.0f}ms)")
+    finally:
+        recording_module.MouseController, recording_module.KeyboardController = original
+
+
+def bench_telemetry():
+    """ Dispatch cost of an all-due 100k-event plan with and without telemetry, plus summary/export time. """
+    import tempfile
+    import recording_module
+
+    events = make_recording(100_000, seed=15)
+    base = events[0]['time']
+    for event in events:
+        event['time'] = base # Everything is due at once: measures pure per-event overhead
+    plan = recording_module.compile_replay_plan(events)
+    n = len(plan)
+
+    original = recording_module.MouseController, recording_module.KeyboardController
+    recording_module.MouseController = recording_module.KeyboardController = _NullController
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            off = _timeit(lambda: recording_module._play_plan(plan))
+            runs = []
+
+            def play_with_telemetry():
+                runs.append(recording_module.ReplayTelemetry(n)) # Preallocated before the pass, as in replay_events
+                recording_module._play_plan(plan, telemetry=runs[-1])
+            on = _timeit(play_with_telemetry)
+            telemetry = runs[-1]
+    finally:
+        recording_module.MouseController, recording_module.KeyboardController = original
+    print(f"dispatch, telemetry off: {off * 1e9 / n:>6.0f} ns/event")
+    print(f"dispatch, telemetry on:  {on * 1e9 / n:>6.0f} ns/event ({telemetry.count} samples)")
+
+    summary = _timeit(telemetry.summary)
+    with tempfile.TemporaryDirectory() as tmp:
+        to_csv = _timeit(lambda: telemetry.to_csv(os.path.join(tmp, "t.csv")), repeat=1)
+        to_json = _timeit(lambda: telemetry.to_json(os.path.join(tmp, "t.json")), repeat=1)
+        sizes = os.path.getsize(os.path.join(tmp, "t.csv")), os.path.getsize(os.path.join(tmp, "t.json"))
+    print(f"summary: {summary * 1000:.0f} ms, CSV export: {to_csv * 1000:.0f} ms ({_fmt_size(sizes[0])}), "
+          f"JSON export: {to_json * 1000:.0f} ms ({_fmt_size(sizes[1])})")
+
+
+def make_high_rate_recording(seconds, hz=1000, seed=0):
+    """ A 1 kHz gaming-mouse style session: smooth strokes between clicks, a key press now and then. """
+    rng = random.Random(seed)
+    events = []
+    t, x, y = 1000.0, 800.0, 450.0
+    while t < 1000.0 + seconds:
+        # One stroke: constant-ish velocity with a little hand jitter, then a click
+        vx, vy = rng.uniform(-0.6, 0.6), rng.uniform(-0.6, 0.6)
+        for _ in range(rng.randint(200, 1500)):
+            t += 1 / hz
+            x = min(max(x + vx + rng.uniform(-0.3, 0.3), 0), 1919)
+            y = min(max(y + vy + rng.uniform(-0.3, 0.3), 0), 1079)
+            events.append({'type': 'mouse_move', 'x': round(x), 'y': round(y), 'time': t})
+        for pressed in (True, False):
+            t += 0.08
+            events.append({'type': 'mouse_click', 'x': round(x), 'y': round(y), 'button': 'Button.left',
+                           'pressed': pressed, 'time': t})
+        if rng.random() < 0.2:
+            events.append({'type': 'key_press', 'key': "'a'", 'time': t + 0.05})
+            events.append({'type': 'key_release', 'key': "'a'", 'time': t + 0.1})
+            t += 0.1
+    events.append({'type': 'void', 'time': t + 0.1})
+    return events
+
+
+def bench_decimation():
+    """ Mouse-move decimation of a 5-minute 1 kHz session: event count, saved size and time per setting. """
+    import move_decimation
+
+    events = make_high_rate_recording(300, seed=16)
+    size = move_decimation.record_section_size(events)
+    print(f"{'setting':>28} | {'events':>8} {'saved size':>11} | {'time':>7}")
+    print(f"{'none':>28} | {len(events):>8} {_fmt_size(size):>11} | {'-':>7}")
+    settings = [
+        ("time buckets 4 ms", dict(bucket_ms=4, tolerance_px=0)),
+        ("RDP 1 px", dict(bucket_ms=0, tolerance_px=1)),
+        ("4 ms + RDP 1 px (default)", dict()),
+        ("8 ms + RDP 2 px", dict(bucket_ms=8, tolerance_px=2)),
+    ]
+    for label, kwargs in settings:
+        elapsed = _timeit(lambda: move_decimation.decimate_moves(events, **kwargs), repeat=1)
+        out = move_decimation.decimate_moves(events, **kwargs)
+        print(f"{label:>28} | {len(out):>8} {_fmt_size(move_decimation.record_section_size(out)):>11} | "
+              f"{elapsed * 1000:>5.0f}ms")
+
+
+def bench_retime():
+    """ Replay duration of a recording with user hesitations under the per-preset speed/idle-gap settings. """
+    import recording_module
+
+    rng = random.Random(17)
+    events = make_recording(20_000, seed=17)
+    shift = 0.0
+    for event in events:
+        if event['type'] == 'mouse_click' and rng.random() < 0.3:
+            shift += rng.uniform(2.0, 8.0) # The user stopping to think before a click
+        event['time'] += shift
+    plan = recording_module.compile_replay_plan(events)
+
+    settings = [
+        ("1x (as recorded)", 1.0, 0.0),
+        ("2x", 2.0, 0.0),
+        ("1x, max idle 0.5 s", 1.0, 0.5),
+        ("2x, max idle 0.5 s", 2.0, 0.5),
+        ("as fast as possible", 0.0, 0.0),
+    ]
+    print(f"{'setting':>22} | {'duration':>9} | {'retime':>7}")
+    for label, speed, gap in settings:
+        elapsed = _timeit(lambda: recording_module.retime_plan(plan, speed, gap))
+        retimed = recording_module.retime_plan(plan, speed, gap)
+        print(f"{label:>22} | {retimed.steps[-1][0] / 1e9:>8.1f}s | {elapsed * 1000:>5.1f}ms")
+
+
+def bench_repeat():
+    """ Iterations per minute of a short 30 ms macro: legacy per-pass loop vs the repetition engine. """
+    import recording_module
+
+    events = [{'type': 'mouse_move', 'x': i, 'y': i, 'time': 1000.0 + i * 0.001} for i in range(28)]
+    events += [{'type': 'mouse_click', 'x': 27, 'y': 27, 'button': 'Button.left', 'pressed': pressed,
+                'time': 1000.028 + pressed * 0.001} for pressed in (True, False)]
+    plan = recording_module.compile_replay_plan(events)
+
+    def legacy(count):
+        # The pre-engine loop: a fresh pass (and controllers) per repetition, then a fixed 0.5 s sleep
+        for i in range(count):
+            _legacy_play_sequence(events)
+            if i < count - 1:
+                time.sleep(0.5)
+
+    runs = [
+        ("legacy loop, 0.5 s sleep", 6, legacy),
+        ("engine, default 0.5 s gap", 6, lambda count: recording_module.replay_events(plan, count)),
+        ("engine, 0.1 s gap", 30, lambda count: recording_module.replay_events(plan, count, loop_gap=0.1)),
+        ("engine, no gap", 200, lambda count: recording_module.replay_events(plan, count, loop_gap=0)),
+    ]
+    original = recording_module.MouseController, recording_module.KeyboardController
+    recording_module.MouseController = recording_module.KeyboardController = _NullController
+    try:
+        print(f"{'mode':>26} | {'passes':>6} {'wall':>8} | {'iterations/min':>14}")
+        for label, count, run in runs:
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                run(count)
+                wall = time.perf_counter() - start
+            print(f"{label:>26} | {count:>6} {wall:>7.2f}s | {count / wall * 60:>14.0f}")
+        print(f"  (macro length {(events[-1]['time'] - events[0]['time']) * 1000:.0f} ms: "
+              f"at most {60 / (events[-1]['time'] - events[0]['time']):.0f} iterations/min)")
+    finally:
+        recording_module.MouseController, recording_module.KeyboardController = original
+
+
+def _quiet_null_controllers():
+    """ Replay process initializer for benchmarks: no real input, no log output. """
+    import recording_module
+    recording_module.MouseController = recording_module.KeyboardController = _NullController
+    sys.stdout = open(os.devnull, "w")
+
+
+def _gui_load(stop_event):
+    """ Pure-Python busy work standing in for a preset reload/theme switch holding the GIL. """
+    data = [{'title': f"Preset {i}", 'type': 'recorded', 'how_many': i} for i in range(2000)]
+    while not stop_event.is_set():
+        json.loads(json.dumps(data))
+
+
+def bench_isolation():
+    """ Replay timing jitter with a busy GUI thread: in-process thread vs replay process, plus plan handoff cost. """
+    import pickle
+    import threading
+    import recording_module
+    import replay_process
+
+    # Handoff of a one-minute 1 kHz recording: the child needs a replay-ready plan either way
+    long_events = make_high_rate_recording(60, hz=1000, seed=20)
+    long_plan = recording_module.compile_replay_plan(long_events)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plan.timeline")
+
+        def timeline_handoff():
+            replay_process.write_timeline(long_plan, path)
+            replay_process.read_timeline(path)
+        handoff = _timeit(timeline_handoff)
+        size = os.path.getsize(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        pickled = _timeit(lambda: recording_module.compile_replay_plan(pickle.loads(pickle.dumps(long_events))))
+    print(f"plan handoff ({len(long_plan)} steps): timeline file {handoff * 1000:.0f} ms ({_fmt_size(size)}), "
+          f"pickled event dicts + compile {pickled * 1000:.0f} ms ({_fmt_size(len(pickle.dumps(long_events)))})")
+
+    events = make_high_rate_recording(4, hz=1000, seed=20)
+    plan = recording_module.compile_replay_plan(events)
+
+    replayer = replay_process.ProcessReplayer(initializer=_quiet_null_controllers)
+    original = recording_module.MouseController, recording_module.KeyboardController
+    recording_module.MouseController = recording_module.KeyboardController = _NullController
+    modes = [
+        ("in-process, idle GUI", recording_module.replay_events, False),
+        ("in-process, busy GUI", recording_module.replay_events, True),
+        ("replay process, idle GUI", replayer.replay_events, False),
+        ("replay process, busy GUI", replayer.replay_events, True),
+    ]
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            replayer.replay_events(recording_module.compile_replay_plan(events[:10])) # Starts the process
+        print(f"{'mode':>26} | {'p50':>7} {'p95':>7} {'p99':>7} {'max':>8}  (lateness, us)")
+        for label, replay, busy in modes:
+            telemetry = recording_module.ReplayTelemetry()
+            stop = threading.Event()
+            load = threading.Thread(target=_gui_load, args=(stop,), daemon=True)
+            if busy:
+                load.start()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    replay(plan, 1, telemetry=telemetry)
+            finally:
+                stop.set()
+                if busy:
+                    load.join()
+            summary = telemetry.summary()
+            print(f"{label:>26} | {summary['p50_lateness_us']:>7.0f} {summary['p95_lateness_us']:>7.0f} "
+                  f"{summary['p99_lateness_us']:>7.0f} {summary['max_lateness_us']:>8.0f}")
+    finally:
+        recording_module.MouseController, recording_module.KeyboardController = original
+        replayer.shutdown()
+
+
+class _SyntheticMouseListener:
+    """ Stand-in for pynput's mouse listener: reports a move every millisecond, due at x + y / 1e6 seconds. """
+
+    def __init__(self, on_move=None, on_click=None, on_scroll=None):
+        self.on_move = on_move
+        self._stop = None
+
+    def __enter__(self):
+        import threading
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        due = time.monotonic()
+        while not self._stop.is_set():
+            due += 0.001
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.on_move(int(due), (due - int(due)) * 1e6) # Whole seconds and microseconds survive float32
+
+
+class _NullListener:
+    def __init__(self, **callbacks):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def stop(self):
+        pass
+
+
+def _synthetic_listeners():
+    """ Recorder process initializer for benchmarks: synthetic 1 kHz mouse, no log output. """
+    import recording_module
+    recording_module.MouseListener, recording_module.KeyboardListener = _SyntheticMouseListener, _NullListener
+    sys.stdout = open(os.devnull, "w")
+
+
+def bench_recorder_isolation():
+    """ Capture timestamp delay of a 1 kHz mouse with a busy GUI thread: in-process listeners vs recorder process. """
+    import threading
+    import recording_module
+    import recorder_process
+
+    original = recording_module.MouseListener, recording_module.KeyboardListener
+    recording_module.MouseListener, recording_module.KeyboardListener = _SyntheticMouseListener, _NullListener
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_recorder = recorder_process.ProcessRecorder(initializer=_synthetic_listeners)
+            process_recorder.start_recording() # Waits for the process to come up, then discarded
+            time.sleep(2)
+            process_recorder.stop_recording()
+        print(f"{'mode':>26} | {'events':>6} | {'p50':>6} {'p99':>6} {'max':>7} (delay, us) | bunched")
+        for label, recorder, busy in (
+                ("in-process, idle GUI", recording_module.Recorder(), False),
+                ("in-process, busy GUI", recording_module.Recorder(), True),
+                ("recorder process, idle GUI", process_recorder, False),
+                ("recorder process, busy GUI", process_recorder, True)):
+            stop = threading.Event()
+            load = threading.Thread(target=_gui_load, args=(stop,), daemon=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                recorder.start_recording()
+                time.sleep(0.5)
+                if busy:
+                    load.start()
+                time.sleep(3)
+                stop.set()
+                recorder.stop_recording()
+                if busy:
+                    load.join()
+            moves = [e for e in recorder.events if e['type'] == 'mouse_move']
+            delays = sorted((e['time'] - e['x'] - e['y'] / 1e6) * 1e6 for e in moves)
+            # Moves stamped less than 0.25 ms after the previous one although they are 1 ms apart
+            bunched = sum(1 for a, b in zip(moves, moves[1:]) if b['time'] - a['time'] < 0.00025)
+            print(f"{label:>26} | {len(moves):>6} | {delays[len(delays) // 2]:>6.0f} "
+                  f"{delays[int(len(delays) * 0.99)]:>6.0f} {delays[-1]:>7.0f}             | "
+                  f"{bunched / max(len(moves) - 1, 1):>6.1%}")
+    finally:
+        recording_module.MouseListener, recording_module.KeyboardListener = original
+        recorder_process.shutdown_recorder_host()
+
+
+class _LegacyCaptureRecorder:
+    """ The pre-buffer capture path: one dict per event appended to a list. """
+
+    def __init__(self):
+        self.events = []
+
+    def _on_mouse_move(self, x, y):
+        self.events.append({'type': 'mouse_move', 'x': x, 'y': y, 'time': time.monotonic()})
+
+    def _on_mouse_click(self, x, y, button, pressed):
+        self.events.append({'type': 'mouse_click', 'x': x, 'y': y, 'button': str(button), 'pressed': pressed,
+                            'time': time.monotonic()})
+
+    def _on_key_press(self, key):
+        self.events.append({'type': 'key_press', 'key': str(key), 'time': time.monotonic()})
+
+    def _on_key_release(self, key):
+        self.events.append({'type': 'key_release', 'key': str(key), 'time': time.monotonic()})
+
+
+def _feed_capture(recorder, count):
+    """ Calls the listener callbacks like a long session would: mostly moves, a click or key every 50 events. """
+    from pynput.keyboard import Key
+    from pynput.mouse import Button
+    move, click = recorder._on_mouse_move, recorder._on_mouse_click
+    press, release = recorder._on_key_press, recorder._on_key_release
+    i = 0
+    while i < count:
+        for j in range(48):
+            move(800 + j, 450 - j)
+        if i % 100:
+            click(848, 402, Button.left, True)
+            click(848, 402, Button.left, False)
+        else:
+            press(Key.shift)
+            release(Key.shift)
+        i += 50
+
+
+def bench_capture():
+    """ Per-callback cost, GC time and peak memory of a synthetic 1M-event recording: dicts vs packed capture buffer. """
+    import gc
+    import recording_module
+
+    count = 1_000_000
+    gc_time = [0.0, 0.0] # total, longest
+
+    def gc_callback(phase, info, started=[0.0]):
+        if phase == "start":
+            started[0] = time.perf_counter()
+        else:
+            pause = time.perf_counter() - started[0]
+            gc_time[0] += pause
+            gc_time[1] = max(gc_time[1], pause)
+
+    def capturing_recorder():
+        recorder = recording_module.Recorder()
+        recorder._reset_capture_state() # What the recording thread does before the listeners start
+        return recorder
+
+    print(f"{'capture':>14} | {'per event':>9} | {'GC total':>8} {'longest':>8} | {'peak memory':>11} | to events")
+    for label, make in (("dict per event", _LegacyCaptureRecorder), ("packed rows", capturing_recorder)):
+        recorder = make()
+        gc_time[0] = gc_time[1] = 0.0
+        gc.callbacks.append(gc_callback)
+        try:
+            start = time.perf_counter()
+            _feed_capture(recorder, count)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.callbacks.remove(gc_callback)
+        del recorder
+
+        tracemalloc.start()
+        recorder = make()
+        _feed_capture(recorder, count)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        convert = ""
+        if isinstance(recorder, recording_module.Recorder):
+            start = time.perf_counter()
+            events = recorder._capture.to_events()
+            convert = f"{(time.perf_counter() - start) * 1000:.0f} ms ({len(events)} events)"
+            del events
+        del recorder
+        print(f"{label:>14} | {elapsed * 1e9 / count:>6.0f} ns | {gc_time[0] * 1000:>5.0f} ms {gc_time[1] * 1000:>5.1f} ms "
+              f"| {_fmt_size(peak):>11} | {convert}")
+
+
+
+def bench_spill():
+    """ Peak memory of recording, finalizing and saving synthetic recordings of growing length: in memory vs spilled to disk. """
+    import recording_module
+    import recording_segment
+    import utils
+
+    original = (recording_module.MouseListener, recording_module.KeyboardListener, recording_segment.SPILL_CHUNK_BYTES)
+    recording_module.MouseListener = recording_module.KeyboardListener = _NullListener
+    try:
+        with temp_presets_folder():
+            print(f"{'mode':>9} | {'events':>9} | {'peak memory':>11} | {'record+stop':>11} {'save':>8} | file size")
+            for label, chunk_bytes in (("in memory", None), ("spilled", original[2])):
+                recording_segment.SPILL_CHUNK_BYTES = chunk_bytes
+                for count in (250_000, 500_000, 1_000_000):
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        recorder = recording_module.Recorder()
+                        recorder.start_recording()
+                        time.sleep(0.05) # Recording thread up
+                        _feed_capture(recorder, count)
+                        events = recorder.stop_recording()
+                    recorded = time.perf_counter() - start
+                    start = time.perf_counter()
+                    stat = utils.write_preset_file("spill.slaunch", {'title': "Spill", 'type': "recorded",
+                                                                     'recorded_events': events})
+                    saved = time.perf_counter() - start
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    del recorder, events
+                    print(f"{label:>9} | {count:>9} | {_fmt_size(peak):>11} | {recorded:>9.2f} s {saved:>6.2f} s "
+                          f"| {_fmt_size(stat.st_size)}")
+    finally:
+        recording_module.MouseListener, recording_module.KeyboardListener, recording_segment.SPILL_CHUNK_BYTES = original
+
+
+BENCHMARKS = {
+    'codec': bench_codec,
+    'lazy_load': bench_lazy_load,
+    'index': bench_index,
+    'grid': bench_grid,
+    'toggle': bench_toggle,
+    'parser': bench_parser,
+    'parallel': bench_parallel,
+    'store': bench_store,
+    'compression': bench_compression,
+    'archive': bench_archive,
+    'replay': bench_replay,
+    'scheduler': bench_scheduler,
+    'telemetry': bench_telemetry,
+    'decimation': bench_decimation,
+    'retime': bench_retime,
+    'repeat': bench_repeat,
+    'isolation': bench_isolation,
+    'recorder_isolation': bench_recorder_isolation,
+    'capture': bench_capture,
+    'spill': bench_spill,
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        print(f"\n=== {name}: {BENCHMARKS[name].__doc__.strip()}")
+        BENCHMARKS[name]()
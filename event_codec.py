@@ -0,0 +1,583 @@
+import array
+import base64
+import binascii
+import io
+import itertools
+import json
+import lzma
+import re
+import struct
+import sys
+import tempfile
+import zlib
+
+# --- Packed encoding for the record= section of .slaunch files ---
+# Old files store the events as an indented JSON list. Long recordings are
+# mostly mouse_move events, so the same keys get repeated millions of times.
+# The packed form stores the events as typed columns in a single base64 line:
+#
+#   !slrec/1 <base64 payload>
+#
+# The payload is a sequence of columns (typecode byte, uint32 item count,
+# little-endian raw items) followed by the key/button string table as JSON.
+# It is only used when it round-trips exactly to the original event dicts,
+# otherwise save_preset falls back to the plain JSON list.
+#
+# Above COMPRESS_MIN_BYTES the payload is compressed before base64 and the
+# codec is named in the header. Recordings that cannot be packed get the same
+# treatment for their compact JSON:
+#
+#   !slrec/1+zlib <base64 of zlib(packed payload)>
+#   !slrec/json+zlib <base64 of zlib(JSON list)>
+#
+# The header is detected on load, so every form (and old plain JSON) is read
+# back transparently.
+#
+# The SQLite preset store keeps the payload as a blob without the base64 step
+# (base64 is only for the text of .slaunch files), after a one-line tag:
+#
+#   !slbin/1[+codec]\n<payload bytes>        !slbin/json+codec\n<payload bytes>
+#
+# Short recordings are stored there as compact JSON text.
+
+PACKED_PREFIX = "!slrec/1 "
+PACKED_MIN_EVENTS = 32 # Small recordings stay human-readable JSON
+
+RECORD_COMPRESSION = "zlib" # "zlib", "lzma", or None to never compress
+COMPRESS_MIN_BYTES = 64 * 1024 # Payloads smaller than this are stored uncompressed
+COMPRESSION_CODECS = {
+    'zlib': (lambda data: zlib.compress(data, 3), zlib.decompress), # Level 6+ is much slower for ~no gain here
+    'lzma': (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+
+# Opcodes (one byte per event)
+OP_VOID = 0
+OP_MOVE = 1
+OP_BUTTON_PRESS = 2
+OP_BUTTON_RELEASE = 3
+OP_SCROLL = 4
+OP_KEY_PRESS = 5
+OP_KEY_RELEASE = 6
+
+# Exact key set each event type must have to be packable
+_EVENT_FIELDS = {
+    'void': {'type', 'time'},
+    'mouse_move': {'type', 'x', 'y', 'time'},
+    'mouse_click': {'type', 'x', 'y', 'button', 'pressed', 'time'},
+    'mouse_scroll': {'type', 'x', 'y', 'dx', 'dy', 'time'},
+    'key_press': {'type', 'key', 'time'},
+    'key_release': {'type', 'key', 'time'},
+}
+
+_INT16_MIN, _INT16_MAX = -(1 << 15), (1 << 15) - 1
+_INT32_MIN, _INT32_MAX = -(1 << 31), (1 << 31) - 1
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+
+class _NotPackable(Exception):
+    """Raised internally when events cannot be packed losslessly."""
+
+
+def _is_int(value):
+    return type(value) is int # bool is deliberately excluded
+
+
+def _int_array(values):
+    """ Returns the smallest signed array ('h' or 'i') that holds all values. """
+    if not values:
+        return array.array('h')
+    low, high = min(values), max(values)
+    if _INT16_MIN <= low and high <= _INT16_MAX:
+        return array.array('h', values)
+    if _INT32_MIN <= low and high <= _INT32_MAX:
+        return array.array('i', values)
+    raise _NotPackable("integer out of int32 range")
+
+
+def _write_column(out, column):
+    if _BIG_ENDIAN:
+        column = array.array(column.typecode, column)
+        column.byteswap()
+    out.append(struct.pack('<cI', column.typecode.encode('ascii'), len(column)))
+    out.append(column.tobytes())
+
+
+def _read_column(payload, offset):
+    typecode, count = struct.unpack_from('<cI', payload, offset)
+    offset += 5
+    column = array.array(typecode.decode('ascii'))
+    size = column.itemsize * count
+    if offset + size > len(payload):
+        raise ValueError("packed recording is truncated")
+    column.frombytes(payload[offset:offset + size])
+    if _BIG_ENDIAN:
+        column.byteswap()
+    return column, offset + size
+
+
+class _ColumnPacker:
+    """ Splits events into the typed columns of the packed form. Raises _NotPackable on any surprise. """
+
+    def __init__(self):
+        # ops, times, x/y deltas between consecutive positioned events, scroll dx/dy, key/button ids
+        self.columns = [array.array('B'), array.array('d'), array.array('i'), array.array('i'),
+                        array.array('i'), array.array('i'), array.array('H')]
+        self.symbols = {}
+        self.last_x = self.last_y = 0
+
+    def add(self, events):
+        """ Appends events to the columns (may be called again with the events that follow). """
+        ops, times, dxs_pos, dys_pos, scroll_dx, scroll_dy, symbol_ids = self.columns
+        symbols = self.symbols
+        last_x, last_y = self.last_x, self.last_y
+        try:
+            for event in events:
+                if not isinstance(event, dict):
+                    raise _NotPackable("event is not a dict")
+                event_type = event.get('type')
+                fields = _EVENT_FIELDS.get(event_type)
+                if fields is None or event.keys() != fields:
+                    raise _NotPackable(f"unexpected event layout: {event_type}")
+                event_time = event['time']
+                if type(event_time) is not float:
+                    raise _NotPackable("time is not a float")
+                times.append(event_time)
+
+                if 'x' in fields:
+                    x, y = event['x'], event['y']
+                    if not (_is_int(x) and _is_int(y)):
+                        raise _NotPackable("non-integer coordinates")
+                    dxs_pos.append(x - last_x)
+                    dys_pos.append(y - last_y)
+                    last_x, last_y = x, y
+
+                if event_type == 'mouse_move':
+                    ops.append(OP_MOVE)
+                elif event_type == 'mouse_click':
+                    pressed = event['pressed']
+                    if type(pressed) is not bool or not isinstance(event['button'], str):
+                        raise _NotPackable("bad click event")
+                    ops.append(OP_BUTTON_PRESS if pressed else OP_BUTTON_RELEASE)
+                    symbol_ids.append(symbols.setdefault(event['button'], len(symbols)))
+                elif event_type == 'mouse_scroll':
+                    if not (_is_int(event['dx']) and _is_int(event['dy'])):
+                        raise _NotPackable("non-integer scroll")
+                    ops.append(OP_SCROLL)
+                    scroll_dx.append(event['dx'])
+                    scroll_dy.append(event['dy'])
+                elif event_type in ('key_press', 'key_release'):
+                    if not isinstance(event['key'], str):
+                        raise _NotPackable("key is not a string")
+                    ops.append(OP_KEY_PRESS if event_type == 'key_press' else OP_KEY_RELEASE)
+                    symbol_ids.append(symbols.setdefault(event['key'], len(symbols)))
+                else: # void
+                    ops.append(OP_VOID)
+        except OverflowError: # Delta beyond int32, or more than 65536 keys/buttons
+            raise _NotPackable("value out of range")
+        self.last_x, self.last_y = last_x, last_y
+
+    def table(self):
+        """ The key/button string table, as stored after the columns. """
+        return json.dumps(list(self.symbols)).encode('utf-8')
+
+
+def _pack(events):
+    """ Splits events into typed columns. Raises _NotPackable on any surprise. """
+    packer = _ColumnPacker()
+    packer.add(events)
+    columns = packer.columns
+    columns[2:6] = [_int_array(column) for column in columns[2:6]]
+    out = []
+    for column in columns:
+        _write_column(out, column)
+    table = packer.table()
+    out.append(struct.pack('<I', len(table)))
+    out.append(table)
+    return b"".join(out)
+
+
+def _unpack(payload):
+    """ Rebuilds the list of event dicts from a packed payload. """
+    offset = 0
+    columns = []
+    for _ in range(7):
+        column, offset = _read_column(payload, offset)
+        columns.append(column)
+    (table_len,) = struct.unpack_from('<I', payload, offset)
+    offset += 4
+    symbols = json.loads(bytes(payload[offset:offset + table_len]).decode('utf-8'))
+    ops, times, dxs_pos, dys_pos, scroll_dx, scroll_dy, symbol_ids = columns
+    if len(ops) != len(times):
+        raise ValueError("packed recording columns do not match")
+
+    # Undo the position deltas up front (one C-level pass each)
+    xs = list(itertools.accumulate(dxs_pos))
+    ys = list(itertools.accumulate(dys_pos))
+
+    events = []
+    append = events.append
+    pos_i = scroll_i = sym_i = 0
+    for op, t in zip(ops, times):
+        if op == OP_MOVE:
+            append({'type': 'mouse_move', 'x': xs[pos_i], 'y': ys[pos_i], 'time': t})
+            pos_i += 1
+        elif op == OP_BUTTON_PRESS or op == OP_BUTTON_RELEASE:
+            append({'type': 'mouse_click', 'x': xs[pos_i], 'y': ys[pos_i],
+                    'button': symbols[symbol_ids[sym_i]],
+                    'pressed': op == OP_BUTTON_PRESS, 'time': t})
+            pos_i += 1
+            sym_i += 1
+        elif op == OP_SCROLL:
+            append({'type': 'mouse_scroll', 'x': xs[pos_i], 'y': ys[pos_i],
+                    'dx': scroll_dx[scroll_i], 'dy': scroll_dy[scroll_i], 'time': t})
+            pos_i += 1
+            scroll_i += 1
+        elif op == OP_KEY_PRESS or op == OP_KEY_RELEASE:
+            append({'type': 'key_press' if op == OP_KEY_PRESS else 'key_release',
+                    'key': symbols[symbol_ids[sym_i]], 'time': t})
+            sym_i += 1
+        elif op == OP_VOID:
+            append({'type': 'void', 'time': t})
+        else:
+            raise ValueError(f"unknown opcode {op} in packed recording")
+    return events
+
+
+def _tagged_payload(kind, payload, compression):
+    """ Returns (tag, payload) with the tag '<kind>[+codec]', compressing large payloads. None for plain JSON. """
+    if compression and len(payload) >= COMPRESS_MIN_BYTES:
+        compressed = COMPRESSION_CODECS[compression][0](payload)
+        if len(compressed) < len(payload):
+            return f"{kind}+{compression}", compressed
+    if kind != "1":
+        return None # Uncompressed JSON stays a plain (indented) list
+    return kind, payload
+
+
+def _encode_payload(events, compression):
+    """ Packs (or JSON-encodes) a list of events into (tag, payload), or returns None (see encode_events). """
+    if not isinstance(events, list) or len(events) < PACKED_MIN_EVENTS:
+        return None
+    if compression is None:
+        compression = RECORD_COMPRESSION
+    try:
+        payload = _pack(events)
+    except _NotPackable:
+        # Not packable: large lists can still be stored as compressed JSON
+        payload = json.dumps(events, separators=(',', ':')).encode('utf-8')
+        return _tagged_payload("json", payload, compression)
+    return _tagged_payload("1", payload, compression)
+
+
+def encode_events(events, compression=None):
+    """
+    Returns the packed single-line form of the events, or None if the list is
+    too small to be worth it or cannot be represented losslessly.
+    compression defaults to RECORD_COMPRESSION (pass False to disable it).
+    """
+    encoded = _encode_payload(events, compression)
+    if encoded is None:
+        return None
+    tag, payload = encoded
+    return f"!slrec/{tag} " + base64.b64encode(payload).decode('ascii')
+
+
+def encode_record_blob(events, compression=None):
+    """ Returns the binary form of a recording for the preset store (see the notes above). """
+    if events is not None and not isinstance(events, list):
+        # Streamed source: written as a record section, then only the base64 is undone
+        buf = io.StringIO()
+        _write_record_stream(buf, events, compression)
+        return record_section_to_blob(buf.getvalue().encode('utf-8'))
+    encoded = _encode_payload(events, compression)
+    if encoded is None:
+        return json.dumps(events, separators=(',', ':')).encode('utf-8')
+    tag, payload = encoded
+    return _BLOB_PREFIX + tag.encode('ascii') + b"\n" + payload
+
+
+# --- Streaming encoder ---
+# write_record_section also takes an event source that is not a list but can be
+# iterated more than once and has a len() (a recording_segment.SpilledRecording).
+# It is written in the same format without the events or the payload ever being
+# in memory as a whole: one pass splits the events into column files, a second
+# one compresses the payload assembled from them into a temp file, and the
+# base64 line is written from that in chunks.
+STREAM_CHUNK_EVENTS = 16384 # Events per chunk of the streaming passes
+_BASE64_CHUNK = 3 * 256 * 1024 # A multiple of 3, so the encoded chunks join into one valid base64 string
+
+_STREAM_COMPRESSORS = {
+    'zlib': lambda: zlib.compressobj(3),
+    'lzma': lambda: lzma.LZMACompressor(preset=6),
+}
+
+
+class _SpooledColumn:
+    """ A column of the packed form, written to a temporary file a chunk at a time (native byte order). """
+
+    def __init__(self, typecode):
+        self.typecode = typecode
+        self.file = tempfile.TemporaryFile()
+        self.count = 0
+        self.low = self.high = 0 # Range of the values (integer columns)
+
+    def write(self, column):
+        if column and column.typecode == 'i':
+            self.low, self.high = min(self.low, min(column)), max(self.high, max(column))
+        column.tofile(self.file)
+        self.count += len(column)
+
+    def stored_typecode(self):
+        """ Typecode in the payload: integer columns get the smallest one that fits, like _int_array. """
+        if self.typecode == 'i' and _INT16_MIN <= self.low and self.high <= _INT16_MAX:
+            return 'h'
+        return self.typecode
+
+    def pieces(self):
+        """ Yields the column as it appears in the payload: header, then little-endian item chunks. """
+        typecode = self.stored_typecode()
+        yield struct.pack('<cI', typecode.encode('ascii'), self.count)
+        self.file.seek(0)
+        chunk_bytes = STREAM_CHUNK_EVENTS * array.array(self.typecode).itemsize
+        while True:
+            data = self.file.read(chunk_bytes)
+            if not data:
+                break
+            column = array.array(self.typecode, data)
+            if typecode != self.typecode:
+                column = array.array(typecode, column)
+            if _BIG_ENDIAN:
+                column.byteswap()
+            yield column.tobytes()
+
+
+def _spool_columns(events):
+    """ Streaming _pack, first pass: returns (spooled columns, string table). Raises _NotPackable. """
+    packer = _ColumnPacker()
+    spooled = [_SpooledColumn(column.typecode) for column in packer.columns]
+    try:
+        iterator = iter(events)
+        while True:
+            batch = list(itertools.islice(iterator, STREAM_CHUNK_EVENTS))
+            if not batch:
+                break
+            packer.add(batch)
+            for column, spool in zip(packer.columns, spooled):
+                spool.write(column)
+                del column[:]
+    except BaseException:
+        for spool in spooled:
+            spool.file.close()
+        raise
+    return spooled, packer.table()
+
+
+def _spooled_payload(spooled, table):
+    """ Yields the packed payload in pieces, from the spooled columns. """
+    for spool in spooled:
+        yield from spool.pieces()
+    yield struct.pack('<I', len(table))
+    yield table
+
+
+def _json_payload(events):
+    """ Yields the compact JSON list of the events in pieces. """
+    encode = json.JSONEncoder(separators=(',', ':')).encode
+    iterator = iter(events)
+    separator = "["
+    while True:
+        batch = list(itertools.islice(iterator, STREAM_CHUNK_EVENTS))
+        if not batch:
+            break
+        yield (separator + ",".join(map(encode, batch))).encode('utf-8')
+        separator = ","
+    yield b"]" if separator == "," else b"[]"
+
+
+def _write_base64(f, pieces):
+    """ Writes base64 of the concatenated pieces (chunks of whole 3-byte groups, the rest carried over). """
+    carry = b""
+    for piece in pieces:
+        data = carry + piece if carry else piece
+        cut = len(data) - len(data) % 3
+        f.write(binascii.b2a_base64(memoryview(data)[:cut], newline=False).decode('ascii'))
+        carry = bytes(data[cut:])
+    if carry:
+        f.write(binascii.b2a_base64(carry, newline=False).decode('ascii'))
+
+
+def _write_streamed_header_line(f, kind, pieces, compression):
+    """
+    Streaming encode_events: writes '!slrec/<kind>[+codec] <base64>' from the
+    payload pieces (pieces() is called once per pass over the payload).
+    Returns False, writing nothing, for JSON that ends up uncompressed.
+    """
+    if compression:
+        with tempfile.TemporaryFile() as compressed:
+            compressor = _STREAM_COMPRESSORS[compression]()
+            size = 0
+            for piece in pieces():
+                size += len(piece)
+                compressed.write(compressor.compress(piece))
+            compressed.write(compressor.flush())
+            if size >= COMPRESS_MIN_BYTES and compressed.tell() < size:
+                compressed.seek(0)
+                f.write(f"!slrec/{kind}+{compression} ")
+                _write_base64(f, iter(lambda: compressed.read(_BASE64_CHUNK), b""))
+                f.write("\n")
+                return True
+    if kind != "1":
+        return False
+    f.write(PACKED_PREFIX)
+    _write_base64(f, pieces())
+    f.write("\n")
+    return True
+
+
+def _write_json_list(f, events):
+    """ Writes the events as an indented JSON list, one event at a time (same text as json.dump(indent=2)). """
+    separator = "[\n  "
+    for event in events:
+        f.write(separator)
+        f.write(json.dumps(event, indent=2).replace("\n", "\n  "))
+        separator = ",\n  "
+    f.write("[]\n" if separator == "[\n  " else "\n]\n")
+
+
+def _write_record_stream(f, events, compression=None):
+    """ write_record_section for a re-iterable event source that is not a list. """
+    if compression is None:
+        compression = RECORD_COMPRESSION
+    if len(events) < PACKED_MIN_EVENTS:
+        _write_json_list(f, events)
+        return
+    try:
+        spooled, table = _spool_columns(events)
+    except _NotPackable:
+        # Not packable: stored as (compressed) JSON, like encode_events does
+        if not _write_streamed_header_line(f, "json", lambda: _json_payload(events), compression):
+            _write_json_list(f, events)
+        return
+    try:
+        _write_streamed_header_line(f, "1", lambda: _spooled_payload(spooled, table), compression)
+    finally:
+        for spool in spooled:
+            spool.file.close()
+
+
+_NON_SPACE = re.compile(rb"\S")
+_PACKED_PREFIX_BYTES = PACKED_PREFIX.encode('ascii')
+_HEADER_PREFIX_BYTES = b"!slrec/"
+_BLOB_PREFIX = b"!slbin/"
+_DECODE_ERRORS = (binascii.Error, struct.error, IndexError, UnicodeDecodeError, zlib.error, lzma.LZMAError)
+
+
+def _parse_tag(prefix, data, start, end):
+    """ Returns (kind, codec) of a '<prefix><kind>[+codec]' tag in data[start:end]. """
+    tag = bytes(data[start + len(prefix):end]).decode('ascii', 'replace')
+    kind, _, codec = tag.partition("+")
+    if kind not in ("1", "json") or (codec and codec not in COMPRESSION_CODECS):
+        raise ValueError(f"unsupported recording format '{prefix.decode('ascii')}{tag}'")
+    return kind, codec
+
+
+def _base64_header(data):
+    """
+    Locates the header of a packed record section (bytes). Returns None for a
+    JSON section, else (kind, codec, start, end) with the base64 line at [start:end].
+    """
+    match = _NON_SPACE.search(data)
+    start = match.start() if match else len(data)
+    if not data.startswith(_HEADER_PREFIX_BYTES, start):
+        return None
+
+    # Header: '!slrec/<kind>[+codec] ', then the single base64 payload line
+    space = data.find(b" ", start)
+    if space == -1:
+        raise ValueError("corrupt packed recording: missing payload")
+    kind, codec = _parse_tag(_HEADER_PREFIX_BYTES, data, start, space)
+    start = space + 1
+    end = data.find(b"\n", start)
+    if end == -1:
+        end = len(data)
+    while end > start and data[end - 1] in b" \t\r":
+        end -= 1
+    return kind, codec, start, end
+
+
+def _decode_payload(kind, codec, payload):
+    """ Decompresses (if needed) and decodes a raw payload. Raises ValueError. """
+    try:
+        if codec:
+            payload = COMPRESSION_CODECS[codec][1](payload) # Only decompressed when the recording is needed
+        if kind == "json":
+            return json.loads(bytes(payload))
+        return _unpack(payload)
+    except _DECODE_ERRORS as e:
+        raise ValueError(f"corrupt packed recording: {e}")
+
+
+def decode_record_section(data):
+    """
+    Parses the content of a record= section, packed or JSON, or a recording
+    blob of the preset store. Accepts str or bytes; bytes are decoded in place
+    (no stripped/decoded copy). Raises ValueError (json.JSONDecodeError
+    included) if it is invalid.
+    """
+    if isinstance(data, str):
+        stripped = data.strip()
+        if not stripped.startswith("!slrec/"):
+            return json.loads(stripped)
+        data = stripped.encode('ascii', 'replace')
+
+    if data.startswith(_BLOB_PREFIX):
+        newline = data.find(b"\n")
+        if newline == -1:
+            raise ValueError("corrupt packed recording: missing payload")
+        kind, codec = _parse_tag(_BLOB_PREFIX, data, 0, newline)
+        return _decode_payload(kind, codec, memoryview(data)[newline + 1:])
+
+    header = _base64_header(data)
+    if header is None:
+        return json.loads(data) # json accepts bytes and skips the surrounding whitespace
+    kind, codec, start, end = header
+    try:
+        payload = binascii.a2b_base64(memoryview(data)[start:end], strict_mode=True)
+    except binascii.Error as e:
+        raise ValueError(f"corrupt packed recording: {e}")
+    return _decode_payload(kind, codec, payload)
+
+
+def record_section_to_blob(data):
+    """
+    Converts record= section bytes to the preset store's blob form. Only the
+    base64 is undone, the payload is not decoded; JSON sections are kept as
+    they are. Raises ValueError if the header or the base64 is invalid.
+    """
+    header = _base64_header(data)
+    if header is None:
+        return bytes(data)
+    kind, codec, start, end = header
+    try:
+        payload = binascii.a2b_base64(memoryview(data)[start:end], strict_mode=True)
+    except binascii.Error as e:
+        raise ValueError(f"corrupt packed recording: {e}")
+    return _BLOB_PREFIX + (f"{kind}+{codec}" if codec else kind).encode('ascii') + b"\n" + payload
+
+
+def write_record_section(f, events, compression=None):
+    """
+    Writes the events after a record= marker, picking packed/compressed or JSON.
+    `events` is a list, or a re-iterable source with a len() that is then
+    written as a stream (see the streaming encoder notes).
+    """
+    if events is not None and not isinstance(events, list):
+        _write_record_stream(f, events, compression)
+        return
+    packed = encode_events(events, compression)
+    if packed is not None:
+        f.write(packed)
+        f.write("\n")
+    else:
+        json.dump(events, f, indent=2) # Write JSON with indentation
+        f.write("\n") # Add a final newline for clarity
@@ -1,34 +1,59 @@
 import sys
 import os
 import shutil
-import threading
+import bisect
+import multiprocessing
 # import json # Import json for replay_events
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QGridLayout, QPushButton,
     QScrollArea, QVBoxLayout, QHBoxLayout, QFrame, QLabel, QSizePolicy, QMessageBox,
-    QFileDialog, QMenuBar, QMenu, QInputDialog, QSpacerItem # Import QSpacerItem
+    QFileDialog, QMenuBar, QMenu, QInputDialog, QSpacerItem, # Import QSpacerItem
+    QDialog, QDialogButtonBox, QListWidget, QListWidgetItem
 )
 from PyQt6.QtGui import QIcon, QPixmap, QAction, QPainter, QColor, QBrush, QActionGroup, QFontMetrics
 # Import QRect for click position check
 from PyQt6.QtCore import Qt, QSize, pyqtSignal, QPoint, QTimer, QRect
 
 from preset_dialog import PresetDialog
+from preset_watcher import PresetFolderWatcher
 from styles import STYLESHEET_LIGHT, STYLESHEET_DARK
 
 try:
     # --- Import the modified replay_events ---
-    from recording_module import replay_events
+    from recording_module import replay_events, compile_replay_plan, ReplayTelemetry
+    import recording_module
 except ImportError as e:
     print(f"Error importing from recording_module: {e}")
+    ReplayTelemetry = None # Timing telemetry is unavailable with the dummy replay
+    recording_module = None
     # --- Update dummy function signature ---
-    def replay_events(events_data, how_many_times, speed=1.0, stop_event=None):
+    def replay_events(events_data, how_many_times, speed=1.0, stop_event=None, telemetry=None, max_idle_gap=0.0,
+                      loop_gap=None, on_pass=None):
         print(f"Dummy Replay: {len(events_data)} events, times: {how_many_times}")
 
+    def compile_replay_plan(events):
+        return events # The dummy replay takes the raw list
+
+try:
+    from replay_process import ProcessReplayer
+    import recorder_process
+except ImportError as e:
+    print(f"Out-of-process replay/recording unavailable: {e}")
+    ProcessReplayer = recorder_process = None
+
 from utils import (
-    load_presets, delete_preset, run_script, get_icon_path, PRESETS_FOLDER,
-    save_preset
+    load_presets, load_preset, delete_preset, run_script, get_icon_path, PRESETS_FOLDER,
+    get_recorded_events, export_preset_file, import_preset_file, using_preset_db, forget_preset_state,
+    forget_missing_preset_states
+)
+from preset_writer import get_preset_writer
+from replay_executor import (
+    ReplayExecutor, QUEUED, RUNNING, STOPPING, DONE, POLICY_SERIALIZE, POLICY_REJECT, POLICY_PREEMPT
 )
+import preset_archive
+import move_decimation
+from recording_pipeline import pipeline_for_preset
 
 MAX_COLUMNS = 4
 # --- Define fixed size and title constraints ---
@@ -43,6 +68,8 @@ class PresetWidget(QFrame):
     """ Custom widget representing a single preset button in the grid. """
     request_edit = pyqtSignal(str)
     request_delete = pyqtSignal(str)
+    request_replay = pyqtSignal(str) # Start/stop, decided by MainWindow's replay executor
+    record_replay_timing = False # Set from the Replay menu; collects per-event timings during replays
 
     def __init__(self, preset_data, parent=None):
         super().__init__(parent)
@@ -51,8 +78,7 @@ class PresetWidget(QFrame):
         self.preset_type = preset_data['type']
         self.on_off_state = preset_data.get('on_off_state', False)
 
-        self._replay_thread = None
-        self._replay_stop_event = None
+        self._replay_status = DONE # Status of this preset's replay job (see replay_executor)
         self._is_replaying = False
 
         self.setFrameShape(QFrame.Shape.StyledPanel)
@@ -148,6 +174,7 @@ class PresetWidget(QFrame):
             if not right_buttons_rect.contains(event.pos()):
                  print(f"Running standard preset (widget click): {self.file_name}")
                  run_script(self.preset_data.get('script', ''))
+                 get_preset_writer().record_run(self.file_name)
             else:
                  # Click was on a button, let the button handle it
                  super().mousePressEvent(event)
@@ -209,12 +236,7 @@ class PresetWidget(QFrame):
         elif self.preset_type == "recorded":
             self.action_button.setObjectName("ReplayButton")
             self.action_button.setCheckable(False)
-            if self._is_replaying:
-                 self.action_button.setText("■")
-                 self.action_button.setToolTip("Stop Replay")
-            else:
-                 self.action_button.setText("▶")
-                 self.action_button.setToolTip("Play Recording")
+            self.set_replay_status(self._replay_status)
             self.action_button.clicked.connect(self.toggle_replay)
 
     def toggle_on_off(self):
@@ -226,73 +248,91 @@ class PresetWidget(QFrame):
         script_to_run = self.preset_data.get('script_on') if self.on_off_state else self.preset_data.get('script_off')
         run_script(script_to_run)
         self.preset_data['on_off_state'] = self.on_off_state
-        success, message = save_preset(self.preset_data)
-        if not success:
-             QMessageBox.warning(self, "Save Error", f"Could not update preset state:\n{message}")
+        # --- Only the state journal is written (in the background), the preset file stays untouched ---
+        # Failures are reported by MainWindow through PresetWriter.state_saved
+        get_preset_writer().save_state(self.file_name, self.on_off_state, ran=True) # One journal line
 
 
     def toggle_replay(self):
-        """Starts or stops the replay of a recorded preset using embedded data."""
-        if self._is_replaying:
-            print("Stop requested.")
-            if self._replay_stop_event:
-                self._replay_stop_event.set()
+        """Asks the main window to start (queue) or stop the replay of this recorded preset."""
+        self.request_replay.emit(self.file_name)
+
+    def set_replay_status(self, status):
+        """ Shows a replay job status (queued/running/stopping/done) on the ▶/■ button. """
+        self._replay_status = status
+        self._is_replaying = status != DONE
+        if not hasattr(self, 'action_button') or not self.action_button:
+            return
+        if self.preset_type != "recorded":
+            self.action_button.setEnabled(True)
+            return
+        if status == QUEUED:
+            text, tooltip = "⏳", "Queued (click to cancel)"
+        elif status == RUNNING:
+            text, tooltip = "■", "Stop Replay"
+        elif status == STOPPING:
+            text, tooltip = "■", "Stopping..."
         else:
-            # --- Get embedded events data ---
-            recorded_events = self.preset_data.get('recorded_events')
-            how_many = self.preset_data.get('how_many', 1)
-            print(f"Attempting to replay embedded events for: {self.file_name}")
-
-            if recorded_events and isinstance(recorded_events, list) and len(recorded_events) > 0:
-                times_to_play = int(how_many)
-                self._replay_stop_event = threading.Event()
-                self._replay_thread = threading.Thread(
-                    target=self._run_replay_thread,
-                    # --- Pass events data directly ---
-                    args=(recorded_events, times_to_play, self._replay_stop_event),
-                    daemon=True
-                )
-                self._is_replaying = True
-                self.action_button.setText("■")
-                self.action_button.setToolTip("Stop Replay")
-                self._replay_thread.start()
-                print(f"Replay thread started for {self.file_name}.")
-            else:
-                QMessageBox.warning(self, "Replay Error", f"No valid recorded events found for preset: {self.file_name}")
-
-
-    def _run_replay_thread(self, events_data, times, stop_event):
-        """Target function for the replay thread."""
+            text, tooltip = "▶", "Play Recording"
+        self.action_button.setText(text)
+        self.action_button.setToolTip(tooltip)
+        self.action_button.setEnabled(status != STOPPING)
+
+
+    def get_replay_plan(self):
+        """
+        Returns the compiled replay plan of this preset, or None if it has no valid recording.
+        The plan is cached on the preset data and rebuilt when 'recorded_events' changes.
+        """
+        source = self.preset_data.get('recorded_events')
+        cached = self.preset_data.get('replay_plan')
+        if cached is not None and cached[0] is source:
+            return cached[1]
+
+        # --- Get embedded events data (read from disk on first use) ---
+        recorded_events = get_recorded_events(self.preset_data)
+        if not recorded_events:
+            return None
+        replay_plan = compile_replay_plan(recorded_events)
+        self.preset_data['replay_plan'] = (source, replay_plan)
+        problems = getattr(replay_plan, 'problems', None)
+        if problems:
+            # Reported once, before anything is replayed
+            details = "\n".join(problems[:10]) + (f"\n... and {len(problems) - 10} more" if len(problems) > 10 else "")
+            QMessageBox.warning(self, "Replay Warning",
+                                f"Some recorded events of '{self.preset_data.get('title', '')}' cannot be replayed "
+                                f"and will be skipped:\n{details}")
+        return replay_plan
+
+    def show_replay_telemetry(self, telemetry):
+        """ Shows the timing summary of a finished replay, with CSV/JSON export. """
+        box = QMessageBox(self)
+        box.setWindowTitle("Replay Timing")
+        box.setIcon(QMessageBox.Icon.Information)
+        box.setText(f"Timing of '{self.preset_data.get('title', self.file_name)}':\n\n{telemetry.format_summary()}")
+        csv_button = box.addButton("Export CSV...", QMessageBox.ButtonRole.ActionRole)
+        json_button = box.addButton("Export JSON...", QMessageBox.ButtonRole.ActionRole)
+        box.addButton(QMessageBox.StandardButton.Close)
+        box.exec()
+
+        clicked = box.clickedButton()
+        if clicked not in (csv_button, json_button):
+            return
+        extension = ".csv" if clicked is csv_button else ".json"
+        base_name = os.path.splitext(self.file_name)[0]
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Replay Timing", f"{base_name}_timing{extension}",
+            "CSV Files (*.csv)" if extension == ".csv" else "JSON Files (*.json)")
+        if not file_path:
+            return
         try:
-            print(f"Replay thread ({threading.get_ident()}) starting for {self.file_name}")
-            # --- Call modified replay_events with data ---
-            replay_events(events_data, times, stop_event=stop_event)
-            print(f"Replay thread ({threading.get_ident()}) finished execution for {self.file_name}")
-        except Exception as e:
-            # Use QTimer.singleShot to show message box from main thread
-            QTimer.singleShot(0, lambda: QMessageBox.critical(self, "Replay Runtime Error", f"Error during replay:\n{e}"))
-            print(f"Error during replay thread: {e}")
-        finally:
-            print(f"Replay thread ({threading.get_ident()}) entering finally block for {self.file_name}")
-            # Use QTimer.singleShot to call GUI update from main thread
-            QTimer.singleShot(0, self._on_replay_finished)
-            print(f"Replay thread ({threading.get_ident()}) scheduled _on_replay_finished for {self.file_name}")
-
-
-    def _on_replay_finished(self):
-        """Called via QTimer when the replay thread finishes or is stopped."""
-        # ... (logic remains the same) ...
-        print(">>> _on_replay_finished called")
-        self._is_replaying = False
-        self._replay_thread = None
-        self._replay_stop_event = None
-
-        # Check if action_button still exists and type is correct before updating
-        if hasattr(self, 'action_button') and self.action_button and hasattr(self.action_button, 'setText') and self.preset_type == "recorded":
-            print(">>> Resetting ReplayButton icon and tooltip")
-            self.action_button.setText("▶")
-            self.action_button.setToolTip("Play Recording")
-        print(">>> _on_replay_finished finished")
+            if extension == ".csv":
+                telemetry.to_csv(file_path)
+            else:
+                telemetry.to_json(file_path)
+            print(f"Replay timing exported to {file_path}")
+        except OSError as e:
+            QMessageBox.critical(self, "Export Error", f"Could not write replay timing:\n{e}")
 
 
     def update_on_off_button_icon(self):
@@ -336,10 +376,6 @@ class PresetWidget(QFrame):
                 self.on_off_state = self.preset_data.get('on_off_state', False)
                 self.action_button.setChecked(self.on_off_state)
                 self.update_on_off_button_icon()
-            elif self.preset_type == "recorded":
-                 if self._is_replaying and self._replay_stop_event:
-                      self._replay_stop_event.set()
-                 self._on_replay_finished()
 
     def emit_edit_request(self):
         # ... (logic remains the same) ...
@@ -352,9 +388,7 @@ class PresetWidget(QFrame):
                                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                                        QMessageBox.StandardButton.No)
         if confirm == QMessageBox.StandardButton.Yes:
-            if self._is_replaying and self._replay_stop_event:
-                self._replay_stop_event.set()
-            self.request_delete.emit(self.file_name)
+            self.request_delete.emit(self.file_name) # MainWindow also stops its replay
 
 
 # --- MainWindow Class ---
@@ -367,6 +401,7 @@ class MainWindow(QMainWindow):
 
         self.presets = {} # Dictionary to store preset data {file_name: data}
         self.preset_widgets = {} # Dictionary to store preset widgets {file_name: widget}
+        self.grid_order = [] # File names in grid order (sorted), index i -> cell i
 
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
@@ -394,6 +429,27 @@ class MainWindow(QMainWindow):
 
         self.main_layout.addWidget(self.scroll_area)
 
+        # --- All preset/state writes go through one background writer ---
+        self.preset_writer = get_preset_writer()
+        self.preset_writer.state_saved.connect(self._on_state_saved)
+        self.preset_writer.save_finished.connect(self._on_optimized_saved)
+        self._optimize_report = [] # [(file_name, report line)] of the running Optimize Recordings
+        self._optimize_pending = {} # {file_name: (title, report line once saved)} of its queued saves
+
+        # --- All replays run on one executor thread, one at a time ---
+        self.replay_executor = ReplayExecutor(replay_events, parent=self)
+        self.replay_executor.status_changed.connect(self._on_replay_status)
+        self.replay_executor.job_finished.connect(self._on_replay_finished)
+        self.replay_executor.progress.connect(self._on_replay_progress)
+        self.process_replayer = None # Child process for replays, started on first use (see replay_process)
+        self._replay_jobs = {} # {file_name: latest ReplayJob}
+
+        # --- Pick up presets added/changed/removed by other programs ---
+        self.folder_watcher = None # Nothing to watch when presets live in the SQLite store
+        if not using_preset_db():
+            self.folder_watcher = PresetFolderWatcher(PRESETS_FOLDER, parent=self)
+            self.folder_watcher.presets_changed.connect(self.apply_folder_changes)
+
         self.load_and_display_presets()
 
         self.apply_theme(dark_mode=False) # Apply default theme initially
@@ -420,6 +476,24 @@ class MainWindow(QMainWindow):
 
         file_menu.addSeparator()
 
+        # Bulk Import/Export Actions
+        import_archive_action = QAction(QIcon(), "Import Presets from &Archive...", self)
+        import_archive_action.setStatusTip("Import every preset of a .zip/.tar bundle")
+        import_archive_action.triggered.connect(self.import_library_archive)
+        file_menu.addAction(import_archive_action)
+
+        import_folder_action = QAction(QIcon(), "Import Presets from &Folder...", self)
+        import_folder_action.setStatusTip("Import every .slaunch file of a folder")
+        import_folder_action.triggered.connect(self.import_library_folder)
+        file_menu.addAction(import_folder_action)
+
+        export_library_action = QAction(QIcon(), "Export &Presets to Archive...", self)
+        export_library_action.setStatusTip("Export several presets (or all of them) to one archive")
+        export_library_action.triggered.connect(self.export_library)
+        file_menu.addAction(export_library_action)
+
+        file_menu.addSeparator()
+
         # Exit Action
         exit_action = QAction(QIcon(), "E&xit", self)
         exit_action.setStatusTip("Exit application")
@@ -442,6 +516,87 @@ class MainWindow(QMainWindow):
         theme_group.addAction(self.dark_mode_action)
         theme_group.setExclusive(True)
 
+        # --- Replay Menu ---
+        replay_menu = menu_bar.addMenu("&Replay")
+        self.replay_timing_action = QAction("Record &Timing Telemetry", self, checkable=True)
+        self.replay_timing_action.setStatusTip("Measure scheduled vs actual time of each replayed event")
+        self.replay_timing_action.setEnabled(ReplayTelemetry is not None)
+        self.replay_timing_action.toggled.connect(self.set_replay_timing)
+        replay_menu.addAction(self.replay_timing_action)
+
+        self.replay_process_action = QAction("Replay in a Separate &Process", self, checkable=True)
+        self.replay_process_action.setStatusTip("Run replays outside the GUI process so a busy window cannot delay them")
+        self.replay_process_action.setEnabled(ProcessReplayer is not None)
+        self.replay_process_action.toggled.connect(self.set_replay_in_process)
+        replay_menu.addAction(self.replay_process_action)
+
+        self.record_process_action = QAction("Record in a Separate P&rocess", self, checkable=True)
+        self.record_process_action.setStatusTip("Capture events outside the GUI process so a busy window cannot delay their timestamps")
+        self.record_process_action.setEnabled(recorder_process is not None)
+        self.record_process_action.setChecked(recorder_process is not None and recorder_process.RECORD_IN_SEPARATE_PROCESS)
+        self.record_process_action.toggled.connect(self.set_record_in_process)
+        replay_menu.addAction(self.record_process_action)
+
+        stop_gesture_action = QAction("Recording Stop &Gesture...", self)
+        stop_gesture_action.setStatusTip("Choose the buttons/keys to hold down to stop a recording")
+        stop_gesture_action.setEnabled(recording_module is not None)
+        stop_gesture_action.triggered.connect(self.choose_stop_gesture)
+        replay_menu.addAction(stop_gesture_action)
+
+        policy_menu = replay_menu.addMenu("When Another Replay Is &Running")
+        policy_group = QActionGroup(self)
+        policy_group.setExclusive(True)
+        for policy, label in ((POLICY_SERIALIZE, "&Queue the New One"),
+                              (POLICY_REJECT, "&Don't Start the New One"),
+                              (POLICY_PREEMPT, "&Stop It and Start the New One")):
+            action = QAction(label, self, checkable=True)
+            action.setChecked(policy == POLICY_SERIALIZE)
+            action.triggered.connect(lambda checked, policy=policy: self.replay_executor.set_policy(policy))
+            policy_group.addAction(action)
+            policy_menu.addAction(action)
+
+        replay_menu.addSeparator()
+        optimize_action = QAction(QIcon(), "&Optimize Recordings...", self)
+        optimize_action.setStatusTip("Run the post-processing stages of recorded presets on their saved recordings")
+        optimize_action.triggered.connect(self.optimize_recordings)
+        replay_menu.addAction(optimize_action)
+
+    def set_replay_timing(self, enabled):
+        """ Turns per-event replay timing on/off for the next replays. """
+        PresetWidget.record_replay_timing = enabled
+        print(f"Replay timing telemetry {'enabled' if enabled else 'disabled'}.")
+
+    def set_replay_in_process(self, enabled):
+        """ Switches the replay executor between in-process and child-process replays (for the next replays). """
+        if enabled:
+            if self.process_replayer is None:
+                self.process_replayer = ProcessReplayer()
+            self.replay_executor.replay_func = self.process_replayer.replay_events
+        else:
+            self.replay_executor.replay_func = replay_events
+        print(f"Replays run {'in a separate process' if enabled else 'in the GUI process'}.")
+
+    def choose_stop_gesture(self):
+        """ Asks for the stop gesture of the next recordings (e.g. 'left click+shift:2'). """
+        spec, ok = QInputDialog.getText(
+            self, "Recording Stop Gesture",
+            "Buttons/keys to hold together, joined with '+', then ':' and the seconds to hold them.\n"
+            "Examples: left click+shift:2, ctrl+alt+f12:1, right click+middle click:0.5",
+            text=recording_module.STOP_GESTURE.spec)
+        if not ok or not spec.strip():
+            return
+        try:
+            recording_module.STOP_GESTURE = recording_module.StopGesture(spec)
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid Stop Gesture", str(e))
+            return
+        print(f"Recording stop gesture: {recording_module.STOP_GESTURE.describe()}")
+
+    def set_record_in_process(self, enabled):
+        """ Chooses where the recorder of the next opened preset dialog captures events. """
+        recorder_process.RECORD_IN_SEPARATE_PROCESS = enabled
+        print(f"Recordings are captured {'in a separate process' if enabled else 'in the GUI process'}.")
+
 
     def load_and_display_presets(self):
         """ Clears the grid and reloads all presets from the folder. """
@@ -455,30 +610,21 @@ class MainWindow(QMainWindow):
             item = self.grid_layout.takeAt(0)
             widget = item.widget()
             if widget and widget != add_button_ref: # Don't delete the add button instance yet
-                if isinstance(widget, PresetWidget) and widget._is_replaying and widget._replay_stop_event:
-                    print(f"Stopping replay for widget {widget.file_name} before reload.")
-                    widget._replay_stop_event.set() # Request stop
-                    # Ideally wait for thread, but for simplicity just request stop
                 widget.deleteLater() # Schedule for deletion
+        self.replay_executor.stop_all() # Replays of the old widgets are stopped/cancelled
 
+        if self.folder_watcher:
+            self.folder_watcher.resync() # Snapshot first so changes during the load are caught later
         self.presets = {p['file_name']: p for p in load_presets()}
+        forget_missing_preset_states(self.presets)
         self.preset_widgets = {}
+        self.grid_order = sorted(self.presets.keys())
 
-        row, col = 0, 0
-        for file_name in sorted(self.presets.keys()):
-            preset_data = self.presets[file_name]
-            widget = PresetWidget(preset_data) # Uses new layout and fixed size
-            widget.request_edit.connect(self.open_edit_dialog)
-            widget.request_delete.connect(self.delete_preset_widget)
-
-            self.grid_layout.addWidget(widget, row, col)
+        for index, file_name in enumerate(self.grid_order):
+            widget = self._create_preset_widget(self.presets[file_name])
+            self.grid_layout.addWidget(widget, *self._grid_position(index))
             self.preset_widgets[file_name] = widget
 
-            col += 1
-            if col >= MAX_COLUMNS:
-                col = 0
-                row += 1
-
         # Ensure the Add button exists and has the SAME fixed size
         if not hasattr(self, 'add_button') or not self.add_button: # Check if it was deleted
              self.add_button = QPushButton("➕")
@@ -489,14 +635,107 @@ class MainWindow(QMainWindow):
         self.add_button.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed) # Enforce
 
         # Add the button to the next available slot
-        self.grid_layout.addWidget(self.add_button, row, col)
-
-        # Remove stretches, alignment should handle positioning
-        # self.update_add_button_position() # Simplified - just add at the end
-
+        self.grid_layout.addWidget(self.add_button, *self._grid_position(len(self.grid_order)))
+
+    # --- Incremental grid updates ---
+    # Saving, deleting or importing one preset only touches that preset's widget
+    # and the cells after it, instead of rebuilding the whole grid. Other widgets
+    # (and any replay they are running) are left alone.
+
+    @staticmethod
+    def _grid_position(index):
+        """ Returns the (row, col) cell of the index-th grid slot. """
+        return divmod(index, MAX_COLUMNS)
+
+    def _create_preset_widget(self, preset_data):
+        widget = PresetWidget(preset_data) # Uses new layout and fixed size
+        widget.request_edit.connect(self.open_edit_dialog)
+        widget.request_delete.connect(self.delete_preset_widget)
+        widget.request_replay.connect(self.toggle_replay)
+        return widget
+
+    def _reflow_grid(self, start_index):
+        """ Moves the widgets from start_index onward (and the Add button) to their cells. """
+        for index in range(start_index, len(self.grid_order)):
+            widget = self.preset_widgets[self.grid_order[index]]
+            self.grid_layout.removeWidget(widget)
+            self.grid_layout.addWidget(widget, *self._grid_position(index))
+        self.grid_layout.removeWidget(self.add_button)
+        self.grid_layout.addWidget(self.add_button, *self._grid_position(len(self.grid_order)))
+
+    def insert_or_update_preset(self, preset_data):
+        """ Updates the preset's widget in place, or inserts a new widget at its sorted position. """
+        file_name = preset_data['file_name']
+        self.presets[file_name] = preset_data
+        widget = self.preset_widgets.get(file_name)
+        if widget is not None:
+            self.replay_executor.stop(file_name) # The replay in progress was of the old data
+            widget.update_data(preset_data)
+            return
 
-    # --- Remove or simplify update_add_button_position ---
-    # def update_add_button_position(self): ...
+        index = bisect.bisect_left(self.grid_order, file_name)
+        self.grid_order.insert(index, file_name)
+        widget = self._create_preset_widget(preset_data)
+        self.preset_widgets[file_name] = widget
+        self.grid_layout.addWidget(widget, *self._grid_position(index))
+        self._reflow_grid(index + 1)
+
+    def insert_presets(self, preset_list):
+        """ Inserts/updates many presets with a single reflow of the grid (bulk import). """
+        new_names = []
+        self.scroll_widget.setUpdatesEnabled(False) # One repaint at the end
+        try:
+            for preset_data in preset_list:
+                file_name = preset_data['file_name']
+                self.presets[file_name] = preset_data
+                widget = self.preset_widgets.get(file_name)
+                if widget is not None:
+                    self.replay_executor.stop(file_name)
+                    widget.update_data(preset_data)
+                else:
+                    self.preset_widgets[file_name] = self._create_preset_widget(preset_data)
+                    new_names.append(file_name)
+            if new_names:
+                self.grid_order = sorted(self.grid_order + new_names)
+                # Everything from the first new preset onward moves (new widgets get placed too)
+                self._reflow_grid(bisect.bisect_left(self.grid_order, min(new_names)))
+        finally:
+            self.scroll_widget.setUpdatesEnabled(True)
+
+    def remove_preset(self, file_name):
+        """ Removes a preset's widget from the grid and closes the gap. """
+        self.presets.pop(file_name, None)
+        if self.folder_watcher:
+            self.folder_watcher.mark_synced(file_name)
+        widget = self.preset_widgets.pop(file_name, None)
+        if widget is None:
+            return
+        index = bisect.bisect_left(self.grid_order, file_name)
+        del self.grid_order[index]
+        self.replay_executor.stop(file_name)
+        self.grid_layout.removeWidget(widget)
+        widget.deleteLater()
+        self._reflow_grid(index)
+
+    def apply_folder_changes(self, changed, removed):
+        """ Slot for the folder watcher: applies external changes to the grid. """
+        for file_name in removed:
+            self.remove_preset(file_name)
+            forget_preset_state(file_name) # Its on/off state and run stats must not pass to a new preset of that name
+        for file_name in changed:
+            self.refresh_preset(file_name)
+
+    def refresh_preset(self, file_name):
+        """ Re-reads one preset file from disk and applies it to the grid. """
+        if not file_name.endswith(".slaunch"): # Same filter as load_presets
+            return
+        if self.folder_watcher:
+            self.folder_watcher.mark_synced(file_name) # Don't report our own read back as a change
+        preset_data = load_preset(file_name)
+        if preset_data is None:
+            self.remove_preset(file_name)
+        else:
+            self.insert_or_update_preset(preset_data)
 
 
     def open_add_dialog(self):
@@ -520,15 +759,74 @@ class MainWindow(QMainWindow):
 
     def handle_preset_saved(self, saved_preset_data):
         """ Slot to handle the preset_saved signal from PresetDialog. """
-        # --- Reload everything to ensure correct placement and updates ---
-        self.load_and_display_presets()
+        # --- Re-read just this file (keeps the recording lazy) and update its tile ---
+        self.refresh_preset(saved_preset_data['file_name'])
+
+
+    def _on_state_saved(self, file_name, success, message):
+        """ Reports a failed on/off state write from the background writer. """
+        if not success:
+            QMessageBox.warning(self, "Save Error", f"Could not update preset state:\n{message}")
+
+    def toggle_replay(self, file_name):
+        """ Queues the replay of a recorded preset, or stops/cancels the one it already has. """
+        if self.replay_executor.stop(file_name):
+            return
+        widget = self.preset_widgets.get(file_name)
+        if widget is None:
+            return
+        print(f"Attempting to replay embedded events for: {file_name}")
+        replay_plan = widget.get_replay_plan()
+        if not replay_plan:
+            QMessageBox.warning(self, "Replay Error", f"No valid recorded events found for preset: {file_name}")
+            return
+
+        preset_data = self.presets[file_name]
+        telemetry = ReplayTelemetry() if PresetWidget.record_replay_timing and ReplayTelemetry else None
+        job, queued, message = self.replay_executor.submit(
+            file_name, replay_plan, int(preset_data.get('how_many', 1)), preset_data.get('speed', 1.0),
+            preset_data.get('max_idle_gap', 0.0), preset_data.get('loop_gap', -1.0), telemetry)
+        if not queued: # Rejected, or the preset's previous replay is still stopping
+            QMessageBox.information(self, "Replay Not Started", message)
+            return
+        self.preset_writer.record_run(file_name)
+        print(f"Replay job {job.job_id} queued for {file_name}.")
+
+    def _on_replay_status(self, job, status):
+        """ Slot for ReplayExecutor.status_changed: updates the preset's ▶/■ button. """
+        current = self._replay_jobs.get(job.file_name)
+        if current is not None and current.job_id > job.job_id:
+            return # Late signal of an older replay of this preset
+        self._replay_jobs[job.file_name] = job
+        widget = self.preset_widgets.get(job.file_name)
+        if widget is not None:
+            # job.status rather than status: a RUNNING signal queued by the executor
+            # thread can arrive after the job was already asked to stop
+            widget.set_replay_status(job.status)
+
+    def _on_replay_progress(self, job, completed):
+        """ Slot for ReplayExecutor.progress: shows the repetitions done in the button's tooltip. """
+        widget = self.preset_widgets.get(job.file_name)
+        if widget is not None and widget._replay_status == RUNNING and widget.preset_type == "recorded":
+            total = "∞" if job.how_many == -1 else job.how_many
+            widget.action_button.setToolTip(f"Stop Replay ({completed}/{total} done)")
+
+    def _on_replay_finished(self, job):
+        """ Slot for ReplayExecutor.job_finished: reports errors and the timing telemetry. """
+        if self._replay_jobs.get(job.file_name) is job:
+            del self._replay_jobs[job.file_name]
+        if job.error:
+            QMessageBox.critical(self, "Replay Runtime Error", f"Error during replay:\n{job.error}")
+        widget = self.preset_widgets.get(job.file_name)
+        if widget is not None and job.telemetry is not None and job.telemetry.count:
+            widget.show_replay_telemetry(job.telemetry)
 
 
     def delete_preset_widget(self, file_name):
         """ Deletes the preset file and removes the widget from the grid. """
+        self.preset_writer.cancel(file_name) # A queued save must not bring the file back
         if delete_preset(file_name): # Try deleting the file first
-            # --- Reload everything after deletion ---
-            self.load_and_display_presets()
+            self.remove_preset(file_name)
         else:
             # delete_preset already showed an error message
             pass
@@ -545,21 +843,187 @@ class MainWindow(QMainWindow):
 
         if file_path:
             try:
-                base_name = os.path.basename(file_path)
-                dest_path = os.path.join(PRESETS_FOLDER, base_name)
-                count = 1
-                while os.path.exists(dest_path):
-                    name, ext = os.path.splitext(base_name)
-                    dest_path = os.path.join(PRESETS_FOLDER, f"{name}_{count}{ext}")
-                    count += 1
-                shutil.copy2(file_path, dest_path)
-                print(f"Imported '{file_path}' to '{dest_path}'")
-                self.load_and_display_presets() # Reload to show imported
-                QMessageBox.information(self, "Import Successful", f"Preset imported as '{os.path.basename(dest_path)}'.")
+                file_name = import_preset_file(file_path) # Copied to the folder or stored in the database
+                self.refresh_preset(file_name) # Show the imported preset
+                QMessageBox.information(self, "Import Successful", f"Preset imported as '{file_name}'.")
 
             except Exception as e:
                 QMessageBox.critical(self, "Import Error", f"Failed to import preset:\n{e}")
 
+    def import_library_archive(self):
+        """ Opens a file dialog to import a whole .zip/.tar bundle of presets. """
+        patterns = " ".join(f"*{ext}" for ext in preset_archive.ARCHIVE_EXTENSIONS)
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Import Presets from Archive", "",
+            f"Preset Archives ({patterns});;All Files (*)"
+        )
+        if file_path:
+            self._import_library(file_path)
+
+    def import_library_folder(self):
+        """ Opens a folder dialog to import every .slaunch file it contains. """
+        folder = QFileDialog.getExistingDirectory(self, "Import Presets from Folder")
+        if folder:
+            self._import_library(folder)
+
+    def _import_library(self, path):
+        """ Imports a folder/archive, then shows all imported presets with one grid update. """
+        try:
+            QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+            try:
+                imported, skipped = preset_archive.import_library(path)
+                presets = []
+                for file_name in imported:
+                    if self.folder_watcher:
+                        self.folder_watcher.mark_synced(file_name) # Our own writes, not external changes
+                    preset_data = load_preset(file_name)
+                    if preset_data is not None:
+                        presets.append(preset_data)
+                self.insert_presets(presets)
+            finally:
+                QApplication.restoreOverrideCursor()
+        except Exception as e:
+            QMessageBox.critical(self, "Import Error", f"Failed to import presets:\n{e}")
+            return
+
+        message = f"Imported {len(imported)} preset(s)."
+        if skipped:
+            details = "\n".join(f"{name}: {reason}" for name, reason in skipped[:10])
+            more = f"\n... and {len(skipped) - 10} more" if len(skipped) > 10 else ""
+            message += f"\n\nSkipped {len(skipped)} invalid entr{'y' if len(skipped) == 1 else 'ies'}:\n{details}{more}"
+            QMessageBox.warning(self, "Import Presets", message)
+        else:
+            QMessageBox.information(self, "Import Successful", message)
+
+    def _choose_presets(self, title, file_names=None):
+        """ Shows a checklist of all presets, or of file_names (all checked). Returns the chosen file names, or None. """
+        dialog = QDialog(self)
+        dialog.setWindowTitle(title)
+        layout = QVBoxLayout(dialog)
+        preset_list = QListWidget()
+        for file_name in self.grid_order if file_names is None else file_names:
+            item = QListWidgetItem(f"{self.presets[file_name]['title']} ({file_name})")
+            item.setData(Qt.ItemDataRole.UserRole, file_name)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked)
+            preset_list.addItem(item)
+        layout.addWidget(preset_list)
+
+        def set_all(state):
+            for row in range(preset_list.count()):
+                preset_list.item(row).setCheckState(state)
+
+        select_layout = QHBoxLayout()
+        select_all_button = QPushButton("Select All")
+        select_all_button.clicked.connect(lambda: set_all(Qt.CheckState.Checked))
+        select_none_button = QPushButton("Select None")
+        select_none_button.clicked.connect(lambda: set_all(Qt.CheckState.Unchecked))
+        select_layout.addWidget(select_all_button)
+        select_layout.addWidget(select_none_button)
+        select_layout.addStretch()
+        layout.addLayout(select_layout)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addWidget(buttons)
+        dialog.resize(420, 480)
+
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return None
+        return [preset_list.item(row).data(Qt.ItemDataRole.UserRole) for row in range(preset_list.count())
+                if preset_list.item(row).checkState() == Qt.CheckState.Checked]
+
+    def export_library(self):
+        """ Exports a selection of presets (all by default) to a single archive. """
+        if not self.presets:
+            QMessageBox.information(self, "Export Presets", "There are no presets to export.")
+            return
+        selected = self._choose_presets("Export Presets")
+        if not selected:
+            return
+
+        filters = {
+            "Zip Archive (*.zip)": ".zip",
+            "Gzipped Tar Archive (*.tar.gz)": ".tar.gz",
+            "Zstandard Tar Archive (*.tar.zst)": ".tar.zst",
+        }
+        save_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Export Presets As", "presets.zip", ";;".join(filters)
+        )
+        if not save_path:
+            return
+        if not preset_archive.is_archive_path(save_path):
+            save_path += filters.get(selected_filter, ".zip")
+        try:
+            count = preset_archive.export_library([self.presets[name] for name in selected], save_path)
+            QMessageBox.information(self, "Export Successful", f"Exported {count} preset(s) to '{os.path.basename(save_path)}'.")
+        except Exception as e:
+            QMessageBox.critical(self, "Export Error", f"Failed to export presets:\n{e}")
+
+    def optimize_recordings(self):
+        """ Runs the post-processing pipeline of chosen recorded presets on their recordings and saves them, reporting the changes. """
+        recorded = [name for name in self.grid_order if self.presets[name].get('type') == "recorded"]
+        if not recorded:
+            QMessageBox.information(self, "Optimize Recordings", "There are no recorded presets.")
+            return
+        if self._optimize_pending:
+            QMessageBox.information(self, "Optimize Recordings", "The previous optimization is still being saved.")
+            return
+        selected = self._choose_presets("Optimize Recordings", recorded)
+        if not selected:
+            return
+
+        self.preset_writer.flush(timeout=5) # Queued saves of these presets land first
+        self._optimize_report = []
+        for file_name in selected:
+            preset_data = self.presets[file_name]
+            events = get_recorded_events(preset_data)
+            if not events:
+                self._optimize_report.append((file_name, f"{preset_data['title']}: no recording"))
+                continue
+            try:
+                pipeline = pipeline_for_preset(preset_data)
+                optimized = list(pipeline.run(events, recording=False)) # Trim stages only apply when recording
+            except ValueError as e:
+                self._optimize_report.append((file_name, f"{preset_data['title']}: invalid post-processing stages ({e})"))
+                continue
+            except (KeyError, TypeError, AttributeError) as e:
+                self._optimize_report.append((file_name, f"{preset_data['title']}: skipped ({e})"))
+                continue
+            if optimized == events:
+                self._optimize_report.append((file_name, f"{preset_data['title']}: nothing to optimize"))
+                continue
+            size_before, size_after = move_decimation.record_section_size(events), move_decimation.record_section_size(optimized)
+            summary = (f"{len(events)} -> {len(optimized)} events, "
+                       f"{events[-1]['time'] - events[0]['time']:.1f} s -> {optimized[-1]['time'] - optimized[0]['time']:.1f} s, "
+                       f"{size_before / 1024:.1f} KiB -> {size_after / 1024:.1f} KiB")
+            # Saved in the background; reported once the writer is done with every preset
+            self._optimize_pending[file_name] = (preset_data['title'], f"{preset_data['title']} ({pipeline.describe()}): {summary}")
+            self.preset_writer.save(dict(preset_data, recorded_events=optimized))
+        if not self._optimize_pending:
+            self._show_optimize_report()
+
+    def _on_optimized_saved(self, file_name, success, message):
+        """ Slot for PresetWriter.save_finished: applies a saved optimized recording. """
+        if file_name not in self._optimize_pending:
+            return # Not one of ours
+        title, line = self._optimize_pending.pop(file_name)
+        if success:
+            self.refresh_preset(file_name)
+        else:
+            line = f"{title}: not saved ({message})"
+        self._optimize_report.append((file_name, line))
+        if not self._optimize_pending:
+            self._show_optimize_report()
+
+    def _show_optimize_report(self):
+        order = {file_name: i for i, file_name in enumerate(self.grid_order)}
+        self._optimize_report.sort(key=lambda item: order.get(item[0], len(order)))
+        lines = [line for _, line in self._optimize_report]
+        self._optimize_report = []
+        QMessageBox.information(self, "Optimize Recordings", "\n".join(lines))
+
     def export_preset(self):
         """ Opens a dialog to choose a preset and then a file dialog to export it. """
         preset_items = {fname: f"{data['title']} ({fname})" for fname, data in self.presets.items()}
@@ -580,7 +1044,6 @@ class MainWindow(QMainWindow):
                     break
 
             if selected_fname and selected_fname in self.presets:
-                source_path = os.path.join(PRESETS_FOLDER, selected_fname)
                 suggested_name = selected_fname
                 save_path, _ = QFileDialog.getSaveFileName(
                     self, "Export Preset As", suggested_name,
@@ -588,7 +1051,8 @@ class MainWindow(QMainWindow):
                 )
                 if save_path:
                     try:
-                        shutil.copy2(source_path, save_path)
+                        # Carries the current on/off state, which is kept outside the preset file
+                        export_preset_file(self.presets[selected_fname], save_path)
                         QMessageBox.information(self, "Export Successful", f"Preset exported to '{os.path.basename(save_path)}'.")
                     except Exception as e:
                         QMessageBox.critical(self, "Export Error", f"Failed to export preset:\n{e}")
@@ -596,6 +1060,20 @@ class MainWindow(QMainWindow):
                  QMessageBox.warning(self, "Export Error", "Selected preset could not be found.")
 
 
+    def closeEvent(self, event):
+        """ Stops replays and waits for queued preset writes before the window (and the app) goes away. """
+        self.replay_executor.stop_all()
+        if not self.replay_executor.wait_idle(timeout=2): # Lets the replay release held keys/buttons
+            print("Warning: A replay was still stopping at exit.")
+        if self.process_replayer is not None:
+            self.process_replayer.shutdown()
+        if recorder_process is not None:
+            recorder_process.shutdown_recorder_host()
+        if not self.preset_writer.flush(timeout=10):
+            print("Warning: Some preset writes were still pending at exit.")
+        super().closeEvent(event)
+
+
     def apply_theme(self, dark_mode=False):
         """Applies the selected theme stylesheet to the application."""
         # ... (logic remains the same) ...
@@ -610,6 +1088,7 @@ class MainWindow(QMainWindow):
 
 # --- Main Execution ---
 if __name__ == '__main__':
+    multiprocessing.freeze_support() # The replay process is started from the frozen executable too
     os.makedirs(PRESETS_FOLDER, exist_ok=True)
     assets_icons = os.path.join(os.path.dirname(__file__), 'assets', 'app_icons')
     os.makedirs(assets_icons, exist_ok=True)
@@ -0,0 +1,123 @@
+import io
+import math
+
+from event_codec import write_record_section
+
+# --- Mouse-move decimation ---
+# High polling-rate mice report hundreds of mouse_move events per second, most of
+# them a pixel or two apart. Decimation thins out runs of consecutive mouse_move
+# events; everything else is left alone:
+#
+#   * clicks, scrolls, key events and voids are always kept,
+#   * the first and last move of every run are always kept, so the pointer is
+#     exactly where it was before each click/key event.
+#
+# Two optional stages are applied to each run, in this order:
+#
+#   1. time buckets: at most one move per bucket_ms (the last move of each
+#      bucket, i.e. where the pointer was at the end of it);
+#   2. Ramer-Douglas-Peucker: a move is dropped when it lies within tolerance_px
+#      of the straight line between the kept moves around it. The line position
+#      is interpolated at the move's own time, so a change of speed counts as a
+#      deviation just like a change of direction. A kept segment never spans
+#      more than max_segment_ms, so slow drags don't turn into single jumps.
+
+DEFAULT_BUCKET_MS = 4.0 # 250 Hz is smooth enough for any replay target (0 = off)
+DEFAULT_TOLERANCE_PX = 1.0 # Path simplification tolerance (0 = off)
+DEFAULT_MAX_SEGMENT_MS = 50.0
+MAX_RUN_MOVES = 100_000 # Longer runs are thinned in pieces (bounds memory on long recordings)
+
+DECIMATE_ON_RECORD = True # Part of the default recording pipeline (recording_pipeline)
+
+
+def _bucket_run(run, bucket_s):
+    """ Keeps the first move and the last move of each time bucket. """
+    kept = [run[0]]
+    start = run[0]['time']
+    for i in range(1, len(run)):
+        event = run[i]
+        nxt = run[i + 1] if i + 1 < len(run) else None
+        if nxt is None or (nxt['time'] - start) // bucket_s != (event['time'] - start) // bucket_s:
+            kept.append(event)
+    return kept
+
+
+def _simplify_run(run, tolerance, max_segment_s):
+    """ Time-synchronized Ramer-Douglas-Peucker over a run of moves (iterative). """
+    keep = [False] * len(run)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(run) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        a, b = run[first], run[last]
+        ax, ay, at = a['x'], a['y'], a['time']
+        span = b['time'] - at
+        dx, dy = b['x'] - ax, b['y'] - ay
+        worst, worst_i = -1.0, first
+        for i in range(first + 1, last):
+            p = run[i]
+            frac = (p['time'] - at) / span if span > 0 else 0.0
+            dist = math.hypot(p['x'] - (ax + frac * dx), p['y'] - (ay + frac * dy))
+            if dist > worst:
+                worst, worst_i = dist, i
+        if worst <= tolerance and span <= max_segment_s:
+            continue # Everything in between can go
+        if worst <= tolerance:
+            worst_i = (first + last) // 2 # Segment too long in time: split it in the middle
+        keep[worst_i] = True
+        stack.append((first, worst_i))
+        stack.append((worst_i, last))
+    return [event for event, k in zip(run, keep) if k]
+
+
+def iter_decimated_moves(events, bucket_ms=None, tolerance_px=None, max_segment_ms=None):
+    """
+    Generator version of decimate_moves for event streams (e.g. a long
+    recording being finalized): only the current run of moves is held, and a
+    run is cut after MAX_RUN_MOVES moves so that stays bounded too.
+    """
+    bucket_ms = DEFAULT_BUCKET_MS if bucket_ms is None else bucket_ms
+    tolerance_px = DEFAULT_TOLERANCE_PX if tolerance_px is None else tolerance_px
+    max_segment_s = (DEFAULT_MAX_SEGMENT_MS if max_segment_ms is None else max_segment_ms) / 1000
+
+    def thin(run):
+        if len(run) > 2:
+            if bucket_ms > 0:
+                run = _bucket_run(run, bucket_ms / 1000)
+            if tolerance_px > 0 and len(run) > 2:
+                run = _simplify_run(run, tolerance_px, max_segment_s)
+        return run
+
+    run = []
+    for event in events:
+        if event.get('type') == 'mouse_move':
+            run.append(event)
+            if len(run) >= MAX_RUN_MOVES:
+                yield from thin(run)
+                run = []
+        else:
+            if run:
+                yield from thin(run)
+                run = []
+            yield event
+    if run:
+        yield from thin(run)
+
+
+def decimate_moves(events, bucket_ms=None, tolerance_px=None, max_segment_ms=None):
+    """
+    Returns a new event list with runs of mouse_move events thinned out
+    (see the module notes). Events are not copied. Arguments default to the
+    DEFAULT_* settings; pass 0 to disable a stage.
+    """
+    return list(iter_decimated_moves(events, bucket_ms, tolerance_px, max_segment_ms))
+
+
+def record_section_size(events):
+    """ Size in bytes of the record= section these events would be saved as. """
+    buf = io.StringIO()
+    write_record_section(buf, events)
+    return len(buf.getvalue().encode('utf-8'))
+
@@ -0,0 +1,224 @@
+import io
+import os
+import tarfile
+import time
+import zipfile
+
+import utils
+from preset_db import read_slaunch_for_db
+from slaunch_format import decode_recorded_events
+
+# --- Bulk import/export of preset libraries ---
+# A library is a folder of .slaunch files or an archive of them (.zip, .tar,
+# .tar.gz/.tgz, .tar.xz, or .tar.zst when the optional 'zstandard' package is
+# installed). Archives are streamed entry by entry: each entry is read,
+# validated and written before the next one is looked at, so a bundle of
+# hundreds of presets never has to be extracted or held in memory at once.
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.xz", ".tar.zst")
+MAX_ENTRY_BYTES = 256 * 1024 * 1024 # Larger entries are skipped (corrupt or hostile archive)
+PRESET_TYPES = ("standard", "on_off", "recorded")
+
+try:
+    import zstandard # Optional, only needed for .tar.zst bundles
+except ImportError:
+    zstandard = None
+
+
+def is_archive_path(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _iter_folder(folder):
+    with os.scandir(folder) as it:
+        entries = sorted((e for e in it if e.name.endswith(".slaunch") and e.is_file()), key=lambda e: e.name)
+    for entry in entries:
+        if entry.stat().st_size > MAX_ENTRY_BYTES:
+            yield entry.name, None
+            continue
+        with open(entry.path, "rb") as f:
+            yield entry.name, f.read()
+
+
+def _iter_zip(path):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.endswith(".slaunch"):
+                continue
+            if info.file_size > MAX_ENTRY_BYTES:
+                yield info.filename, None
+                continue
+            with archive.open(info) as member:
+                yield info.filename, member.read(MAX_ENTRY_BYTES + 1)
+
+
+def _iter_tar_stream(fileobj=None, path=None):
+    # "r|*" reads the members sequentially (no seeking), whatever the compression
+    with tarfile.open(name=path, fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.endswith(".slaunch"):
+                continue
+            if member.size > MAX_ENTRY_BYTES:
+                yield member.name, None
+                continue
+            member_file = archive.extractfile(member)
+            yield member.name, member_file.read() if member_file else None
+
+
+def _iter_tar_zst(path):
+    if zstandard is None:
+        raise RuntimeError("Reading .tar.zst bundles needs the 'zstandard' package (pip install zstandard).")
+    with open(path, "rb") as raw:
+        with zstandard.ZstdDecompressor().stream_reader(raw) as stream:
+            yield from _iter_tar_stream(fileobj=stream)
+
+
+def iter_library_entries(path):
+    """ Yields (entry_name, content bytes or None if too large) for every .slaunch in a folder or archive. """
+    lower = path.lower()
+    if os.path.isdir(path):
+        return _iter_folder(path)
+    if lower.endswith(".zip"):
+        return _iter_zip(path)
+    if lower.endswith(".tar.zst"):
+        return _iter_tar_zst(path)
+    if lower.endswith(ARCHIVE_EXTENSIONS):
+        return _iter_tar_stream(path=path)
+    raise ValueError(f"Unsupported preset library: {os.path.basename(path)}")
+
+
+def validate_preset_entry(entry_name, content):
+    """
+    Parses one .slaunch entry, recording included. Returns (preset_data,
+    recording, text) or raises ValueError describing why the entry cannot be
+    imported.
+    """
+    if content is None or len(content) > MAX_ENTRY_BYTES:
+        raise ValueError("entry is too large")
+    try:
+        text = content.decode('utf-8') # Preset files are UTF-8 text
+    except UnicodeDecodeError:
+        raise ValueError("not a UTF-8 text file")
+    preset_data, recording = read_slaunch_for_db(io.BytesIO(content), os.path.basename(entry_name))
+    if preset_data is None:
+        raise ValueError("missing title/type/icon header")
+    if preset_data['type'] not in PRESET_TYPES:
+        raise ValueError(f"unknown preset type '{preset_data['type']}'")
+    if preset_data['type'] == "recorded" and recording is None:
+        raise ValueError("recorded preset has no recording")
+    if recording is not None and decode_recorded_events(recording, entry_name) is None:
+        raise ValueError("recording is corrupt or truncated") # Would only fail later, at replay
+    return preset_data, recording, text
+
+
+def _free_name(base_name, taken):
+    """ Returns base_name, or base_name_1/_2/... if it is taken, and reserves it. """
+    name, ext = os.path.splitext(base_name)
+    file_name, count = base_name, 1
+    while file_name in taken:
+        file_name = f"{name}_{count}{ext}"
+        count += 1
+    taken.add(file_name)
+    return file_name
+
+
+def import_library(path):
+    """
+    Imports every valid preset of a folder or archive.
+    Name collisions (with existing presets and within the bundle) are resolved
+    against a single listing of the store, taken once up front.
+    Returns (imported file names, [(entry_name, reason)] of skipped entries).
+    """
+    if utils.using_preset_db():
+        db = utils.get_preset_db()
+        taken = db.file_names()
+    else:
+        db = None
+        taken = {f for f in os.listdir(utils.PRESETS_FOLDER) if f.endswith(".slaunch")}
+
+    imported, skipped, batch = [], [], []
+    for entry_name, content in iter_library_entries(path):
+        try:
+            preset_data, recording, text = validate_preset_entry(entry_name, content)
+        except ValueError as e:
+            print(f"Skipping '{entry_name}': {e}")
+            skipped.append((entry_name, str(e)))
+            continue
+        file_name = _free_name(os.path.basename(entry_name), taken)
+        preset_data['file_name'] = file_name
+        if db is not None:
+            batch.append((preset_data, recording)) # Written in one transaction below
+        else:
+            try:
+                utils.write_preset_text(file_name, text) # File content is kept byte for byte
+            except OSError as e:
+                print(f"Error importing '{entry_name}': {e}")
+                skipped.append((entry_name, str(e)))
+                taken.discard(file_name)
+                continue
+        imported.append(file_name)
+
+    if db is not None and batch:
+        db.save_many(batch)
+    print(f"Imported {len(imported)} preset(s) from '{path}', skipped {len(skipped)}.")
+    return imported, skipped
+
+
+def _preset_bytes(preset_data):
+    """ The .slaunch content to export for a preset (current on/off state included). """
+    if utils.using_preset_db() or preset_data.get('type') == "on_off":
+        return utils.serialize_preset(preset_data).encode('utf-8')
+    with open(os.path.join(utils.PRESETS_FOLDER, preset_data['file_name']), "rb") as f:
+        return f.read()
+
+
+def export_library(presets, dest_path):
+    """
+    Writes presets (a list of preset dicts) to a .zip/.tar* archive or into a folder.
+    Entries are written one at a time. Returns the number of presets exported.
+    """
+    lower = dest_path.lower()
+    count = 0
+    if lower.endswith(".zip"):
+        # Recordings are usually compressed already, so deflate stays at a fast level
+        with zipfile.ZipFile(dest_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=3) as archive:
+            for preset_data in presets:
+                archive.writestr(preset_data['file_name'], _preset_bytes(preset_data))
+                count += 1
+    elif lower.endswith(ARCHIVE_EXTENSIONS):
+        count = _export_tar(presets, dest_path)
+    else:
+        os.makedirs(dest_path, exist_ok=True)
+        for preset_data in presets:
+            with open(os.path.join(dest_path, preset_data['file_name']), "wb") as f:
+                f.write(_preset_bytes(preset_data))
+            count += 1
+    print(f"Exported {count} preset(s) to '{dest_path}'")
+    return count
+
+
+def _export_tar(presets, dest_path):
+    lower = dest_path.lower()
+    if lower.endswith(".tar.zst"):
+        if zstandard is None:
+            raise RuntimeError("Writing .tar.zst bundles needs the 'zstandard' package (pip install zstandard).")
+        with open(dest_path, "wb") as raw:
+            with zstandard.ZstdCompressor(level=3).stream_writer(raw) as stream:
+                with tarfile.open(fileobj=stream, mode="w|") as archive:
+                    return _write_tar_entries(archive, presets)
+    mode = "w:gz" if lower.endswith((".tar.gz", ".tgz")) else "w:xz" if lower.endswith(".tar.xz") else "w"
+    with tarfile.open(dest_path, mode) as archive:
+        return _write_tar_entries(archive, presets)
+
+
+def _write_tar_entries(archive, presets):
+    count = 0
+    for preset_data in presets:
+        content = _preset_bytes(preset_data)
+        info = tarfile.TarInfo(preset_data['file_name'])
+        info.size = len(content)
+        info.mtime = int(time.time())
+        info.mode = 0o644
+        archive.addfile(info, io.BytesIO(content))
+        count += 1
+    return count
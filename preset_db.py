@@ -0,0 +1,278 @@
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+
+from event_codec import encode_record_blob, record_section_to_blob
+from slaunch_format import new_preset_data, parse_preset_stream
+
+# --- SQLite preset store ---
+# Alternative to one .slaunch file per preset: every preset is a row of a single
+# database, with indexed title/type columns for listing and searching. The
+# recording is stored as a blob holding the binary form of the record= section
+# (the packed or compressed payload without its base64, see event_codec), and
+# is only fetched when a replay or the edit dialog needs it.
+
+SCHEMA_VERSION = 5 # 2: speed/max_idle_gap columns, 3: loop_gap, 4: postprocess, 5: binary recordings
+_COLUMNS = ('title', 'type', 'icon', 'script', 'script_on', 'script_off', 'on_off_state', 'how_many',
+            'speed', 'max_idle_gap', 'loop_gap', 'postprocess')
+_DEFAULTS = ("", "standard", "none", "", "", "", False, 1, 1.0, 0.0, -1.0, "")
+
+# Columns added after version 1, created on existing databases when they are opened
+_ADDED_COLUMNS = {
+    'speed': "REAL NOT NULL DEFAULT 1.0",
+    'max_idle_gap': "REAL NOT NULL DEFAULT 0.0",
+    'loop_gap': "REAL NOT NULL DEFAULT -1.0",
+    'postprocess': "TEXT NOT NULL DEFAULT ''",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS presets (
+    file_name    TEXT PRIMARY KEY,
+    title        TEXT NOT NULL DEFAULT '',
+    type         TEXT NOT NULL DEFAULT 'standard',
+    icon         TEXT NOT NULL DEFAULT 'none',
+    script       TEXT NOT NULL DEFAULT '',
+    script_on    TEXT NOT NULL DEFAULT '',
+    script_off   TEXT NOT NULL DEFAULT '',
+    on_off_state INTEGER NOT NULL DEFAULT 0,
+    how_many     INTEGER NOT NULL DEFAULT 1,
+    speed        REAL NOT NULL DEFAULT 1.0,
+    max_idle_gap REAL NOT NULL DEFAULT 0.0,
+    loop_gap     REAL NOT NULL DEFAULT -1.0,
+    postprocess  TEXT NOT NULL DEFAULT '',
+    recording    BLOB,
+    revision     INTEGER NOT NULL DEFAULT 0,
+    updated      REAL
+);
+CREATE INDEX IF NOT EXISTS presets_title ON presets(title COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS presets_type ON presets(type);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def encode_recording(events):
+    """ Returns the recording blob of a recording (None for no recording). """
+    if not events:
+        return None
+    return encode_record_blob(events)
+
+
+def _section_to_blob(recording, file_name):
+    """ record_section_to_blob, keeping a section it cannot convert as it is (reported when it is decoded). """
+    try:
+        return record_section_to_blob(recording)
+    except ValueError as e:
+        print(f"Warning: Could not convert the recording of {file_name}: {e}")
+        return recording
+
+
+class PresetDatabase:
+    """
+    SQLite-backed preset storage with the same operations as the .slaunch folder:
+    load all, load one, save, delete (plus search and bulk field updates).
+    One connection is shared by the GUI and writer threads behind a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL") # Readers don't block the writer thread
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            existing = {row['name'] for row in self._conn.execute("PRAGMA table_info(presets)")}
+            for column, definition in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    print(f"Upgrading preset store: adding column '{column}'")
+                    self._conn.execute(f"ALTER TABLE presets ADD COLUMN {column} {definition}")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < 5:
+                self._convert_text_recordings()
+            self._conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _convert_text_recordings(self):
+        """ Rewrites packed recordings stored as base64 text (before version 5) in the binary form. """
+        names = [row[0] for row in self._conn.execute(
+            "SELECT file_name FROM presets WHERE substr(recording, 1, 7) = CAST('!slrec/' AS BLOB)")]
+        if not names:
+            return
+        print(f"Upgrading preset store: converting {len(names)} recording(s) to binary")
+        with self._transaction():
+            for file_name in names:
+                (recording,) = self._conn.execute(
+                    "SELECT recording FROM presets WHERE file_name = ?", (file_name,)).fetchone()
+                blob = _section_to_blob(recording, file_name)
+                if blob is not recording: # Same events: the revision (cache key) stays
+                    self._conn.execute("UPDATE presets SET recording = ? WHERE file_name = ?", (blob, file_name))
+
+    # --- Reading ---
+
+    def _row_to_preset(self, row):
+        preset_data = new_preset_data(row['file_name'])
+        for column in _COLUMNS:
+            preset_data[column] = row[column]
+        preset_data['on_off_state'] = bool(row['on_off_state'])
+        return preset_data
+
+    def load_all(self):
+        """ Returns [(preset_data, revision, has_recording)] of every preset, in file-name order. """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT file_name, {', '.join(_COLUMNS)}, revision, recording IS NOT NULL AS has_recording "
+                "FROM presets ORDER BY file_name").fetchall()
+        return [(self._row_to_preset(row), row['revision'], bool(row['has_recording'])) for row in rows]
+
+    def load(self, file_name):
+        """ Returns (preset_data, revision, has_recording) of one preset, or None. """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT file_name, {', '.join(_COLUMNS)}, revision, recording IS NOT NULL AS has_recording "
+                "FROM presets WHERE file_name = ?", (file_name,)).fetchone()
+        if row is None:
+            return None
+        return self._row_to_preset(row), row['revision'], bool(row['has_recording'])
+
+    def load_recording(self, file_name):
+        """ Returns (recording blob, revision) of a preset, or (None, None). """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT recording, revision FROM presets WHERE file_name = ?", (file_name,)).fetchone()
+        if row is None:
+            return None, None
+        return row['recording'], row['revision']
+
+    def file_names(self):
+        """ Returns the set of stored preset file names. """
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT file_name FROM presets")}
+
+    def search(self, text=None, preset_type=None):
+        """ Returns the file names of presets whose title contains `text` and/or of a given type. """
+        clauses, params = [], []
+        if text:
+            clauses.append("title LIKE ? ESCAPE '\\' COLLATE NOCASE")
+            escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"%{escaped}%")
+        if preset_type:
+            clauses.append("type = ?")
+            params.append(preset_type)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT file_name FROM presets {where} ORDER BY file_name", params)
+            return [row[0] for row in rows]
+
+    # --- Writing ---
+
+    def save(self, preset_data, recording):
+        """ Inserts or replaces a preset. `recording` is the recording blob (or None). """
+        values = [preset_data.get(column, default) for column, default in zip(_COLUMNS, _DEFAULTS)]
+        values[_COLUMNS.index('on_off_state')] = int(bool(values[_COLUMNS.index('on_off_state')]))
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO presets (file_name, {', '.join(_COLUMNS)}, recording, revision, updated) "
+                f"VALUES (?, {', '.join('?' * len(_COLUMNS))}, ?, 0, ?) "
+                "ON CONFLICT(file_name) DO UPDATE SET "
+                f"{', '.join(f'{c} = excluded.{c}' for c in _COLUMNS)}, "
+                "recording = excluded.recording, revision = revision + 1, updated = excluded.updated",
+                (preset_data['file_name'], *values, recording, time.time()))
+
+    def save_many(self, items):
+        """ Saves [(preset_data, recording)] in a single transaction. """
+        with self._lock, self._transaction():
+            for preset_data, recording in items:
+                self.save(preset_data, recording)
+
+    def update_fields(self, file_names, fields):
+        """ Sets the same column values on many presets in one transaction. Returns the row count. """
+        unknown = set(fields) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown preset fields: {', '.join(sorted(unknown))}")
+        if not fields or not file_names:
+            return 0
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        values = list(fields.values())
+        with self._lock, self._transaction():
+            count = 0
+            for file_name in file_names:
+                cursor = self._conn.execute(
+                    f"UPDATE presets SET {assignments}, revision = revision + 1, updated = ? WHERE file_name = ?",
+                    (*values, time.time(), file_name))
+                count += cursor.rowcount
+            return count
+
+    def delete(self, file_name):
+        """ Deletes a preset. Returns True if it existed. """
+        with self._lock:
+            return self._conn.execute("DELETE FROM presets WHERE file_name = ?", (file_name,)).rowcount > 0
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """ Runs a block of statements as one transaction. Caller holds the lock. """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    # --- Migration from a .slaunch folder ---
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def migrate_from_folder(self, folder):
+        """
+        One-time import of every .slaunch file in `folder` (the files are left in place).
+        Returns the number of presets imported, or 0 if the migration already ran.
+        """
+        if self.get_meta('migrated_from') is not None:
+            return 0
+        imported = 0
+        names = sorted(f for f in os.listdir(folder) if f.endswith(".slaunch")) if os.path.isdir(folder) else []
+        with self._lock, self._transaction():
+            for file_name in names:
+                try:
+                    with open(os.path.join(folder, file_name), "rb") as f:
+                        preset_data, recording = read_slaunch_for_db(f, file_name)
+                except Exception as e:
+                    print(f"Error migrating preset {file_name}: {e}")
+                    continue
+                if preset_data is None:
+                    continue
+                self.save(preset_data, recording)
+                imported += 1
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)", (folder,))
+        print(f"Migrated {imported} preset(s) from {folder} into {self.path}")
+        return imported
+
+
+def read_slaunch_for_db(stream, file_name):
+    """
+    Parses a .slaunch stream for storage in the database. The record= section is
+    converted to a recording blob without being decoded. Returns (preset_data,
+    recording) or (None, None).
+    """
+    preset_data, record_offset = parse_preset_stream(stream, file_name)
+    if preset_data is None:
+        return None, None
+    recording = None
+    if preset_data['type'] == "recorded" and record_offset is not None:
+        recording = stream.read()
+        if not recording or recording.isspace() or recording.strip() == b"[]":
+            recording = None
+        else:
+            recording = _section_to_blob(recording, file_name)
+    return preset_data, recording
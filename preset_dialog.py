@@ -3,19 +3,24 @@ import os
 
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QTextEdit, QWidget,
-    QPushButton, QComboBox, QFrame, QMessageBox, QFileDialog, QSpinBox, QCheckBox,
+    QPushButton, QComboBox, QFrame, QMessageBox, QFileDialog, QSpinBox, QDoubleSpinBox, QCheckBox,
     QSizePolicy
 )
 from PyQt6.QtCore import pyqtSignal, Qt
 from PyQt6.QtGui import QIcon
 
 # Assuming utils.py and recording_module.py are in the same directory or accessible
-from utils import save_preset, get_icon_path, ICONS_FOLDER
+from utils import get_icon_path, get_recorded_events, ICONS_FOLDER
+from recording_segment import SpilledRecording
+from recording_pipeline import RecordingPipeline, DEFAULT_PIPELINE_SPEC
+from preset_writer import get_preset_writer
 from icon_gallery import IconGalleryDialog
 # Use embedded data, remove save_record/load_record if not needed for dialog logic
 try:
     from recording_module import Recorder
+    import recorder_process
 except ImportError:
+    recorder_process = None
     # Dummy Recorder if module not found
     class Recorder:
         def start_recording(self): print("Dummy Recorder: Start")
@@ -28,15 +33,23 @@ MAX_TITLE_LENGTH = 48 # Strict 32 character limit (2 lines of 16)
 
 class PresetDialog(QDialog):
     preset_saved = pyqtSignal(dict)
+    stop_gesture_detected = pyqtSignal() # Emitted from the recorder's timer thread, handled on the GUI thread
 
     def __init__(self, preset_data=None, parent=None):
         super().__init__(parent)
         self.preset_data = preset_data if preset_data else {}
         self.is_editing = preset_data is not None
         self.selected_icon = self.preset_data.get('icon', 'none')
-        self.recorder = Recorder()
-        # Store embedded data if editing
-        self.recorded_events_data = self.preset_data.get('recorded_events') # Use embedded data
+        if recorder_process is not None and recorder_process.RECORD_IN_SEPARATE_PROCESS:
+            self.recorder = recorder_process.ProcessRecorder() # Listeners run in the recorder process
+        else:
+            self.recorder = Recorder()
+        self.recorder.on_stop_gesture = self.stop_gesture_detected.emit # Stop through the dialog, keeping the events
+        self.stop_gesture_detected.connect(self._on_stop_gesture)
+        # Store embedded data if editing (decoded from disk only for recorded presets)
+        self.recorded_events_data = None
+        if self.preset_data.get('type') == "recorded":
+            self.recorded_events_data = get_recorded_events(self.preset_data)
 
         self.setWindowTitle("Edit Preset" if self.is_editing else "Add New Preset")
         self.setMinimumSize(600, 500)
@@ -146,8 +159,51 @@ class PresetDialog(QDialog):
         self.replay_count_spin.setSpecialValueText("Infinite (-1)")
         self.replay_count_spin.setValue(self.preset_data.get('how_many', 1))
         replay_layout.addWidget(self.replay_count_spin)
+        replay_layout.addWidget(QLabel("Loop Gap:"))
+        self.loop_gap_spin = QDoubleSpinBox()
+        self.loop_gap_spin.setRange(-1.0, 60.0) # -1 = default pause
+        self.loop_gap_spin.setSingleStep(0.1)
+        self.loop_gap_spin.setSuffix(" s")
+        self.loop_gap_spin.setSpecialValueText("Default")
+        self.loop_gap_spin.setToolTip("Pause between repetitions (0 = back to back). Default: 0.5 s, 0.1 s when infinite.")
+        self.loop_gap_spin.setValue(self.preset_data.get('loop_gap', -1.0))
+        replay_layout.addWidget(self.loop_gap_spin)
         replay_layout.addStretch()
         recorded_layout.addLayout(replay_layout)
+        timing_layout = QHBoxLayout()
+        timing_layout.addWidget(QLabel("Speed:"))
+        self.speed_spin = QDoubleSpinBox()
+        self.speed_spin.setRange(0.0, 20.0) # 0 = as fast as possible
+        self.speed_spin.setSingleStep(0.25)
+        self.speed_spin.setSuffix("x")
+        self.speed_spin.setSpecialValueText("As fast as possible")
+        self.speed_spin.setToolTip("Replay speed multiplier. At the minimum, only short pauses around clicks and key presses are kept.")
+        self.speed_spin.setValue(self.preset_data.get('speed', 1.0))
+        timing_layout.addWidget(self.speed_spin)
+        timing_layout.addWidget(QLabel("Max Idle Gap:"))
+        self.idle_gap_spin = QDoubleSpinBox()
+        self.idle_gap_spin.setRange(0.0, 600.0) # 0 = no cap
+        self.idle_gap_spin.setSingleStep(0.5)
+        self.idle_gap_spin.setSuffix(" s")
+        self.idle_gap_spin.setSpecialValueText("No limit")
+        self.idle_gap_spin.setToolTip("Pauses longer than this (after the speed is applied) are shortened to it.")
+        self.idle_gap_spin.setValue(self.preset_data.get('max_idle_gap', 0.0))
+        timing_layout.addWidget(self.idle_gap_spin)
+        timing_layout.addStretch()
+        recorded_layout.addLayout(timing_layout)
+        pipeline_layout = QHBoxLayout()
+        pipeline_layout.addWidget(QLabel("Post-processing:"))
+        self.pipeline_edit = QLineEdit(self.preset_data.get('postprocess', ""))
+        self.pipeline_edit.setPlaceholderText(f"Default: {DEFAULT_PIPELINE_SPEC}")
+        self.pipeline_edit.setToolTip(
+            "Stages applied when a recording stops (and by Replay > Optimize Recordings), in order:\n"
+            "trim_start:<s>, trim_end:<s> - drop the first/last seconds (when recording only)\n"
+            "repair - release buttons and keys left pressed at the end\n"
+            "dedupe - drop mouse moves that don't move the pointer\n"
+            "decimate[:bucket_ms[:tolerance_px]] - thin out mouse moves\n"
+            "cap_idle:<s> - shorten pauses longer than s seconds")
+        pipeline_layout.addWidget(self.pipeline_edit)
+        recorded_layout.addLayout(pipeline_layout)
         self.recorded_widget.setVisible(False)
         self.stacked_layout.addWidget(self.recorded_widget)
 
@@ -157,9 +213,9 @@ class PresetDialog(QDialog):
         self.save_button = QPushButton("Save")
         self.save_button.clicked.connect(self.save_and_close)
         button_layout.addWidget(self.save_button)
-        cancel_button = QPushButton("Cancel")
-        cancel_button.clicked.connect(self.reject)
-        button_layout.addWidget(cancel_button)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(self.cancel_button)
         layout.addLayout(button_layout)
 
         self.update_ui_for_type(self.type_combo.currentText())
@@ -182,9 +238,17 @@ class PresetDialog(QDialog):
     def toggle_recording(self):
         """ Starts or stops the recording process (for embedded data). """
         if self.record_button.isChecked(): # Start recording
+            try:
+                self.recorder.pipeline = RecordingPipeline(self.pipeline_edit.text().strip() or None)
+            except ValueError as e:
+                QMessageBox.warning(self, "Input Error", f"Invalid post-processing stages:\n{e}")
+                self.record_button.setChecked(False)
+                return
             self.set_controls_enabled(False)
-            self.record_button.setText("Stop Recording (Hold LClick+Shift 2s)")
-            self.record_status_label.setText("RECORDING... Hold Left Click + Shift for 2s to stop.")
+            gesture = getattr(self.recorder, 'stop_gesture', None)
+            hold_text = f"Hold {gesture.describe()}" if gesture else "Click again"
+            self.record_button.setText(f"Stop Recording ({hold_text})")
+            self.record_status_label.setText(f"RECORDING... {hold_text} to stop.")
             self.recorded_events_data = None # Clear previous data
             self.recorder.start_recording()
         else: # Stop recording
@@ -196,21 +260,31 @@ class PresetDialog(QDialog):
             self.record_button.setChecked(False) # Ensure unchecked after stop
 
             if events:
-                self.recorded_events_data = events # Store the list directly
+                self.recorded_events_data = events # The list, or a SpilledRecording for a long recording
                 self.record_status_label.setText(f"Recording data available ({len(self.recorded_events_data)} events).")
-                QMessageBox.information(self, "Recording Captured", f"Captured {len(events)} events.")
+                message = f"Captured {len(events)} events."
+                if getattr(self.recorder, 'pipeline_summary', None):
+                    message += f"\nPost-processing: {self.recorder.pipeline_summary}."
+                QMessageBox.information(self, "Recording Captured", message)
             else:
                 status_text = "Recording stopped. No events captured or error occurred."
-                if self.is_editing and self.preset_data.get('recorded_events'): # Check original data if editing
-                     prev_count = len(self.preset_data.get('recorded_events', []))
+                previous_events = get_recorded_events(self.preset_data) if self.is_editing else None
+                if previous_events: # Check original data if editing
+                     prev_count = len(previous_events)
                      status_text += f"\nKeeping previous data ({prev_count} events)."
-                     self.recorded_events_data = self.preset_data.get('recorded_events') # Restore previous
+                     self.recorded_events_data = previous_events # Restore previous
                 else:
                      status_text += "\nNo previous data available."
                      self.recorded_events_data = None # Ensure it's cleared
                 self.record_status_label.setText(status_text)
 
 
+    def _on_stop_gesture(self):
+        """ The stop gesture was held during recording: same as clicking Stop Recording. """
+        if self.record_button.isChecked():
+            self.record_button.setChecked(False)
+            self.toggle_recording()
+
     def set_controls_enabled(self, enabled):
         """ Enable/disable controls, especially during recording. """
         self.title_edit.setEnabled(enabled)
@@ -220,6 +294,10 @@ class PresetDialog(QDialog):
         self.on_off_widget.setEnabled(enabled)
         # Only enable record-specific controls if not recording
         self.replay_count_spin.setEnabled(enabled)
+        self.speed_spin.setEnabled(enabled)
+        self.idle_gap_spin.setEnabled(enabled)
+        self.loop_gap_spin.setEnabled(enabled)
+        self.pipeline_edit.setEnabled(enabled)
         self.save_button.setEnabled(enabled)
         # Keep record button always enabled, but text changes
         self.record_button.setEnabled(True)
@@ -245,7 +323,11 @@ class PresetDialog(QDialog):
             'script': "", 'script_on': "", 'script_off': "",
             'on_off_state': False,
             'recorded_events': None, # Use embedded data field
-            'how_many': 1
+            'how_many': 1,
+            'speed': 1.0,
+            'max_idle_gap': 0.0,
+            'loop_gap': -1.0,
+            'postprocess': ""
         }
 
         preset_type = updated_data['type']
@@ -257,22 +339,46 @@ class PresetDialog(QDialog):
             updated_data['on_off_state'] = self.initial_state_check.isChecked()
         elif preset_type == "recorded":
             # Use the stored event data (could be from initial load or new recording)
-            if not self.recorded_events_data or not isinstance(self.recorded_events_data, list):
+            if not self.recorded_events_data or not isinstance(self.recorded_events_data, (list, SpilledRecording)):
                 QMessageBox.warning(self, "Input Error", "No valid recording data available for 'recorded' type. Please record actions first.")
                 return
             updated_data['recorded_events'] = self.recorded_events_data
             updated_data['how_many'] = self.replay_count_spin.value()
-
-        # --- Pass data to save_preset (which now handles embedded data) ---
-        success, message_or_data = save_preset(updated_data)
-
+            updated_data['speed'] = self.speed_spin.value()
+            updated_data['max_idle_gap'] = self.idle_gap_spin.value()
+            loop_gap = self.loop_gap_spin.value()
+            updated_data['loop_gap'] = loop_gap if loop_gap >= 0 else -1.0
+            postprocess = self.pipeline_edit.text().strip()
+            try:
+                RecordingPipeline(postprocess or None)
+            except ValueError as e:
+                QMessageBox.warning(self, "Input Error", f"Invalid post-processing stages:\n{e}")
+                return
+            updated_data['postprocess'] = postprocess
+
+        # --- Hand the data to the background writer; the dialog closes once it reports back ---
+        self.save_button.setEnabled(False)
+        self.cancel_button.setEnabled(False)
+        self.save_button.setText("Saving...")
+        self._pending_save_data = updated_data
+        writer = get_preset_writer()
+        writer.save_finished.connect(self._on_save_finished)
+        self._pending_save_file = writer.save(updated_data)
+
+    def _on_save_finished(self, file_name, success, message):
+        """ Slot for PresetWriter.save_finished: closes on success, keeps the dialog open on failure. """
+        if file_name != getattr(self, '_pending_save_file', None):
+            return # Another preset's save
+        get_preset_writer().save_finished.disconnect(self._on_save_finished)
+        self._pending_save_file = None
         if success:
-            saved_data = message_or_data
-            self.preset_saved.emit(saved_data)
+            self.preset_saved.emit(self._pending_save_data)
             self.accept()
         else:
-            # Error message already shown by save_preset
-            pass # Keep dialog open
+            QMessageBox.critical(self, "Save Error", message)
+            self.save_button.setText("Save")
+            self.save_button.setEnabled(True)
+            self.cancel_button.setEnabled(True)
 
 # Example usage (for testing)
 if __name__ == '__main__':
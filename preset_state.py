@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+
+# --- Runtime state of presets (on/off state, last run, run count) ---
+# This state changes on every click, so it is kept out of the .slaunch files
+# in a small append-only journal shared by all presets. Each change appends one
+# JSON line; the journal is compacted to one line per preset once it grows.
+#
+#   {"file": "preset3.slaunch", "on_off_state": true}
+#   {"file": "preset4.slaunch", "on_off_state": false, "run": 1718000000.0}   (a toggle: state and run in one line)
+#   {"file": "preset4.slaunch", "on_off_state": true, "run": 1718000000.0, "runs": 3}   (coalesced toggles)
+#   {"file": "preset5.slaunch", "run": 1718000000.0}
+#   {"file": "preset5.slaunch", "forget": true}
+#   {"file": "preset7.slaunch", "on_off_state": false, "last_run": 1718000000.0, "run_count": 4}
+
+COMPACT_MIN_LINES = 256 # Never compact below this many journal lines
+COMPACT_RATIO = 4 # Compact when lines > COMPACT_RATIO * number of presets with state
+
+
+class PresetStateStore:
+    """ Journal-backed store of per-preset runtime state. """
+
+    def __init__(self, path):
+        self.path = path
+        self._states = None # {file_name: {'on_off_state'?, 'last_run'?, 'run_count'?}}, loaded on first use
+        self._line_count = 0
+        self._lock = threading.Lock()
+
+    # --- Public API ---
+
+    def get(self, file_name):
+        """ Returns a copy of the stored state of a preset ({} if none). """
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self._states.get(file_name, {}))
+
+    def set_on_off_state(self, file_name, state, runs=0):
+        """
+        Records the on/off state of a preset, plus `runs` runs of it made now
+        (a toggle runs a script), in a single line. Returns (success, error_message).
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if not runs and self._states.get(file_name, {}).get('on_off_state') == state:
+                return True, None # Nothing changed, nothing to write
+            record = {'file': file_name, 'on_off_state': bool(state)}
+            if runs:
+                record['run'] = time.time()
+                if runs > 1:
+                    record['runs'] = runs
+            return self._append(record)
+
+    def record_run(self, file_name, when=None):
+        """ Records that a preset was run now (or at `when`). Returns (success, error_message). """
+        with self._lock:
+            self._ensure_loaded()
+            return self._append({'file': file_name, 'run': time.time() if when is None else when})
+
+    def forget(self, file_name):
+        """ Drops all state of a deleted preset. """
+        with self._lock:
+            self._ensure_loaded()
+            if file_name not in self._states:
+                return True, None
+            return self._append({'file': file_name, 'forget': True})
+
+    def forget_missing(self, file_names):
+        """ Drops the state of every preset not in file_names. Returns how many were dropped. """
+        with self._lock:
+            self._ensure_loaded()
+            missing = [file_name for file_name in self._states if file_name not in file_names]
+            for file_name in missing:
+                self._append({'file': file_name, 'forget': True})
+            return len(missing)
+
+    # --- Journal handling ---
+
+    def _ensure_loaded(self):
+        if self._states is not None:
+            return
+        self._states = {}
+        self._line_count = 0
+        torn_tail = False
+        try:
+            with open(self.path, "r", encoding='utf-8') as f:
+                for line in f:
+                    torn_tail = not line.endswith("\n")
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Most likely a partial last line from a crash mid-append
+                        print(f"Warning: Skipping corrupt line in state journal {self.path}")
+                        continue
+                    if isinstance(record, dict) and isinstance(record.get('file'), str):
+                        self._apply(record)
+                        self._line_count += 1
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"Warning: Could not read state journal {self.path}: {e}")
+            return
+        # A torn last line would corrupt the next append, so rewrite the journal cleanly
+        self._maybe_compact(force=torn_tail)
+
+    def _apply(self, record):
+        file_name = record['file']
+        if record.get('forget'):
+            self._states.pop(file_name, None)
+            return
+        state = self._states.setdefault(file_name, {})
+        if 'on_off_state' in record:
+            state['on_off_state'] = bool(record['on_off_state'])
+        if 'last_run' in record: # Compacted form
+            state['last_run'] = record['last_run']
+        if 'run_count' in record:
+            state['run_count'] = record['run_count']
+        if 'run' in record:
+            state['last_run'] = record['run']
+            state['run_count'] = state.get('run_count', 0) + record.get('runs', 1)
+
+    def _append(self, record):
+        try:
+            with open(self.path, "a", encoding='utf-8') as f:
+                f.write(json.dumps(record, separators=(',', ':')) + "\n")
+        except OSError as e:
+            error_message = f"Could not write state journal {self.path}:\n{e}"
+            print(f"Error saving preset state: {error_message}")
+            return False, error_message
+        self._apply(record)
+        self._line_count += 1
+        self._maybe_compact()
+        return True, None
+
+    def _maybe_compact(self, force=False):
+        if not force and self._line_count <= max(COMPACT_MIN_LINES, COMPACT_RATIO * len(self._states)):
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                for file_name, state in self._states.items():
+                    f.write(json.dumps(dict(state, file=file_name), separators=(',', ':')) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._line_count = len(self._states)
+        except OSError as e:
+            print(f"Warning: Could not compact state journal {self.path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
@@ -0,0 +1,116 @@
+import os
+
+from PyQt6.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal # type: ignore
+
+DEBOUNCE_MS = 300 # Quiet time after the last change before the folder is rescanned
+
+
+class PresetFolderWatcher(QObject):
+    """
+    Watches the presets folder and reports changed/removed .slaunch files.
+
+    Bursts of filesystem notifications (a sync tool dropping hundreds of files,
+    an editor's write + rename) are debounced into a single rescan. The rescan
+    is one os.scandir pass compared against the last known (mtime, size) of
+    every file, so only files that actually changed are reported.
+    """
+    presets_changed = pyqtSignal(list, list) # (changed or new file names, removed file names)
+
+    def __init__(self, folder, debounce_ms=DEBOUNCE_MS, parent=None):
+        super().__init__(parent)
+        self.folder = folder
+        self._snapshot = {} # {file_name: (mtime_ns, size)}
+        # Qt drops the watch of a file that is replaced or removed (and reports it through fileChanged),
+        # so the watched paths are tracked here instead of asking the watcher for its whole list
+        self._watched = set()
+        self._unwatched = set() # Paths to (re)watch, added in one addPaths call per flush
+
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(debounce_ms)
+        self._debounce_timer.timeout.connect(self._rescan)
+
+        self._watch_timer = QTimer(self) # Batches the mark_synced calls of a bulk import/save
+        self._watch_timer.setSingleShot(True)
+        self._watch_timer.setInterval(0)
+        self._watch_timer.timeout.connect(self._flush_watches)
+
+        self._watcher = QFileSystemWatcher(self)
+        # Directory events cover added/removed/renamed files, file events cover in-place edits
+        self._watcher.directoryChanged.connect(self._schedule_rescan)
+        self._watcher.fileChanged.connect(self._file_changed)
+        if not self._watcher.addPath(folder):
+            print(f"Warning: Could not watch presets folder {folder}")
+
+    def resync(self):
+        """ Takes a fresh snapshot of the folder without reporting anything. """
+        self._debounce_timer.stop()
+        self._snapshot = self._scan_folder()
+        self._watched = set(self._watcher.files())
+        self._watch_files(self._snapshot)
+        self._flush_watches()
+
+    def mark_synced(self, file_name):
+        """ Records the current state of a file the app just read or wrote itself. """
+        path = os.path.join(self.folder, file_name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._snapshot.pop(file_name, None)
+            return
+        self._snapshot[file_name] = (stat.st_mtime_ns, stat.st_size)
+        self._watch_files([file_name])
+
+    def _schedule_rescan(self, _path=None):
+        self._debounce_timer.start() # (Re)start: rescan once things are quiet
+
+    def _file_changed(self, path):
+        # The watch may be gone (file replaced): watch the path again if it still exists
+        self._watched.discard(path)
+        self._unwatched.add(path)
+        self._watch_timer.start()
+        self._schedule_rescan()
+
+    def _scan_folder(self):
+        snapshot = {}
+        try:
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    if entry.name.endswith(".slaunch") and entry.is_file():
+                        stat = entry.stat()
+                        snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except OSError as e:
+            print(f"Warning: Could not scan presets folder {self.folder}: {e}")
+        return snapshot
+
+    def _watch_files(self, file_names):
+        """ Queues the files that are not watched yet for the next flush. """
+        for name in file_names:
+            path = os.path.join(self.folder, name)
+            if path not in self._watched:
+                self._unwatched.add(path)
+        if self._unwatched and not self._watch_timer.isActive():
+            self._watch_timer.start()
+
+    def _flush_watches(self):
+        self._watch_timer.stop()
+        if not self._unwatched:
+            return
+        paths = list(self._unwatched)
+        self._unwatched.clear()
+        # Failed = gone, or already watched (then it is only re-added once more next time)
+        failed = set(self._watcher.addPaths(paths))
+        self._watched.update(path for path in paths if path not in failed)
+
+    def _rescan(self):
+        current = self._scan_folder()
+        changed = sorted(name for name, stat in current.items() if self._snapshot.get(name) != stat)
+        removed = sorted(name for name in self._snapshot if name not in current)
+        self._snapshot = current
+        self._watched.difference_update(os.path.join(self.folder, name) for name in removed)
+        if changed:
+            self._watch_files(changed)
+            self._flush_watches()
+        if changed or removed:
+            print(f"Presets folder changed: {len(changed)} changed/new, {len(removed)} removed.")
+            self.presets_changed.emit(changed, removed)
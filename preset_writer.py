@@ -0,0 +1,159 @@
+import hashlib
+import itertools
+import os
+import threading
+from collections import OrderedDict
+
+from PyQt6.QtCore import QObject, pyqtSignal # type: ignore
+
+import utils
+
+
+class PresetWriter(QObject):
+    """
+    Single background thread that performs all preset writes off the GUI thread.
+
+    - Preset saves are atomic (temp file + fsync + os.replace, see utils.write_preset_text).
+    - Repeated saves of the same preset that are still queued are coalesced: last write wins.
+    - A save whose serialized content matches what is already on disk is skipped.
+    - Results come back through Qt signals, delivered on the GUI thread.
+    """
+    save_finished = pyqtSignal(str, bool, str) # (file_name, success, error message or '')
+    state_saved = pyqtSignal(str, bool, str) # (file_name, success, error message or '')
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pending = OrderedDict() # {(kind, key): payload}, in submission order
+        self._reserved_names = set() # New file names handed out but not written yet
+        self._written = {} # {file_name: (digest, mtime_ns, size)} of the last known content
+        self._run_ids = itertools.count()
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="PresetWriter", daemon=True)
+        self._thread.start()
+
+    # --- Called from the GUI thread ---
+
+    def save(self, preset_data):
+        """
+        Queues a save of preset_data and returns immediately with the file name
+        it will be written to (new presets get one assigned here).
+        """
+        snapshot = dict(preset_data) # Later edits by the caller don't leak into the write
+        with self._cond:
+            file_name = utils.assign_preset_file_name(snapshot, self._reserved_names)
+            preset_data['file_name'] = file_name
+            self._reserved_names.add(file_name)
+            self._enqueue(('preset', file_name), snapshot)
+        return file_name
+
+    def save_state(self, file_name, on_off_state, ran=False):
+        """
+        Queues an on/off state change (coalesced per preset). ran=True also
+        counts a run of the preset, written in the same journal line.
+        """
+        with self._cond:
+            _, runs = self._pending.get(('state', file_name), (None, 0)) # Runs of coalesced toggles add up
+            self._enqueue(('state', file_name), (on_off_state, runs + bool(ran)))
+
+    def record_run(self, file_name):
+        """ Queues a run-count/last-run update (never coalesced). """
+        with self._cond:
+            self._enqueue(('run', next(self._run_ids)), file_name)
+
+    def cancel(self, file_name):
+        """ Drops queued writes of a preset (e.g. before deleting it). """
+        with self._cond:
+            self._pending.pop(('preset', file_name), None)
+            self._pending.pop(('state', file_name), None)
+            self._reserved_names.discard(file_name)
+
+    def flush(self, timeout=None):
+        """ Blocks until every queued write is done. Returns False on timeout. """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def _enqueue(self, key, payload):
+        # Caller holds the lock. Re-inserting moves a coalesced job to the back.
+        self._pending.pop(key, None)
+        self._pending[key] = payload
+        self._cond.notify_all()
+
+    # --- Writer thread ---
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all() # Wake flush()
+                self._cond.wait_for(lambda: self._pending)
+                (kind, key), payload = self._pending.popitem(last=False)
+                self._busy = True
+            try:
+                if kind == 'preset':
+                    self._write_preset(payload)
+                elif kind == 'state':
+                    on_off_state, runs = payload
+                    success, message = utils.set_on_off_state(key, on_off_state, runs)
+                    self.state_saved.emit(key, success, message or "")
+                elif kind == 'run':
+                    utils.record_preset_run(payload)
+            except Exception as e: # Never let the writer thread die
+                print(f"Error in preset writer ({kind}): {e}")
+
+    def _file_digest(self, file_name):
+        """ Digest of the preset file currently on disk, cached by (mtime, size). """
+        path = os.path.join(utils.PRESETS_FOLDER, file_name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        known = self._written.get(file_name)
+        if known and known[1:] == (stat.st_mtime_ns, stat.st_size):
+            return known[0]
+        with open(path, "rb") as f:
+            digest = hashlib.blake2b(f.read(), digest_size=16).digest()
+        self._written[file_name] = (digest, stat.st_mtime_ns, stat.st_size)
+        return digest
+
+    def _write_preset(self, preset_data):
+        file_name = preset_data['file_name']
+        try:
+            if utils.using_preset_db():
+                utils.store_preset_in_db(preset_data) # One row upsert, nothing to diff against
+                print(f"Preset saved to the preset store: {file_name}")
+            elif isinstance(preset_data.get('recorded_events'), utils.SpilledRecording):
+                # New long recording: streamed from disk, never held as text (so no digest to compare)
+                utils.write_preset_file(file_name, preset_data)
+                self._written.pop(file_name, None)
+                print(f"Preset saved: {os.path.join(utils.PRESETS_FOLDER, file_name)}")
+            else:
+                text = utils.serialize_preset(preset_data)
+                digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+                if self._file_digest(file_name) == digest:
+                    print(f"Preset unchanged, skipping write: {file_name}")
+                else:
+                    stat = utils.write_preset_text(file_name, text)
+                    self._written[file_name] = (digest, stat.st_mtime_ns, stat.st_size)
+                    print(f"Preset saved: {os.path.join(utils.PRESETS_FOLDER, file_name)}")
+            if preset_data.get('type') == "on_off":
+                # The file holds the state chosen in the dialog; keep the journal in line
+                utils.set_on_off_state(file_name, preset_data.get('on_off_state', False))
+            success, message = True, ""
+        except Exception as e:
+            success, message = False, f"Could not save preset {file_name}:\n{e}"
+            print(f"Error saving preset: {message}")
+        with self._cond:
+            if ('preset', file_name) not in self._pending:
+                self._reserved_names.discard(file_name)
+        self.save_finished.emit(file_name, success, message)
+
+
+_preset_writer = None
+
+def get_preset_writer():
+    """ Returns the application-wide PresetWriter (created on first use). """
+    global _preset_writer
+    if _preset_writer is None:
+        _preset_writer = PresetWriter()
+    return _preset_writer
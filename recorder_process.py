@@ -0,0 +1,191 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+
+import recording_module
+from recording_module import Recorder
+
+# --- Out-of-process recording ---
+# Recorder runs its pynput listeners in the GUI process, where every callback has
+# to get the GIL before it can read the clock: while the window is busy, event
+# timestamps bunch up and the replay is distorted. ProcessRecorder hosts the
+# listeners in a small child process instead. The callbacks there stamp
+# time.monotonic_ns() first thing (the clock is system-wide, so the times match the
+# GUI process's) and queue compact tuples; the child streams them back in
+# batches every BATCH_INTERVAL. The GUI side feeds the batches into the usual
+# Recorder state, so the stop gesture and finalization are unchanged.
+#
+#   parent -> child: ('start',)  ('stop',)  ('quit',)
+#   child -> parent: ('started',)  ('events', [tuple, ...])  ('stopped',)  ('error', message)
+#
+# The child is started (spawn) when the first ProcessRecorder is created, i.e.
+# when the preset dialog opens, so it is ready by the time recording starts.
+
+RECORD_IN_SEPARATE_PROCESS = os.environ.get("SCRIPTLAUNCHER_RECORDER", "thread").strip().lower() == "process"
+BATCH_INTERVAL = 0.05 # Seconds between event batches sent by the child
+
+# Batch tuples: (kind, time, ...)
+EV_MOVE, EV_CLICK, EV_SCROLL, EV_KEY_PRESS, EV_KEY_RELEASE = range(5)
+
+
+# --- Child process ---
+
+def _capture_session(conn):
+    """ Runs the listeners until a stop/quit message arrives. Returns that message. """
+    pending = deque() # Appended by the listener threads, drained by this one
+    monotonic_ns = time.monotonic_ns
+
+    def on_move(x, y):
+        pending.append((EV_MOVE, monotonic_ns(), x, y))
+
+    def on_click(x, y, button, pressed):
+        pending.append((EV_CLICK, monotonic_ns(), x, y, str(button), pressed))
+
+    def on_scroll(x, y, dx, dy):
+        pending.append((EV_SCROLL, monotonic_ns(), x, y, dx, dy))
+
+    def on_press(key):
+        pending.append((EV_KEY_PRESS, monotonic_ns(), str(key)))
+
+    def on_release(key):
+        pending.append((EV_KEY_RELEASE, monotonic_ns(), str(key)))
+
+    def flush():
+        batch = [pending.popleft() for _ in range(len(pending))]
+        if batch:
+            conn.send(('events', batch))
+
+    message = ('stop',)
+    try:
+        with recording_module.MouseListener(on_move=on_move, on_click=on_click, on_scroll=on_scroll), \
+             recording_module.KeyboardListener(on_press=on_press, on_release=on_release):
+            conn.send(('started',))
+            while not conn.poll(BATCH_INTERVAL):
+                flush()
+            message = conn.recv()
+    except Exception as e:
+        print(f"Error in recorder process: {e}")
+        conn.send(('error', str(e)))
+    flush() # Events that arrived while the listeners stopped
+    conn.send(('stopped',))
+    return message
+
+
+def _recorder_worker(conn, initializer):
+    """ Child process main loop: one capture session per start message. """
+    if initializer is not None:
+        initializer()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message[0] == 'start':
+            message = _capture_session(conn)
+        if message[0] == 'quit':
+            break
+
+
+# --- Parent side ---
+
+class _RecorderHost:
+    """ The recorder child process and its pipe. """
+
+    def __init__(self, initializer=None):
+        context = multiprocessing.get_context('spawn') # The GUI process has threads: no fork
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_recorder_worker, args=(child_conn, initializer),
+                                       name="ScriptLauncherRecorder", daemon=True)
+        self.process.start()
+        child_conn.close()
+        print(f"Recorder process started (pid {self.process.pid}).")
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def shutdown(self, timeout=2):
+        try:
+            self.conn.send(('quit',))
+        except OSError:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+_recorder_host = None
+_recorder_host_lock = threading.Lock()
+
+
+def get_recorder_host(initializer=None):
+    """ Returns the shared recorder process, (re)starting it if needed. """
+    global _recorder_host
+    with _recorder_host_lock:
+        if _recorder_host is None or not _recorder_host.is_alive():
+            _recorder_host = _RecorderHost(initializer)
+        return _recorder_host
+
+
+def shutdown_recorder_host():
+    global _recorder_host
+    with _recorder_host_lock:
+        if _recorder_host is not None:
+            _recorder_host.shutdown()
+            _recorder_host = None
+
+
+class ProcessRecorder(Recorder):
+    """
+    Recorder whose listeners run in the recorder process. Same interface as
+    Recorder (start_recording/stop_recording/is_recording), so PresetDialog
+    uses either one the same way.
+    """
+
+    def __init__(self, initializer=None, stop_gesture=None, on_stop_gesture=None, pipeline=None):
+        super().__init__(stop_gesture, on_stop_gesture, pipeline)
+        self._host = get_recorder_host(initializer)
+        self._ingest = {
+            EV_MOVE: self._record_mouse_move,
+            EV_CLICK: self._record_mouse_click,
+            EV_SCROLL: self._record_scroll,
+            EV_KEY_PRESS: self._record_key_press,
+            EV_KEY_RELEASE: self._record_key_release,
+        }
+
+    def _recording_thread(self):
+        """ Thread function: starts a capture session and feeds its batches into the recorder. """
+        self._reset_capture_state()
+        if not self._host.is_alive():
+            self._host = get_recorder_host()
+        conn = self._host.conn
+        conn.send(('start',))
+        print(f"Recording started (recorder process). Hold {self.stop_gesture.describe()} to stop.")
+        while True:
+            if not conn.poll(BATCH_INTERVAL):
+                if not self._host.is_alive():
+                    print("Error: Recorder process exited during recording.")
+                    break
+            else:
+                message = conn.recv()
+                if message[0] == 'events':
+                    ingest = self._ingest
+                    for event in message[1]:
+                        ingest[event[0]](*event[1:])
+                    capture = self._capture
+                    if len(capture.rows) >= capture.spill_at: # This thread is the only appender: spill here
+                        capture.spill()
+                elif message[0] == 'stopped':
+                    break
+                elif message[0] == 'error':
+                    print(f"Recorder process error: {message[1]}")
+        print("Recording thread finished.")
+
+    def _stop_capture(self):
+        """ Asks the recorder process to stop its listeners (the thread exits on 'stopped'). """
+        try:
+            self._host.conn.send(('stop',))
+        except OSError as e:
+            print(f"Error stopping recorder process: {e}")
@@ -1,103 +1,288 @@
 import time
 import json
 import os
+import csv
 import threading
+from array import array
 from pynput import mouse, keyboard
 from pynput.mouse import Listener as MouseListener, Controller as MouseController, Button
 from pynput.keyboard import Listener as KeyboardListener, Controller as KeyboardController, Key
+from recording_pipeline import RecordingPipeline
+from recording_segment import (
+    CAPTURE_MOVE, CAPTURE_BUTTON_PRESS, CAPTURE_BUTTON_RELEASE, CAPTURE_SCROLL, CAPTURE_KEY_PRESS, CAPTURE_KEY_RELEASE,
+    _CAPTURE_ROW, _pack_row, RecordingSegment, SpilledRecording, iter_row_events
+)
+import recording_segment
+
+
+# --- Capture buffer ---
+# While recording, each event is one fixed-size packed row appended to a
+# bytearray instead of a dict: no per-event objects are kept, so an hour-long
+# session does not leave millions of small objects for the garbage collector.
+# `bytearray +=` is a single operation under the GIL, so the mouse and keyboard
+# listener threads can append concurrently without a lock. Button and key names
+# are interned per listener (buttons come from the mouse thread, keys from the
+# keyboard thread, so each table has a single writer). Rows are turned into
+# event dicts once, in Recorder.stop_recording.
+#
+# Once the rows reach SPILL_CHUNK_BYTES the appending callback wakes the
+# recording thread, which moves them to a segment file (recording_segment):
+# `del rows[:n]` is also a single operation, and rows appended meanwhile stay
+# behind in the buffer. A recording that spilled is finalized as a stream and
+# comes back as a SpilledRecording instead of a list.
+
+class _CaptureBuffer:
+    """Packed rows of the events captured so far (older ones in a segment file once it spilled)."""
+    __slots__ = ('rows', 'buttons', 'keys', 'segment', 'spill_at')
+
+    def __init__(self):
+        self.rows = bytearray()
+        self.buttons = {} # button string -> id (mouse listener thread)
+        self.keys = {} # key string -> id (keyboard listener thread)
+        self.segment = None # RecordingSegment, created by the first spill
+        self.spill_at = recording_segment.SPILL_CHUNK_BYTES or float('inf')
+
+    def __len__(self):
+        spilled = self.segment.row_count if self.segment is not None else 0
+        return spilled + len(self.rows) // _CAPTURE_ROW.size
+
+    def spill(self):
+        """Moves the rows captured so far to the segment file (recording thread)."""
+        rows = self.rows
+        size = len(rows) // _CAPTURE_ROW.size * _CAPTURE_ROW.size
+        if not size:
+            return
+        if self.segment is None:
+            self.segment = RecordingSegment()
+        self.segment.write(rows[:size])
+        del rows[:size]
+
+    def to_events(self):
+        """Converts the rows into the stored event dicts (times in time.monotonic() seconds)."""
+        return list(iter_row_events(_CAPTURE_ROW.iter_unpack(self.rows), self.buttons, self.keys))
+
+    def spilled(self):
+        """Moves the remaining rows to disk and returns the events as a SpilledRecording."""
+        self.spill()
+        return SpilledRecording(self.segment, self.buttons, self.keys)
+
+
+# --- Stop gesture ---
+# Holding a combination of buttons/keys for a while stops a recording. Detection
+# is event-driven: the click/key callbacks arm a timer when the last part of the
+# combination goes down (due hold_seconds after that event's timestamp) and
+# cancel it when any part is released, so nothing polls while recording.
+# A gesture is written as parts joined with '+', optionally followed by ':' and
+# the hold time in seconds, e.g. "left click+shift:2" or "ctrl+alt+f12:1".
+# Modifier names match both the left and right key.
+STOP_GESTURE_SPEC = os.environ.get("SCRIPTLAUNCHER_STOP_GESTURE", "left click+shift:2")
+
+_GESTURE_ALIASES = {
+    'left click': ('Button.left',), 'right click': ('Button.right',), 'middle click': ('Button.middle',),
+    'shift': ('shift', 'shift_r'), 'ctrl': ('ctrl', 'ctrl_l', 'ctrl_r'),
+    'alt': ('alt', 'alt_l', 'alt_r', 'alt_gr'), 'cmd': ('cmd', 'cmd_l', 'cmd_r'),
+}
+
+
+class StopGesture:
+    """Buttons/keys that stop a recording when held down together for hold_seconds."""
+
+    def __init__(self, spec):
+        combo, _, hold = spec.partition(':')
+        try:
+            self.hold_seconds = float(hold) if hold.strip() else 2.0
+        except ValueError:
+            raise ValueError(f"Invalid hold time '{hold}' in stop gesture '{spec}'")
+        if self.hold_seconds < 0:
+            raise ValueError(f"Invalid hold time '{hold}' in stop gesture '{spec}'")
+        self.labels = []
+        self.parts = [] # One tuple of matching button/key strings per part
+        for label in combo.split('+'):
+            label = ' '.join(label.lower().split())
+            if not label:
+                raise ValueError(f"Empty part in stop gesture '{spec}'")
+            names = _GESTURE_ALIASES.get(label, (label,))
+            matches = tuple(self._event_string(name) for name in names)
+            if None in matches:
+                raise ValueError(f"Unknown button or key '{label}' in stop gesture '{spec}'")
+            self.labels.append(label)
+            self.parts.append(matches)
+        self.spec = f"{'+'.join(self.labels)}:{self.hold_seconds:g}"
+
+    @staticmethod
+    def _event_string(name):
+        """The str() a listener callback would produce for a button/key name, or None if unknown."""
+        if name.startswith('Button.'):
+            button = getattr(Button, name[7:], None)
+            return str(button) if isinstance(button, Button) else None
+        if len(name) == 1:
+            return f"'{name}'"
+        key = getattr(Key, name, None)
+        return str(key) if isinstance(key, Key) else None
+
+    def describe(self):
+        return f"{' + '.join(label.title() for label in self.labels)} for {self.hold_seconds:g}s"
+
+    def part_of(self, event_str):
+        """Index of the part an event's button/key string belongs to, or None."""
+        for index, matches in enumerate(self.parts):
+            if event_str in matches:
+                return index
+        return None
+
+
+try:
+    STOP_GESTURE = StopGesture(STOP_GESTURE_SPEC)
+except ValueError as e:
+    print(f"Warning: {e}. Using the default stop gesture.")
+    STOP_GESTURE = StopGesture("left click+shift:2")
 
 
 class Recorder:
-    """Handles recording of mouse and keyboard events."""
-    def __init__(self):
-        self.events = []
+    """Handles recording of mouse and keyboard events.
+
+    Event times are time.monotonic() seconds (captured as monotonic_ns), so
+    NTP/clock changes during a recording cannot distort its timing. Replay only uses differences between
+    event times, so older recordings with wall-clock times replay the same.
+    """
+    def __init__(self, stop_gesture=None, on_stop_gesture=None, pipeline=None):
+        self.events = [] # Raw events of the last recording (list, or SpilledRecording if long), set by stop_recording
+        self.stop_gesture = stop_gesture or STOP_GESTURE
+        # Called (from a timer thread) when the stop gesture was held; default: stop_recording()
+        self.on_stop_gesture = on_stop_gesture
+        self._capture = _CaptureBuffer()
         self._recording = False
         self._stop_event = threading.Event()
+        self._spill_wanted = threading.Event() # Set when the capture buffer should move its rows to disk
         self._mouse_listener = None
         self._keyboard_listener = None
         self._thread = None
-        # Track key/button states to prevent abrupt stops leaving them 'pressed'
-        self._pressed_keys = set()
-        self._left_mouse_pressed = False
-        self._shift_pressed = False
-        self._combination_start_time = None
+        self._gesture_lock = threading.Lock() # Click and key callbacks come from two listener threads
+        self._gesture_held = set() # Indexes of the stop gesture parts currently held
+        self._gesture_timer = None
+        self.pipeline = pipeline or RecordingPipeline() # Post-processing applied by stop_recording
+        self.pipeline_summary = None # What the pipeline did to the last recording, set by stop_recording
 
+    # Listener callbacks: the timestamp is taken first, before anything else can delay it
     def _on_mouse_move(self, x, y):
-        if self._recording:
-            self.events.append({'type': 'mouse_move', 'x': x, 'y': y, 'time': time.time()})
+        if self._recording: # Hot path (hundreds per second): _record_mouse_move inlined
+            capture = self._capture
+            capture.rows += _pack_row(CAPTURE_MOVE, 0, time.monotonic_ns(), x, y, 0, 0)
+            if len(capture.rows) >= capture.spill_at:
+                self._spill_wanted.set()
 
     def _on_mouse_click(self, x, y, button, pressed):
         if self._recording:
-            self.events.append({
-                'type': 'mouse_click',
-                'x': x,
-                'y': y,
-                'button': str(button),
-                'pressed': pressed,
-                'time': time.time()
-            })
-            if button == Button.left:
-                self._left_mouse_pressed = pressed
-                if not pressed: # Reset combo timer on release
-                    self._combination_start_time = None
-
+            self._record_mouse_click(time.monotonic_ns(), x, y, str(button), pressed)
 
     def _on_scroll(self, x, y, dx, dy):
         if self._recording:
-            self.events.append({
-                'type': 'mouse_scroll',
-                'x': x,
-                'y': y,
-                'dx': dx,
-                'dy': dy,
-                'time': time.time()
-            })
+            self._record_scroll(time.monotonic_ns(), x, y, dx, dy)
 
     def _on_key_press(self, key):
         if self._recording:
-            key_str = str(key)
-            self.events.append({'type': 'key_press', 'key': key_str, 'time': time.time()})
-            self._pressed_keys.add(key_str)
-            if key in (Key.shift, Key.shift_r):
-                self._shift_pressed = True
-
+            self._record_key_press(time.monotonic_ns(), str(key))
 
     def _on_key_release(self, key):
         if self._recording:
-            key_str = str(key)
-            self.events.append({'type': 'key_release', 'key': key_str, 'time': time.time()})
-            self._pressed_keys.discard(key_str)
-            if key in (Key.shift, Key.shift_r):
-                self._shift_pressed = False
-                self._combination_start_time = None # Reset combo timer on release
+            self._record_key_release(time.monotonic_ns(), str(key))
+
+    # Event storage and stop-combination state (also fed by ProcessRecorder from its batches)
+    def _append_row(self, row):
+        capture = self._capture
+        capture.rows += row
+        if len(capture.rows) >= capture.spill_at:
+            self._spill_wanted.set()
+
+    def _record_mouse_move(self, t_ns, x, y):
+        self._append_row(_pack_row(CAPTURE_MOVE, 0, t_ns, x, y, 0, 0))
+
+    def _record_mouse_click(self, t_ns, x, y, button_str, pressed):
+        buttons = self._capture.buttons
+        button_id = buttons.get(button_str)
+        if button_id is None:
+            button_id = buttons[button_str] = len(buttons)
+        self._append_row(_pack_row(CAPTURE_BUTTON_PRESS if pressed else CAPTURE_BUTTON_RELEASE,
+                                   button_id, t_ns, x, y, 0, 0))
+        self._update_gesture(button_str, pressed, t_ns)
+
+    def _record_scroll(self, t_ns, x, y, dx, dy):
+        self._append_row(_pack_row(CAPTURE_SCROLL, 0, t_ns, x, y, dx, dy))
+
+    def _key_id(self, key_str):
+        keys = self._capture.keys
+        key_id = keys.get(key_str)
+        if key_id is None:
+            key_id = keys[key_str] = len(keys)
+        return key_id
+
+    def _record_key_press(self, t_ns, key_str):
+        self._append_row(_pack_row(CAPTURE_KEY_PRESS, self._key_id(key_str), t_ns, 0, 0, 0, 0))
+        self._update_gesture(key_str, True, t_ns)
+
+    def _record_key_release(self, t_ns, key_str):
+        self._append_row(_pack_row(CAPTURE_KEY_RELEASE, self._key_id(key_str), t_ns, 0, 0, 0, 0))
+        self._update_gesture(key_str, False, t_ns)
+
+    def _reset_capture_state(self):
+        self.events = [] # Clear previous events
+        self._capture = _CaptureBuffer()
+        self._cancel_gesture_timer()
+        self._gesture_held = set()
+        self._recording = True
+        self._stop_event.clear()
+        self._spill_wanted.clear()
 
+    def _update_gesture(self, event_str, pressed, t_ns):
+        """Arms the stop timer when the whole gesture is held, cancels it when a part is released."""
+        part = self.stop_gesture.part_of(event_str)
+        if part is None:
+            return
+        with self._gesture_lock:
+            if not pressed:
+                self._gesture_held.discard(part)
+                self._cancel_gesture_timer()
+            elif part not in self._gesture_held:
+                self._gesture_held.add(part)
+                if len(self._gesture_held) == len(self.stop_gesture.parts) and self._gesture_timer is None:
+                    # Due hold_seconds after the event itself (batches from the recorder process arrive late)
+                    delay = self.stop_gesture.hold_seconds - (time.monotonic_ns() - t_ns) / 1e9
+                    self._gesture_timer = threading.Timer(max(delay, 0), self._on_gesture_timer)
+                    self._gesture_timer.daemon = True
+                    self._gesture_timer.start()
+
+    def _cancel_gesture_timer(self):
+        if self._gesture_timer is not None:
+            self._gesture_timer.cancel()
+            self._gesture_timer = None
+
+    def _on_gesture_timer(self):
+        with self._gesture_lock:
+            # A release can race with the timer firing: only a timer that is still armed counts
+            if self._gesture_timer is not threading.current_thread() or not self._recording:
+                return
+            self._gesture_timer = None
+        print(f"Stop gesture detected ({self.stop_gesture.describe()}).")
+        if self.on_stop_gesture is not None:
+            self.on_stop_gesture()
+        else:
+            self.stop_recording()
 
     def _recording_thread(self):
         """Thread function to run listeners."""
-        self.events = [] # Clear previous events
-        self._pressed_keys = set()
-        self._left_mouse_pressed = False
-        self._shift_pressed = False
-        self._combination_start_time = None
-        self._recording = True
-        self._stop_event.clear()
+        self._reset_capture_state()
 
         # Use context managers for listeners
         with MouseListener(on_move=self._on_mouse_move, on_click=self._on_mouse_click, on_scroll=self._on_scroll) as self._mouse_listener, \
              KeyboardListener(on_press=self._on_key_press, on_release=self._on_key_release) as self._keyboard_listener:
-            print("Recording started. Hold Left Click + Shift for 2s to stop.")
-            while not self._stop_event.is_set():
-                 # Check for stop combination (Left Click + Shift for 2 seconds)
-                 if self._left_mouse_pressed and self._shift_pressed:
-                     if self._combination_start_time is None:
-                         self._combination_start_time = time.time()
-                     elif time.time() - self._combination_start_time >= 2.0:
-                         print("Stop combination detected.")
-                         self.stop_recording() # Trigger stop
-                         break
-                 else:
-                     self._combination_start_time = None # Reset if combo broken
-                 time.sleep(0.05) # Small sleep to prevent busy-waiting
+            print(f"Recording started. Hold {self.stop_gesture.describe()} to stop.")
+            # Spill full capture buffers to disk until stop_recording (the stop gesture timer calls it too)
+            while True:
+                self._spill_wanted.wait() # stop_recording sets it too
+                if self._stop_event.is_set():
+                    break
+                self._spill_wanted.clear()
+                self._capture.spill()
 
         print("Recording thread finished.")
 
@@ -118,83 +303,42 @@ class Recorder:
 
         print("Stopping recording...")
         self._recording = False
+        end_time = time.monotonic() # Same clock as the event timestamps
+        with self._gesture_lock:
+            self._cancel_gesture_timer()
         self._stop_event.set() # Signal the thread to stop
+        self._spill_wanted.set()
 
-        # Stop listeners safely
-        if self._mouse_listener:
-            self._mouse_listener.stop()
-        if self._keyboard_listener:
-            self._keyboard_listener.stop()
+        self._stop_capture()
 
-        # Wait for the thread to finish
-        if self._thread:
+        # Wait for the thread to finish (unless the stop combination stopped us from that thread)
+        if self._thread and self._thread is not threading.current_thread():
             self._thread.join(timeout=2) # Wait max 2 seconds
             if self._thread.is_alive():
                 print("Warning: Recording thread did not terminate cleanly.")
             self._thread = None
 
 
-        # Clean up events: remove initial/final noise, add final releases
-        processed_events = self._finalize_events(self.events)
+        # Clean up events with the post-processing pipeline (trimming, final releases, ...)
+        capture, self._capture = self._capture, _CaptureBuffer() # Rows are not needed anymore
+        if capture.segment is None: # Short recording: lists, as always
+            self.events = capture.to_events()
+        else: # Long recording: streamed from one segment file into another
+            self.events = capture.spilled()
+            print(f"Recording spilled to disk ({len(self.events)} events), finalizing it as a stream.")
+        events = self.pipeline.run(self.events, end_time)
+        processed_events = list(events) if capture.segment is None else SpilledRecording.from_events(events)
+        self.pipeline_summary = f"{len(self.events)} -> {len(processed_events)} events ({self.pipeline.describe()})"
+        print(f"Post-processing: {self.pipeline_summary}")
         print(f"Recording stopped. {len(processed_events)} events captured.")
         return processed_events
 
-    def _finalize_events(self, recorded_events):
-        """Cleans up the recorded events."""
-        if not recorded_events:
-            return []
-
-        # Trim first few events (often noise from starting) - configurable?
-        trimmed_events = recorded_events[5:] if len(recorded_events) > 5 else recorded_events
-
-        if not trimmed_events:
-             return []
-
-        final_time = time.time()
-
-        # Ensure all pressed keys/buttons are released at the end
-        mouse_controller = MouseController()
-        if self._left_mouse_pressed: # Check if left mouse was held at stop time
-             # Check if the last event for left mouse was a press
-             last_left_click = None
-             for e in reversed(trimmed_events):
-                 if e['type'] == 'mouse_click' and e['button'] == str(Button.left):
-                     last_left_click = e
-                     break
-             if last_left_click and last_left_click['pressed']:
-                 print("Adding final left mouse release.")
-                 trimmed_events.append({
-                     'type': 'mouse_click', 'x': last_left_click['x'], 'y': last_left_click['y'],
-                     'button': str(Button.left), 'pressed': False, 'time': final_time
-                 })
-
-
-        # Ensure all pressed keys are released
-        keys_to_release = self._pressed_keys.copy() # Work on a copy
-        if self._shift_pressed: # Specifically add shift if it was held
-             keys_to_release.add(str(Key.shift)) # Use canonical shift key
-
-        # Check last events for each key that needs release
-        released_in_events = set()
-        for key_str in keys_to_release:
-             for e in reversed(trimmed_events):
-                 if e['type'] == 'key_release' and e['key'] == key_str:
-                     released_in_events.add(key_str)
-                     break
-                 if e['type'] == 'key_press' and e['key'] == key_str:
-                     # Found the press, but no release after it
-                     break
-
-        for key_str in keys_to_release:
-             if key_str not in released_in_events:
-                 print(f"Adding final release for key: {key_str}")
-                 trimmed_events.append({'type': 'key_release', 'key': key_str, 'time': final_time})
-
-
-        # Add a small delay and a 'void' event at the end
-        trimmed_events.append({'type': 'void', 'time': final_time + 0.1})
-
-        return trimmed_events
+    def _stop_capture(self):
+        """Stops listeners safely."""
+        if self._mouse_listener:
+            self._mouse_listener.stop()
+        if self._keyboard_listener:
+            self._keyboard_listener.stop()
 
     def is_recording(self):
         return self._recording
@@ -206,50 +350,343 @@ class Recorder:
 # def load_record(file_path): ...
 
 
-# --- Modified replay_events to accept events_data directly ---
-def replay_events(events_data, how_many_times=1, speed_factor=1.0, stop_event=None):
-    """Replays recorded events from the provided list multiple times, allowing external stopping."""
-    # --- Remove loading from file ---
-    # events = load_record(record_path)
-    # if not events:
-    #     print(f"Could not load events from {record_path}")
-    #     return
-    if not events_data or not isinstance(events_data, list):
-        print(f"Invalid or empty events data provided for replay.")
-        return
-
-    # Use the provided events_data directly
-    events = events_data
+# --- Replay plans ---
+# A recording is compiled once into a ReplayPlan: one (offset_ns, opcode, arg1, arg2)
+# tuple per event, with the Button/Key objects already resolved and the time
+# offset from the first event precomputed (integer nanoseconds). Replaying then only dispatches on an
+# integer opcode. Keys/buttons that cannot be parsed are reported when the plan
+# is compiled (plan.problems) and left out, instead of warning mid-replay.
+PLAN_VOID = 0
+PLAN_MOVE = 1
+PLAN_BUTTON_PRESS = 2
+PLAN_BUTTON_RELEASE = 3
+PLAN_SCROLL = 4
+PLAN_KEY_PRESS = 5
+PLAN_KEY_RELEASE = 6
+
+
+class ReplayPlan:
+    """Pre-resolved, replay-ready form of a list of recorded events."""
+    __slots__ = ('steps', 'problems', 'event_count')
+
+    def __init__(self, steps, problems, event_count):
+        self.steps = steps # [(offset_ns, opcode, arg1, arg2)]
+        self.problems = problems # Human-readable descriptions of skipped events
+        self.event_count = event_count
+
+    def __len__(self):
+        return len(self.steps)
 
+    def __repr__(self):
+        return f"ReplayPlan({len(self.steps)} steps, {len(self.problems)} problems)"
+
+
+def compile_replay_plan(events):
+    """Compiles recorded events into a ReplayPlan (raises ValueError if events is not a non-empty list)."""
+    if not events or not isinstance(events, list):
+        raise ValueError("Invalid or empty events data provided for replay.")
+
+    start_time = events[0]['time']
+    buttons = {} # button string -> Button (or None if unknown)
+    keys = {} # key string -> pynput key (or None if unparseable)
+    problems = []
+    steps = []
+    append = steps.append
+
+    for index, event in enumerate(events):
+        try:
+            event_type = event['type']
+            offset = round((event['time'] - start_time) * 1e9)
+            if event_type == 'mouse_move':
+                append((offset, PLAN_MOVE, (event['x'], event['y']), None))
+            elif event_type == 'mouse_click':
+                button_str = event['button']
+                if button_str not in buttons:
+                    button = getattr(Button, button_str.split('.')[-1], None)
+                    buttons[button_str] = button if isinstance(button, Button) else None
+                    if buttons[button_str] is None:
+                        problems.append(f"Unknown button type '{button_str}' (event {index})")
+                button = buttons[button_str]
+                if button is not None:
+                    append((offset, PLAN_BUTTON_PRESS if event['pressed'] else PLAN_BUTTON_RELEASE, button, None))
+            elif event_type in ('key_press', 'key_release'):
+                key_str = event['key']
+                if key_str not in keys:
+                    keys[key_str] = _parse_key(key_str)
+                    if keys[key_str] is None:
+                        problems.append(f"Unrecognized key '{key_str}' (event {index})")
+                key = keys[key_str]
+                if key is not None:
+                    append((offset, PLAN_KEY_PRESS if event_type == 'key_press' else PLAN_KEY_RELEASE, key, None))
+            elif event_type == 'mouse_scroll':
+                append((offset, PLAN_SCROLL, event['dx'], event['dy']))
+            elif event_type == 'void':
+                append((offset, PLAN_VOID, None, None)) # Keeps the trailing delay
+            else:
+                problems.append(f"Unknown event type '{event_type}' (event {index})")
+        except (KeyError, TypeError, AttributeError) as e:
+            problems.append(f"Malformed event {index}: {e}")
+
+    for problem in problems:
+        print(f"Warning: {problem}. Skipping.")
+    return ReplayPlan(steps, problems, len(events))
+
+
+# --- Replay speed and idle gaps ---
+# Per-preset timing settings are applied by rewriting the plan's offsets once per
+# replay: gaps are divided by the speed, then capped at max_idle_gap. Speed 0 is
+# "as fast as possible": moves follow each other with no delay and only the gaps
+# next to clicks, scrolls and key events are kept, each up to FAST_REPLAY_INPUT_GAP
+# (target applications need a moment to register the pointer position/key state).
+FAST_REPLAY_INPUT_GAP = 0.02 # Seconds
+
+
+def retime_plan(plan, speed=1.0, max_idle_gap=0.0):
+    """Returns the plan with its gaps scaled by 1/speed (0 = as fast as possible) and capped at max_idle_gap seconds (0 = no cap)."""
+    if speed == 1.0 and not max_idle_gap:
+        return plan
+    cap_ns = round(max_idle_gap * 1e9) if max_idle_gap and max_idle_gap > 0 else None
+    fast_gap_ns = round(FAST_REPLAY_INPUT_GAP * 1e9)
+    steps = []
+    append = steps.append
+    previous_source_ns = 0
+    previous_is_input = False
+    offset = 0
+    for offset_ns, op, arg1, arg2 in plan.steps:
+        gap = offset_ns - previous_source_ns
+        previous_source_ns = offset_ns
+        is_input = op != PLAN_MOVE and op != PLAN_VOID
+        if speed > 0:
+            gap = round(gap / speed)
+        elif is_input or previous_is_input:
+            gap = min(gap, fast_gap_ns)
+        else:
+            gap = 0
+        if cap_ns is not None and gap > cap_ns:
+            gap = cap_ns
+        offset += gap
+        append((offset, op, arg1, arg2))
+        previous_is_input = is_input
+    return ReplayPlan(steps, plan.problems, plan.event_count)
+
+
+# --- Replay scheduler ---
+# Events are scheduled against time.perf_counter_ns() (monotonic, high resolution)
+# relative to the start of the pass, so lateness never accumulates. Waiting is
+# hybrid: a coarse stop_event.wait() until SPIN_BUDGET before the deadline (Linux
+# routinely oversleeps by ~1 ms), then a short spin that keeps checking the stop
+# flag. Each opcode's measured controller call time is subtracted from its
+# deadline so that the action lands on time rather than starting on time.
+SPIN_BUDGET = 0.002 # Seconds spent spinning before each deadline (0 = sleep only)
+MAX_LATENCY_COMPENSATION_NS = 5_000_000 # Cap on the per-opcode latency correction
+LATENCY_SMOOTHING_SHIFT = 3 # Latency estimate is an EWMA with weight 1/8
+
+
+def _wait_until(deadline_ns, stop_event, spin_ns):
+    """Waits until perf_counter_ns() reaches deadline_ns. Returns True if stop_event got set."""
+    coarse_ns = deadline_ns - time.perf_counter_ns() - spin_ns
+    if coarse_ns > 0:
+        if stop_event:
+            if stop_event.wait(coarse_ns / 1e9):
+                return True
+        else:
+            time.sleep(coarse_ns / 1e9)
+    # Spin the rest (at most spin_ns plus the coarse wait's oversleep headroom)
+    while time.perf_counter_ns() < deadline_ns:
+        if stop_event and stop_event.is_set():
+            return True
+        time.sleep(0) # Yields the GIL to the GUI thread between checks
+    return bool(stop_event and stop_event.is_set())
+
+
+# --- Replay telemetry (opt-in) ---
+# When a ReplayTelemetry is passed to replay_events, every executed event gets its
+# scheduled time and the time its controller call returned (both in ns from the
+# start of its pass) written into preallocated arrays. Nothing is allocated per
+# event; once the buffer is full further events are only counted.
+TELEMETRY_MAX_SAMPLES = 1_000_000 # Buffer cap (~21 bytes per sample)
+TELEMETRY_INFINITE_PASSES = 10 # Passes to preallocate for an infinite replay
+
+
+class ReplayTelemetry:
+    """Scheduled vs actual execution time of each replayed event, with a lateness/drift summary."""
+
+    def __init__(self, capacity=0):
+        self.capacity = 0
+        self.count = 0 # Samples stored
+        self.dropped = 0 # Samples that did not fit in the buffer
+        self.passes = 0
+        self.elapsed_ns = 0 # Total wall time spent inside passes
+        self.scheduled_ns = array('q')
+        self.actual_ns = array('q')
+        self.ops = array('B')
+        self.pass_index = array('I')
+        self.reserve(capacity)
+
+    def reserve(self, capacity):
+        """Preallocates room for `capacity` samples (capped at TELEMETRY_MAX_SAMPLES)."""
+        capacity = min(capacity, TELEMETRY_MAX_SAMPLES)
+        extra = capacity - self.capacity
+        if extra > 0:
+            self.scheduled_ns.frombytes(bytes(8 * extra))
+            self.actual_ns.frombytes(bytes(8 * extra))
+            self.ops.frombytes(bytes(extra))
+            self.pass_index.frombytes(bytes(self.pass_index.itemsize * extra))
+            self.capacity = capacity
+
+    def start_pass(self):
+        """Starts a new pass. Returns its index."""
+        self.passes += 1
+        return self.passes - 1
+
+    def record(self, pass_index, op, scheduled_ns, actual_ns):
+        i = self.count
+        if i < self.capacity:
+            self.scheduled_ns[i] = scheduled_ns
+            self.actual_ns[i] = actual_ns
+            self.ops[i] = op
+            self.pass_index[i] = pass_index
+            self.count = i + 1
+        else:
+            self.dropped += 1
+
+    def summary(self):
+        """Returns a dict with p50/p95/p99/max lateness (us), total drift (ms) and events per second."""
+        n = self.count
+        scheduled, actual, passes = self.scheduled_ns, self.actual_ns, self.pass_index
+        lateness = sorted(actual[i] - scheduled[i] for i in range(n))
+
+        def percentile(p):
+            return lateness[min(n - 1, int(p / 100 * n))] / 1000 if n else 0.0
+
+        # Drift: how late each pass ended compared to its schedule, summed over the passes
+        drift_ns = 0
+        for i in range(n):
+            if i == n - 1 or passes[i + 1] != passes[i]:
+                drift_ns += actual[i] - scheduled[i]
+        events = n + self.dropped
+        return {
+            'events': events,
+            'samples': n,
+            'passes': self.passes,
+            'p50_lateness_us': percentile(50),
+            'p95_lateness_us': percentile(95),
+            'p99_lateness_us': percentile(99),
+            'max_lateness_us': lateness[-1] / 1000 if n else 0.0,
+            'mean_lateness_us': sum(lateness) / n / 1000 if n else 0.0,
+            'total_drift_ms': drift_ns / 1e6,
+            'events_per_second': events / (self.elapsed_ns / 1e9) if self.elapsed_ns else 0.0,
+            'iterations_per_minute': self.passes / (self.elapsed_ns / 6e10) if self.elapsed_ns else 0.0,
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        text = (f"{s['events']} events in {s['passes']} pass(es), {s['events_per_second']:.0f} events/s, "
+                f"{s['iterations_per_minute']:.1f} passes/min\n"
+                f"Lateness: p50 {s['p50_lateness_us']:.0f} us, p95 {s['p95_lateness_us']:.0f} us, "
+                f"p99 {s['p99_lateness_us']:.0f} us, max {s['max_lateness_us']:.0f} us\n"
+                f"Total drift: {s['total_drift_ms']:.3f} ms")
+        if self.dropped:
+            text += f"\n({self.dropped} events past the {self.capacity}-sample buffer are not in the percentiles)"
+        return text
+
+    def to_csv(self, path):
+        """Writes one row per sample (times in microseconds)."""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["index", "pass", "op", "scheduled_us", "actual_us", "lateness_us"])
+            for i in range(self.count):
+                scheduled, actual = self.scheduled_ns[i], self.actual_ns[i]
+                writer.writerow([i, self.pass_index[i], self.ops[i],
+                                 f"{scheduled / 1000:.3f}", f"{actual / 1000:.3f}", f"{(actual - scheduled) / 1000:.3f}"])
+
+    def to_json(self, path):
+        """Writes the summary and the samples (times in nanoseconds)."""
+        data = {
+            'summary': self.summary(),
+            'samples': {
+                'pass': self.pass_index[:self.count].tolist(),
+                'op': self.ops[:self.count].tolist(),
+                'scheduled_ns': self.scheduled_ns[:self.count].tolist(),
+                'actual_ns': self.actual_ns[:self.count].tolist(),
+            },
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+
+# --- Repetitions ---
+# All passes of one replay share a _ReplaySession (controllers and latency
+# calibration) and the same retimed plan. Each pass is scheduled loop_gap after
+# the previous pass's scheduled end (or right away if that is already past), and
+# the gap is waited inside the pass like any other delay, so a zero gap gives
+# back-to-back passes and a stop request is seen during the gap too.
+DEFAULT_LOOP_GAP = 0.5 # Seconds between counted repetitions (loop_gap < 0 / None)
+DEFAULT_INFINITE_LOOP_GAP = 0.1 # Seconds between passes of an infinite replay
+
+
+class _ReplaySession:
+    """Controllers and per-opcode latency estimates shared by the passes of one replay."""
+    __slots__ = ('mouse', 'keyboard', 'latency_ns')
+
+    def __init__(self):
+        self.mouse = MouseController()
+        self.keyboard = KeyboardController()
+        self.latency_ns = [0] * 7 # Measured controller call time per opcode (EWMA)
+
+
+# --- Modified replay_events to accept events_data directly ---
+def replay_events(events_data, how_many_times=1, speed_factor=1.0, stop_event=None, spin_budget=None, telemetry=None,
+                  max_idle_gap=0.0, loop_gap=None, on_pass=None):
+    """Replays a ReplayPlan (or a list of recorded events) multiple times, allowing external stopping.
+    speed_factor 0 replays as fast as possible and max_idle_gap (seconds) caps pauses, see retime_plan.
+    loop_gap is the pause between repetitions in seconds (None or negative = the defaults above).
+    spin_budget (seconds) overrides SPIN_BUDGET. Pass a ReplayTelemetry to collect per-event timings.
+    on_pass, if given, is called with the number of completed repetitions after each one.
+    Returns {'iterations', 'seconds', 'iterations_per_minute'} (None if nothing could be replayed)."""
+    if isinstance(events_data, ReplayPlan):
+        plan = events_data
+    else:
+        try:
+            plan = compile_replay_plan(events_data)
+        except ValueError as e:
+            print(e)
+            return None
+    plan = retime_plan(plan, speed_factor, max_idle_gap)
+    if not plan.steps:
+        print("Nothing to replay: every event of the recording was skipped.")
+        return None
+    if telemetry is not None:
+        passes = TELEMETRY_INFINITE_PASSES if how_many_times == -1 else max(how_many_times, 1)
+        telemetry.reserve(len(plan.steps) * passes)
+    if loop_gap is None or loop_gap < 0:
+        loop_gap = DEFAULT_INFINITE_LOOP_GAP if how_many_times == -1 else DEFAULT_LOOP_GAP
+    gap_ns = round(loop_gap * 1e9)
+
+    session = _ReplaySession()
+    completed = 0
+    started = time.perf_counter()
     try:
         if how_many_times == -1:
             print("Replaying indefinitely (Stop signal can interrupt)...")
-            while True:
-                if stop_event and stop_event.is_set():
-                    print("Stop signal received during infinite replay.")
-                    break
-                _play_sequence(events, speed_factor, stop_event)
-                if stop_event and stop_event.is_set(): # Check again after sequence
-                    break
-                # Add a small delay between infinite loops if desired and not stopping
-                if not (stop_event and stop_event.is_set()):
-                    interrupted = stop_event.wait(0.1) if stop_event else time.sleep(0.1)
-                    if interrupted: break
         else:
             print(f"Replaying {how_many_times} times...")
-            for i in range(how_many_times):
-                if stop_event and stop_event.is_set():
-                    print(f"Stop signal received before repetition {i+1}.")
-                    break
-                print(f"  Repetition {i+1}/{how_many_times}")
-                _play_sequence(events, speed_factor, stop_event)
-                if stop_event and stop_event.is_set(): # Check after sequence finishes
-                     print(f"Stop signal received during repetition {i+1}.")
-                     break
-                # Pause between repetitions only if not the last one and not stopping
-                if i < how_many_times - 1 and not (stop_event and stop_event.is_set()):
-                    interrupted = stop_event.wait(0.5) if stop_event else time.sleep(0.5)
-                    if interrupted: break
+        next_start_ns = None # First pass starts right away
+        while how_many_times == -1 or completed < how_many_times:
+            if stop_event and stop_event.is_set():
+                print(f"Stop signal received before repetition {completed + 1}.")
+                break
+            if how_many_times != -1:
+                print(f"  Repetition {completed + 1}/{how_many_times}")
+            end_ns = _play_plan(plan, 1.0, stop_event, spin_budget, telemetry, # Speed is applied by retime_plan
+                                session=session, start_ns=next_start_ns)
+            if stop_event and stop_event.is_set(): # Check after sequence finishes
+                print(f"Stop signal received during repetition {completed + 1}.")
+                break
+            completed += 1
+            next_start_ns = end_ns + gap_ns
+            if on_pass is not None:
+                on_pass(completed)
 
         print("Replay loop finished or stopped.")
 
@@ -260,111 +697,121 @@ def replay_events(events_data, how_many_times=1, speed_factor=1.0, stop_event=No
 
     finally:
         print("replay_events finally block reached.")
-        pass
-
-
-def _play_sequence(events, speed_factor=1.0, stop_event=None):
-    """Plays a single sequence of events, checking for stop signal."""
-    mouse_controller = MouseController()
-    keyboard_controller = KeyboardController()
-    if not events:
-        return
-
-    # Store original start time for relative calculations
-    recording_start_time = events[0]['time']
-    replay_start_time = time.time() # Wall clock time when replay sequence begins
-
-    replay_pressed_keys = set()
+        if telemetry is not None:
+            print("Replay telemetry:\n" + telemetry.format_summary())
+
+    elapsed = time.perf_counter() - started
+    per_minute = completed / elapsed * 60 if elapsed > 0 else 0.0
+    if completed:
+        print(f"Completed {completed} repetition(s) in {elapsed:.2f} s ({per_minute:.1f} iterations/min).")
+    return {'iterations': completed, 'seconds': elapsed, 'iterations_per_minute': per_minute}
+
+
+def _play_plan(plan, speed_factor=1.0, stop_event=None, spin_budget=None, telemetry=None, session=None, start_ns=None):
+    """Plays a single pass of a ReplayPlan, checking for stop signal.
+    start_ns is the perf_counter_ns() time the pass is scheduled to start (default/past: now).
+    Returns the scheduled time of the last step."""
+    if session is None:
+        session = _ReplaySession()
+    mouse_controller = session.mouse
+    keyboard_controller = session.keyboard
+    if not plan.steps:
+        return time.perf_counter_ns() if start_ns is None else start_ns
+
+    time_scale = 1.0 / speed_factor
+    spin_ns = int((SPIN_BUDGET if spin_budget is None else spin_budget) * 1e9)
+    perf_counter_ns = time.perf_counter_ns
+    latency_ns = session.latency_ns
+    late_total_ns = late_max_ns = 0
+    executed = 0
+
+    replay_pressed_keys = set() # Resolved pynput keys
     replay_pressed_buttons = set()
 
-    # --- Moved the finally block inside the try ---
+    if telemetry is not None:
+        record, pass_index = telemetry.record, telemetry.start_pass()
+    else:
+        record = None
+
+    entry_ns = perf_counter_ns()
+    call_start_ns, last_op = entry_ns, PLAN_VOID
+    # Monotonic time when replay sequence begins (later than entry_ns when there is a loop gap)
+    replay_start_ns = entry_ns if start_ns is None or start_ns < entry_ns else start_ns
     try:
-        for event in events:
+        for offset_ns, op, arg1, arg2 in plan.steps:
             # --- Check stop event at the beginning of each event processing ---
-            if stop_event and stop_event.is_set():
+            if stop_event is not None and stop_event.is_set():
                 print("Stop signal detected during sequence playback (start of loop).")
                 break # Exit the loop immediately
 
-            # Calculate the target execution time for this event relative to replay start
-            time_since_recording_start = event['time'] - recording_start_time
-            scaled_delay = time_since_recording_start / speed_factor
-            target_execution_time = replay_start_time + scaled_delay
-
-            # Wait until the target time, checking stop_event
-            current_time = time.time()
-            wait_time = target_execution_time - current_time
-
-            if wait_time > 0:
-                interrupted = False
-                if stop_event:
-                    # Wait for the calculated duration OR until stop_event is set
-                    interrupted = stop_event.wait(timeout=wait_time)
-                else:
-                    time.sleep(wait_time) # Fallback if no stop_event provided
-
-                if interrupted:
+            now_ns = perf_counter_ns() # The only clock read for events that are already due
+            target_ns = replay_start_ns + int(offset_ns * time_scale)
+            deadline_ns = target_ns - latency_ns[op] # Start early by the expected call time
+            if deadline_ns > now_ns:
+                # --- Calibrate: time taken by the previous controller call (+ loop overhead) ---
+                call_ns = now_ns - call_start_ns
+                if call_ns > MAX_LATENCY_COMPENSATION_NS:
+                    call_ns = MAX_LATENCY_COMPENSATION_NS
+                latency_ns[last_op] += (call_ns - latency_ns[last_op]) >> LATENCY_SMOOTHING_SHIFT
+                if _wait_until(deadline_ns, stop_event, spin_ns):
                     print("Stop signal detected during delay.")
                     break # Exit loop if stopped during wait
-
-            # --- Check stop event again right before executing the action ---
-            if stop_event and stop_event.is_set():
-                 print("Stop signal detected before event execution.")
-                 break
+                now_ns = perf_counter_ns()
+            else:
+                # Behind schedule (e.g. a slow controller call): fire now, nothing to compensate
+                late_ns = now_ns - deadline_ns
+                late_total_ns += late_ns
+                if late_ns > late_max_ns:
+                    late_max_ns = late_ns
+            call_start_ns, last_op = now_ns, op
+            executed += 1
 
             # --- Execute Event ---
             try:
-                if event['type'] == 'mouse_move':
-                    mouse_controller.position = (event['x'], event['y'])
-                elif event['type'] == 'mouse_click':
-                    try:
-                        button_str = event['button'].split('.')[-1]
-                        button = getattr(Button, button_str)
-                    except (AttributeError, IndexError):
-                        print(f"Warning: Unknown button type '{event['button']}' in recording. Skipping.")
-                        continue
-
-                    if event['pressed']:
-                        mouse_controller.press(button)
-                        replay_pressed_buttons.add(button)
+                if op == PLAN_MOVE:
+                    mouse_controller.position = arg1
+                elif op == PLAN_BUTTON_PRESS:
+                    mouse_controller.press(arg1)
+                    replay_pressed_buttons.add(arg1)
+                elif op == PLAN_BUTTON_RELEASE:
+                    # Check if button is actually pressed before releasing
+                    if arg1 in replay_pressed_buttons:
+                        mouse_controller.release(arg1)
+                        replay_pressed_buttons.discard(arg1)
+                    else:
+                        # This can happen if the recording started with a button already down
+                        print(f"Warning: Attempted to release button {arg1} which wasn't tracked as pressed.")
+                elif op == PLAN_KEY_PRESS:
+                    keyboard_controller.press(arg1)
+                    replay_pressed_keys.add(arg1)
+                elif op == PLAN_KEY_RELEASE:
+                    # Check if key is actually pressed before releasing
+                    if arg1 in replay_pressed_keys:
+                        keyboard_controller.release(arg1)
+                        replay_pressed_keys.discard(arg1)
                     else:
-                        # Check if button is actually pressed before releasing
-                        if button in replay_pressed_buttons:
-                            mouse_controller.release(button)
-                            replay_pressed_buttons.discard(button)
-                        else:
-                            # This can happen if the recording started with a button already down
-                            # or if the stop happened between press/release. Just log it.
-                            print(f"Warning: Attempted to release button {button} which wasn't tracked as pressed.")
-
-                elif event['type'] == 'key_press':
-                     key = _parse_key(event['key'])
-                     if key:
-                         keyboard_controller.press(key)
-                         replay_pressed_keys.add(event['key']) # Store the string representation
-                elif event['type'] == 'key_release':
-                     key = _parse_key(event['key'])
-                     if key:
-                         # Check if key is actually pressed before releasing
-                         if event['key'] in replay_pressed_keys:
-                             keyboard_controller.release(key)
-                             replay_pressed_keys.discard(event['key'])
-                         else:
-                             print(f"Warning: Attempted to release key {event['key']} which wasn't tracked as pressed.")
-
-                elif event['type'] == 'mouse_scroll':
-                    mouse_controller.scroll(event['dx'], event['dy'])
-                elif event['type'] == 'void':
-                    pass # Do nothing for void events
+                        print(f"Warning: Attempted to release key {arg1} which wasn't tracked as pressed.")
+                elif op == PLAN_SCROLL:
+                    mouse_controller.scroll(arg1, arg2)
+                # PLAN_VOID: nothing to do
             except Exception as e:
-                # Log error but continue replay if possible? Or break? For now, log and continue.
-                print(f"Error replaying event: {event}. Error: {e}")
-                # Consider adding 'break' here if errors should stop the sequence
+                # Log error but continue replay if possible
+                print(f"Error replaying step (op {op}, {arg1!r}, {arg2!r}). Error: {e}")
+            if record is not None:
+                # Actual = when the controller call returned (one extra clock read, only with telemetry)
+                record(pass_index, op, target_ns - replay_start_ns, perf_counter_ns() - replay_start_ns)
 
     finally:
+        if record is not None:
+            telemetry.elapsed_ns += perf_counter_ns() - entry_ns # Includes the loop gap
+        if executed:
+            print(f"Replay timing: {executed} events, mean lateness {late_total_ns / executed / 1000:.0f} us, "
+                  f"max {late_max_ns / 1000:.0f} us.")
         # Ensure keys/buttons pressed *during this sequence* are released at the end,
         # even if stopped prematurely by the stop_event or an error.
-        print("_play_sequence finally block: Releasing potentially stuck keys/buttons...")
+        print("_play_plan finally block: Releasing potentially stuck keys/buttons...")
         _release_keys_buttons(keyboard_controller, mouse_controller, replay_pressed_keys, replay_pressed_buttons)
+    return replay_start_ns + int(plan.steps[-1][0] * time_scale)
 
 
 def _parse_key(key_str):
@@ -404,7 +851,7 @@ def _release_keys_buttons(keyboard_controller, mouse_controller, pressed_keys_st
     # Release keys first
     released_keys_count = 0
     for key_str in list(pressed_keys_str): # Iterate over a copy
-        key = _parse_key(key_str)
+        key = key_str if isinstance(key_str, Key) else _parse_key(key_str) # Plans track resolved keys
         if key:
             try:
                 keyboard_controller.release(key)
@@ -444,7 +891,7 @@ def _release_all_keys_buttons():
 # --- Update example usage to reflect changes (optional) ---
 if __name__ == '__main__':
     recorder = Recorder()
-    print("Starting recording for 10 seconds (or stop with LeftClick+Shift)...")
+    print(f"Starting recording for 10 seconds (or hold {recorder.stop_gesture.describe()} to stop)...")
     recorder.start_recording()
 
     start_wait = time.time()
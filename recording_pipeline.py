@@ -0,0 +1,195 @@
+import math
+import os
+from collections import deque
+
+import move_decimation
+
+# --- Recording post-processing pipeline ---
+# A recording is cleaned up by a chain of stages. Each stage is a generator over
+# the events of the previous one, so the whole pipeline is a single streaming
+# pass: it works the same on a list and on a SpilledRecording, and only holds
+# what a stage needs to look back on (a run of moves, a trim window).
+#
+#   trim_start:<s>      drops the first s seconds (the click that started the recording)
+#   trim_end:<s>        drops the last s seconds before the recording stopped (e.g. the stop gesture)
+#   repair              releases the buttons/keys still pressed at the end, then ends with a void event
+#   dedupe              drops mouse moves to where the pointer already is
+#   decimate[:bucket_ms[:tolerance_px]]   thins out runs of mouse moves (see move_decimation)
+#   cap_idle:<s>        shortens pauses longer than s seconds (later events move up)
+#
+# A pipeline is written as its stages in order, separated by commas, e.g.
+# "trim_start:0.1,repair,dedupe,decimate". Each recorded preset can have its own
+# (its postprocess= field, empty = DEFAULT_PIPELINE_SPEC). It runs when a
+# recording stops, and Replay > Optimize Recordings... runs it again on saved
+# recordings, without the trim stages: trimming a saved recording again would
+# cut a bit more off it every time. More stages can be added with register_stage.
+
+DEFAULT_PIPELINE_SPEC = os.environ.get("SCRIPTLAUNCHER_PIPELINE") or \
+    "trim_start:0.1,repair,dedupe" + (",decimate" if move_decimation.DECIMATE_ON_RECORD else "")
+VOID_DELAY = 0.1 # Seconds between the last event and the void event added by 'repair'
+
+
+def _trim_start(events, end_time, seconds):
+    events = iter(events)
+    for event in events:
+        cutoff = event['time'] + seconds # Measured from the first event
+        if event['time'] >= cutoff:
+            yield event
+        break
+    for event in events:
+        if event['time'] >= cutoff:
+            yield event
+            yield from events
+            return
+
+
+def _trim_end(events, end_time, seconds):
+    if end_time is not None: # Recording: the stop time is known
+        cutoff = end_time - seconds
+        for event in events:
+            if event['time'] <= cutoff:
+                yield event
+        return
+    # Otherwise the end is the last event: hold back the events of the last `seconds`
+    window = deque()
+    for event in events:
+        window.append(event)
+        while window[-1]['time'] - window[0]['time'] > seconds:
+            yield window.popleft()
+
+
+def _repair(events, end_time):
+    buttons = {} # Pressed button -> (x, y) of its press
+    keys = {} # Pressed keys, in press order
+    last = None
+    for event in events:
+        event_type = event['type']
+        if event_type == 'mouse_click':
+            if event['pressed']:
+                buttons[event['button']] = (event['x'], event['y'])
+            else:
+                buttons.pop(event['button'], None)
+        elif event_type == 'key_press':
+            keys[event['key']] = True
+        elif event_type == 'key_release':
+            keys.pop(event['key'], None)
+        last = event
+        yield event
+    if last is None:
+        return
+
+    final_time = end_time if end_time is not None else last['time']
+    for button, (x, y) in buttons.items():
+        print(f"Adding final release for button: {button}")
+        yield {'type': 'mouse_click', 'x': x, 'y': y, 'button': button, 'pressed': False, 'time': final_time}
+    for key in keys:
+        print(f"Adding final release for key: {key}")
+        yield {'type': 'key_release', 'key': key, 'time': final_time}
+    if buttons or keys or last['type'] != 'void':
+        # Add a small delay and a 'void' event at the end
+        yield {'type': 'void', 'time': final_time + VOID_DELAY}
+
+
+def _dedupe(events, end_time):
+    position = None # Pointer position after the last positioned event
+    for event in events:
+        if 'x' in event:
+            current = (event['x'], event['y'])
+            if event['type'] == 'mouse_move' and current == position:
+                continue
+            position = current
+        yield event
+
+
+def _decimate(events, end_time, bucket_ms=None, tolerance_px=None):
+    return move_decimation.iter_decimated_moves(events, bucket_ms, tolerance_px)
+
+
+def _cap_idle(events, end_time, seconds):
+    shift = 0.0 # Idle time removed so far
+    previous = None
+    for event in events:
+        t = event['time']
+        if previous is not None and t - previous > seconds:
+            shift += t - previous - seconds
+        previous = t
+        # Events are shared with the caller (e.g. a cached recording): shifted ones are copies
+        yield dict(event, time=t - shift) if shift else event
+
+
+# name -> (stage function, min args, max args, recording only)
+STAGES = {}
+
+
+def register_stage(name, function, min_args=0, max_args=0, recording_only=False):
+    """
+    Adds a pipeline stage. function(events, end_time, *args) returns an iterator
+    of the processed events; end_time is the time the recording stopped (None for
+    a saved recording) and args are the non-negative numbers after the name.
+    recording_only stages are skipped when optimizing saved recordings.
+    """
+    STAGES[name] = (function, min_args, max_args, recording_only)
+
+
+register_stage('trim_start', _trim_start, 1, 1, recording_only=True)
+register_stage('trim_end', _trim_end, 1, 1, recording_only=True)
+register_stage('repair', _repair)
+register_stage('dedupe', _dedupe)
+register_stage('decimate', _decimate, 0, 2)
+register_stage('cap_idle', _cap_idle, 1, 1)
+
+
+class RecordingPipeline:
+    """ A parsed pipeline spec (see the module notes). Raises ValueError if it is invalid. """
+
+    def __init__(self, spec=None):
+        self.spec = (spec if spec is not None else DEFAULT_PIPELINE_SPEC).strip()
+        self.stages = [] # (name, args)
+        for part in self.spec.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            name, *raw_args = [piece.strip() for piece in part.split(":")]
+            if name not in STAGES:
+                raise ValueError(f"Unknown post-processing stage '{name}' (available: {', '.join(STAGES)})")
+            _, min_args, max_args, _ = STAGES[name]
+            if not min_args <= len(raw_args) <= max_args:
+                raise ValueError(f"Stage '{name}' takes {min_args}" + (f" to {max_args}" if max_args != min_args else "")
+                                 + " argument(s)")
+            args = []
+            for raw in raw_args:
+                try:
+                    value = float(raw)
+                except ValueError:
+                    raise ValueError(f"Invalid argument '{raw}' for stage '{name}'")
+                if not math.isfinite(value) or value < 0:
+                    raise ValueError(f"Invalid argument '{raw}' for stage '{name}'")
+                args.append(value)
+            self.stages.append((name, args))
+
+    def describe(self):
+        """ Readable form, e.g. 'trim_start 0.1 → repair → dedupe → decimate'. """
+        parts = []
+        for name, args in self.stages:
+            parts.append(" ".join([name] + [f"{arg:g}" for arg in args]))
+        return " → ".join(parts) if parts else "none"
+
+    def run(self, events, end_time=None, recording=True):
+        """
+        Chains the stages over `events` (any iterable of event dicts) and returns
+        an iterator of the results; nothing runs until it is consumed.
+        end_time is when the recording stopped; with recording=False (a saved
+        recording) the recording-only stages are skipped.
+        """
+        stream = iter(events)
+        for name, args in self.stages:
+            function, _, _, recording_only = STAGES[name]
+            if recording_only and not recording:
+                continue
+            stream = function(stream, end_time, *args)
+        return stream
+
+
+def pipeline_for_preset(preset_data):
+    """ The pipeline of a recorded preset (its postprocess spec, or the default). Raises ValueError. """
+    return RecordingPipeline(preset_data.get('postprocess') or None)
@@ -0,0 +1,165 @@
+import os
+import struct
+import tempfile
+import weakref
+
+# --- Recording segments ---
+# A recording is captured as fixed-size packed rows (see recording_module's
+# capture buffer). Long recordings do not keep those rows in memory: every
+# SPILL_CHUNK_BYTES they are appended to a temporary segment file, and the
+# finished recording is written to another segment instead of a list. A
+# SpilledRecording reads the events back a chunk at a time, as many times as
+# needed (saving makes a couple of passes), so memory use does not grow with the
+# length of the recording. Segment files are deleted when they are closed or
+# garbage collected (and at exit).
+#
+# Row: opcode, name id (index in the button or key table), monotonic ns, x, y, dx, dy.
+
+CAPTURE_MOVE, CAPTURE_BUTTON_PRESS, CAPTURE_BUTTON_RELEASE, CAPTURE_SCROLL, CAPTURE_KEY_PRESS, CAPTURE_KEY_RELEASE, \
+    CAPTURE_VOID = range(7)
+# Coordinates are float32: exact for whole pixels, ~0.01 px for fractional ones (macOS)
+_CAPTURE_ROW = struct.Struct('<B3xIqffff') # 32 bytes
+_pack_row = _CAPTURE_ROW.pack
+
+SPILL_CHUNK_BYTES = 4 * 1024 * 1024 # Rows moved to disk at a time (131072 events); None = never spill
+SEGMENT_IO_BYTES = 1024 * 1024 # Rows read from / buffered for a segment file at a time
+SPILL_DIR = os.environ.get("SCRIPTLAUNCHER_SPILL_DIR") or None # None = the system temp folder
+
+
+def _number(value):
+    return int(value) if value.is_integer() else round(value, 2)
+
+
+def _chunk_size():
+    """ SEGMENT_IO_BYTES rounded down to whole rows. """
+    return max(SEGMENT_IO_BYTES // _CAPTURE_ROW.size, 1) * _CAPTURE_ROW.size
+
+
+def _remove_segment(file, path):
+    file.close()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class RecordingSegment:
+    """ Append-only temporary file of packed rows. """
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix="recording-", suffix=".segment", dir=SPILL_DIR)
+        self._file = os.fdopen(fd, "wb")
+        self.row_count = 0
+        self._finalizer = weakref.finalize(self, _remove_segment, self._file, self.path)
+
+    def __repr__(self):
+        return f"RecordingSegment({os.path.basename(self.path)!r}, {self.row_count} rows)"
+
+    def write(self, rows):
+        """ Appends whole packed rows (any bytes-like object). """
+        self._file.write(rows)
+        self.row_count += len(rows) // _CAPTURE_ROW.size
+
+    def iter_rows(self):
+        """ Yields the unpacked rows written so far, reading one chunk at a time. """
+        self._file.flush()
+        chunk_size = _chunk_size()
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield from _CAPTURE_ROW.iter_unpack(chunk)
+
+    def close(self):
+        """ Deletes the file (also done when the segment is garbage collected). """
+        self._finalizer()
+
+
+def iter_row_events(rows, buttons, keys):
+    """
+    Turns unpacked rows into the stored event dicts (times in time.monotonic()
+    seconds). `buttons` and `keys` map names to the ids used in the rows.
+    """
+    button_names = {i: name for name, i in buttons.items()}
+    key_names = {i: name for name, i in keys.items()}
+    for op, name_id, t_ns, x, y, dx, dy in rows:
+        t = t_ns / 1e9
+        if op == CAPTURE_MOVE:
+            yield {'type': 'mouse_move', 'x': _number(x), 'y': _number(y), 'time': t}
+        elif op == CAPTURE_BUTTON_PRESS or op == CAPTURE_BUTTON_RELEASE:
+            yield {'type': 'mouse_click', 'x': _number(x), 'y': _number(y), 'button': button_names[name_id],
+                   'pressed': op == CAPTURE_BUTTON_PRESS, 'time': t}
+        elif op == CAPTURE_SCROLL:
+            yield {'type': 'mouse_scroll', 'x': _number(x), 'y': _number(y), 'dx': _number(dx),
+                   'dy': _number(dy), 'time': t}
+        elif op == CAPTURE_VOID:
+            yield {'type': 'void', 'time': t}
+        else:
+            yield {'type': 'key_press' if op == CAPTURE_KEY_PRESS else 'key_release',
+                   'key': key_names[name_id], 'time': t}
+
+
+def _name_id(table, name):
+    name_id = table.get(name)
+    if name_id is None:
+        name_id = table[name] = len(table)
+    return name_id
+
+
+def _event_row(event, buttons, keys):
+    """ Packs a stored event dict (the inverse of iter_row_events), adding new names to the tables. """
+    event_type = event['type']
+    t_ns = round(event['time'] * 1e9)
+    if event_type == 'mouse_move':
+        return _pack_row(CAPTURE_MOVE, 0, t_ns, event['x'], event['y'], 0, 0)
+    if event_type == 'mouse_click':
+        return _pack_row(CAPTURE_BUTTON_PRESS if event['pressed'] else CAPTURE_BUTTON_RELEASE,
+                         _name_id(buttons, event['button']), t_ns, event['x'], event['y'], 0, 0)
+    if event_type == 'mouse_scroll':
+        return _pack_row(CAPTURE_SCROLL, 0, t_ns, event['x'], event['y'], event['dx'], event['dy'])
+    if event_type == 'key_press' or event_type == 'key_release':
+        return _pack_row(CAPTURE_KEY_PRESS if event_type == 'key_press' else CAPTURE_KEY_RELEASE,
+                         _name_id(keys, event['key']), t_ns, 0, 0, 0, 0)
+    return _pack_row(CAPTURE_VOID, 0, t_ns, 0, 0, 0, 0)
+
+
+class SpilledRecording:
+    """
+    Stand-in for the event list of a long recording, kept in a segment file.
+    len() and iteration work like on a list of event dicts (each iteration
+    starts over from the first event), but the events are never all in memory.
+    The preset writers stream it straight into the saved preset.
+    """
+
+    def __init__(self, segment, buttons, keys):
+        self.segment = segment
+        self.buttons = buttons # name -> id
+        self.keys = keys
+
+    @classmethod
+    def from_events(cls, events):
+        """ Writes an iterable of event dicts to a new segment, one chunk at a time. """
+        segment = RecordingSegment()
+        buttons, keys = {}, {}
+        chunk = bytearray()
+        chunk_size = _chunk_size()
+        for event in events:
+            chunk += _event_row(event, buttons, keys)
+            if len(chunk) >= chunk_size:
+                segment.write(chunk)
+                chunk.clear()
+        segment.write(chunk)
+        return cls(segment, buttons, keys)
+
+    def __len__(self):
+        return self.segment.row_count
+
+    def __iter__(self):
+        return iter_row_events(self.segment.iter_rows(), self.buttons, self.keys)
+
+    def __repr__(self):
+        return f"SpilledRecording({len(self)} events in {os.path.basename(self.segment.path)!r})"
+
+    def close(self):
+        self.segment.close()
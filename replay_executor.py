@@ -0,0 +1,193 @@
+import itertools
+import threading
+from collections import deque
+
+from PyQt6.QtCore import QObject, pyqtSignal # type: ignore
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+STOPPING = "stopping"
+DONE = "done"
+
+# What submit() does while another replay is queued or running
+POLICY_SERIALIZE = "serialize" # Queue the new replay behind the others
+POLICY_REJECT = "reject" # Refuse the new replay
+POLICY_PREEMPT = "preempt" # Stop the running replay, drop the queued ones, then run the new one
+POLICIES = (POLICY_SERIALIZE, POLICY_REJECT, POLICY_PREEMPT)
+
+
+class ReplayJob:
+    """ One queued/running replay of a preset. """
+    __slots__ = ('job_id', 'file_name', 'plan', 'how_many', 'speed', 'max_idle_gap', 'loop_gap',
+                 'telemetry', 'stop_event', 'status', 'cancelled', 'completed', 'result', 'error')
+
+    def __init__(self, job_id, file_name, plan, how_many=1, speed=1.0, max_idle_gap=0.0, loop_gap=None, telemetry=None):
+        self.job_id = job_id
+        self.file_name = file_name
+        self.plan = plan
+        self.how_many = how_many
+        self.speed = speed
+        self.max_idle_gap = max_idle_gap
+        self.loop_gap = loop_gap
+        self.telemetry = telemetry
+        self.stop_event = threading.Event() # Same stop mechanism replay_events always had
+        self.status = QUEUED
+        self.cancelled = False # Stopped before it started or before it finished
+        self.completed = 0 # Repetitions played so far
+        self.result = None # Return value of replay_events
+        self.error = None # Error message if the replay raised
+
+    def __repr__(self):
+        return f"ReplayJob({self.job_id}, {self.file_name!r}, {self.status})"
+
+
+class ReplayExecutor(QObject):
+    """
+    Single long-lived thread that runs all replays, one at a time (they share
+    the physical mouse and keyboard). Jobs are queued, stopped through their
+    stop_event, and report their status through Qt signals delivered on the
+    GUI thread. replay_func is recording_module.replay_events (or a stand-in).
+    """
+    status_changed = pyqtSignal(object, str) # (ReplayJob, status)
+    job_finished = pyqtSignal(object) # ReplayJob, after its final DONE status
+    progress = pyqtSignal(object, int) # (ReplayJob, completed repetitions)
+
+    def __init__(self, replay_func, policy=POLICY_SERIALIZE, parent=None):
+        super().__init__(parent)
+        self.replay_func = replay_func # Read when each job starts, may be swapped between jobs
+        self.policy = policy
+        self._queue = deque()
+        self._running = None
+        self._job_ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="ReplayExecutor", daemon=True)
+        self._thread.start()
+
+    # --- Called from the GUI thread ---
+
+    def set_policy(self, policy):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown replay policy '{policy}'")
+        self.policy = policy
+        print(f"Replay policy: {policy}")
+
+    def submit(self, file_name, plan, how_many=1, speed=1.0, max_idle_gap=0.0, loop_gap=None, telemetry=None):
+        """
+        Queues a replay of a preset according to the policy.
+        Returns (job, queued, message): job is None if the replay was rejected.
+        A preset that already has a queued, running or stopping job gets that job
+        back with queued False; queued is True only for a newly created job.
+        """
+        notifications = []
+        with self._cond:
+            existing = self._job_for(file_name)
+            if existing is not None:
+                return existing, False, "This preset is already queued, playing or stopping."
+            busy = self._running is not None or bool(self._queue)
+            if busy and self.policy == POLICY_REJECT:
+                other = self._running or self._queue[0]
+                return None, False, f"Another replay ({other.file_name}) is already running."
+            if busy and self.policy == POLICY_PREEMPT:
+                notifications.extend(self._cancel_queued(lambda job: True))
+                notifications.extend(self._stop_running())
+            job = ReplayJob(next(self._job_ids), file_name, plan, how_many, speed, max_idle_gap, loop_gap, telemetry)
+            self._queue.append(job)
+            notifications.append((job, QUEUED, False))
+            self._cond.notify_all() # wait_idle() callers share the condition
+        self._notify(notifications)
+        return job, True, ""
+
+    def stop(self, file_name):
+        """ Cancels the queued replay of a preset or stops its running one. Returns True if there was one. """
+        with self._cond:
+            notifications = self._cancel_queued(lambda job: job.file_name == file_name)
+            if self._running is not None and self._running.file_name == file_name:
+                notifications.extend(self._stop_running())
+        self._notify(notifications)
+        return bool(notifications)
+
+    def stop_all(self):
+        """ Cancels every queued replay and stops the running one. """
+        with self._cond:
+            notifications = self._cancel_queued(lambda job: True) + self._stop_running()
+        self._notify(notifications)
+
+    def status(self, file_name):
+        """ Status of the preset's queued/running job, or DONE if it has none. """
+        with self._cond:
+            job = self._job_for(file_name)
+            return job.status if job is not None else DONE
+
+    def wait_idle(self, timeout=None):
+        """ Blocks until no job is queued or running. Returns False on timeout. """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._running is None and not self._queue, timeout)
+
+    # --- Internals (caller holds the lock unless noted) ---
+
+    def _job_for(self, file_name):
+        if self._running is not None and self._running.file_name == file_name:
+            return self._running
+        for job in self._queue:
+            if job.file_name == file_name:
+                return job
+        return None
+
+    def _cancel_queued(self, predicate):
+        cancelled = [job for job in self._queue if predicate(job)]
+        for job in cancelled:
+            self._queue.remove(job)
+            job.stop_event.set()
+            job.cancelled = True
+            job.status = DONE
+        return [(job, DONE, True) for job in cancelled]
+
+    def _stop_running(self):
+        job = self._running
+        if job is None or job.status != RUNNING:
+            return []
+        job.stop_event.set()
+        job.cancelled = True
+        job.status = STOPPING
+        return [(job, STOPPING, False)]
+
+    def _notify(self, notifications):
+        """ Emits the collected status changes (without holding the lock). """
+        for job, status, finished in notifications:
+            self.status_changed.emit(job, status)
+            if finished:
+                self.job_finished.emit(job)
+
+    def _on_pass(self, job, completed):
+        """ Called from the replay (executor thread) after each repetition. """
+        job.completed = completed
+        self.progress.emit(job, completed)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                self._running = job
+                job.status = RUNNING
+            self.status_changed.emit(job, RUNNING)
+
+            print(f"Replay job {job.job_id} starting for {job.file_name}")
+            try:
+                job.result = self.replay_func(job.plan, job.how_many, job.speed, stop_event=job.stop_event,
+                                              telemetry=job.telemetry, max_idle_gap=job.max_idle_gap,
+                                              loop_gap=job.loop_gap,
+                                              on_pass=lambda completed, job=job: self._on_pass(job, completed))
+            except Exception as e:
+                job.error = str(e)
+                print(f"Error during replay of {job.file_name}: {e}")
+            print(f"Replay job {job.job_id} finished for {job.file_name}")
+
+            with self._cond:
+                self._running = None
+                job.status = DONE
+                self._cond.notify_all()
+            self._notify([(job, DONE, True)])
+
@@ -0,0 +1,230 @@
+import json
+import mmap
+import multiprocessing
+import os
+import queue
+import struct
+import tempfile
+import threading
+
+from recording_module import (
+    ReplayPlan, ReplayTelemetry, compile_replay_plan, replay_events, _parse_key, Button, Key,
+    PLAN_MOVE, PLAN_BUTTON_PRESS, PLAN_BUTTON_RELEASE, PLAN_SCROLL, PLAN_KEY_PRESS, PLAN_KEY_RELEASE
+)
+
+# --- Out-of-process replay ---
+# A replay thread in the GUI process competes with the GUI for the GIL, so a
+# preset reload, a theme switch or a big save shows up as stutter in the replayed
+# mouse path. In this mode replay_events runs in a dedicated child process
+# instead, started once (spawn, not fork: the GUI process has threads) and reused
+# by every replay.
+#
+# The plan is not pickled: it is written as a flat timeline file that the child
+# maps with mmap and decodes in one pass. Only small messages go over the pipe:
+#
+#   parent -> child: ('play', timeline_path, how_many, speed, max_idle_gap, loop_gap, with_telemetry)
+#                    ('stop',)  ('quit',)
+#   child -> parent: ('progress', completed_passes)
+#                    ('done', result, telemetry or None)  ('error', message)
+#
+# Timeline file: header (magic, version, step count, name table length), the
+# name table (JSON list of button/key names), then one fixed-size record per
+# step: offset_ns, opcode, arg1, arg2. Moves and scrolls store their numbers in
+# arg1/arg2; buttons and keys store the index of their name in the table.
+
+TIMELINE_MAGIC = b'SLRP'
+TIMELINE_VERSION = 1
+_HEADER = struct.Struct('<4sIII')
+_STEP = struct.Struct('<qB7xdd') # 32 bytes per step
+
+STOP_POLL_INTERVAL = 0.02 # Seconds between stop/progress checks in the parent
+
+
+def _key_name(key):
+    """ Inverse of recording_module._parse_key for resolved keys. """
+    if isinstance(key, Key):
+        return f"Key.{key.name}"
+    return f"'{key}'"
+
+
+def _number(value):
+    return int(value) if value.is_integer() else value
+
+
+def write_timeline(plan, path):
+    """ Writes a ReplayPlan as a timeline file. """
+    names, name_index = [], {}
+    records = bytearray(_STEP.size * len(plan.steps))
+    for i, (offset_ns, op, arg1, arg2) in enumerate(plan.steps):
+        if op in (PLAN_BUTTON_PRESS, PLAN_BUTTON_RELEASE, PLAN_KEY_PRESS, PLAN_KEY_RELEASE):
+            name = str(arg1) if op in (PLAN_BUTTON_PRESS, PLAN_BUTTON_RELEASE) else _key_name(arg1)
+            if name not in name_index:
+                name_index[name] = len(names)
+                names.append(name)
+            arg1, arg2 = name_index[name], 0
+        elif op == PLAN_MOVE:
+            arg1, arg2 = arg1
+        _STEP.pack_into(records, i * _STEP.size, offset_ns, op, arg1 or 0, arg2 or 0)
+    table = json.dumps(names).encode('utf-8')
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(TIMELINE_MAGIC, TIMELINE_VERSION, len(plan.steps), len(table)))
+        f.write(table)
+        f.write(records)
+
+
+def read_timeline(path):
+    """ Maps a timeline file and decodes it back into a ReplayPlan. """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        magic, version, count, table_len = _HEADER.unpack_from(mapped, 0)
+        if magic != TIMELINE_MAGIC or version != TIMELINE_VERSION:
+            raise ValueError(f"Not a replay timeline (version {version}): {path}")
+        start = _HEADER.size + table_len
+        names = json.loads(mapped[_HEADER.size:start].decode('utf-8'))
+        objects = [getattr(Button, name.split('.')[-1], None) if name.startswith("Button.") else _parse_key(name)
+                   for name in names]
+        steps = []
+        append = steps.append
+        view = memoryview(mapped)[start:start + count * _STEP.size]
+        try:
+            for offset_ns, op, arg1, arg2 in _STEP.iter_unpack(view):
+                if op == PLAN_MOVE:
+                    append((offset_ns, op, (_number(arg1), _number(arg2)), None))
+                elif op == PLAN_SCROLL:
+                    append((offset_ns, op, _number(arg1), _number(arg2)))
+                elif op in (PLAN_BUTTON_PRESS, PLAN_BUTTON_RELEASE, PLAN_KEY_PRESS, PLAN_KEY_RELEASE):
+                    append((offset_ns, op, objects[int(arg1)], None))
+                else:
+                    append((offset_ns, op, None, None))
+        finally:
+            view.release() # The mmap cannot close while a view is exported
+    return ReplayPlan(steps, [], count)
+
+
+# --- Child process ---
+
+def _replay_worker(conn, initializer):
+    """ Child process main loop: plays the timelines it is sent, one at a time. """
+    if initializer is not None:
+        initializer()
+    commands = queue.Queue()
+
+    def read_commands():
+        # Only reader of the pipe, so a stop request is seen while a replay runs.
+        # Each play gets its stop event here, before a stop for it can arrive.
+        stop_event = threading.Event()
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                message = ('quit',)
+            if message[0] == 'play':
+                stop_event = threading.Event()
+                commands.put((message, stop_event))
+            elif message[0] == 'stop':
+                stop_event.set()
+            elif message[0] == 'quit':
+                stop_event.set()
+                commands.put((message, None))
+                return
+
+    threading.Thread(target=read_commands, name="ReplayCommands", daemon=True).start()
+    while True:
+        message, stop_event = commands.get()
+        if message[0] == 'quit':
+            break
+        _, path, how_many, speed, max_idle_gap, loop_gap, with_telemetry = message
+        try:
+            plan = read_timeline(path)
+            telemetry = ReplayTelemetry() if with_telemetry else None
+            result = replay_events(plan, how_many, speed, stop_event=stop_event, telemetry=telemetry,
+                                   max_idle_gap=max_idle_gap, loop_gap=loop_gap,
+                                   on_pass=lambda completed: conn.send(('progress', completed)))
+            conn.send(('done', result, telemetry))
+        except Exception as e:
+            print(f"Error in replay process: {e}")
+            conn.send(('error', str(e)))
+
+
+# --- Parent side ---
+
+class ProcessReplayer:
+    """
+    Runs replays in a child process. replay_events() has the same signature and
+    blocking behaviour as recording_module.replay_events, so it can be handed to
+    the ReplayExecutor as its replay function. `initializer` (a module-level
+    function) is called in the child before it starts serving replays.
+    """
+
+    def __init__(self, initializer=None):
+        self.initializer = initializer
+        self._process = None
+        self._conn = None
+        self._lock = threading.Lock() # One replay at a time over the pipe
+
+    def _ensure_started(self):
+        if self._process is not None and self._process.is_alive():
+            return
+        context = multiprocessing.get_context('spawn')
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_replay_worker, args=(child_conn, self.initializer),
+                                        name="ScriptLauncherReplay", daemon=True)
+        self._process.start()
+        child_conn.close()
+        print(f"Replay process started (pid {self._process.pid}).")
+
+    def replay_events(self, events_data, how_many_times=1, speed_factor=1.0, stop_event=None, telemetry=None,
+                      max_idle_gap=0.0, loop_gap=None, on_pass=None):
+        """ Replays in the child process. Returns replay_events' result; raises RuntimeError if the child fails. """
+        plan = events_data if isinstance(events_data, ReplayPlan) else compile_replay_plan(events_data)
+        fd, path = tempfile.mkstemp(prefix="replay-", suffix=".timeline")
+        os.close(fd)
+        with self._lock:
+            try:
+                write_timeline(plan, path)
+                self._ensure_started()
+                self._conn.send(('play', path, how_many_times, speed_factor, max_idle_gap, loop_gap,
+                                 telemetry is not None))
+                return self._wait_for_result(stop_event, telemetry, on_pass)
+            finally:
+                os.remove(path)
+
+    def _wait_for_result(self, stop_event, telemetry, on_pass):
+        stop_sent = False
+        while True:
+            if stop_event is not None and not stop_sent and stop_event.is_set():
+                self._conn.send(('stop',))
+                stop_sent = True
+            if not self._conn.poll(STOP_POLL_INTERVAL):
+                if not self._process.is_alive():
+                    raise RuntimeError(f"Replay process exited unexpectedly (exit code {self._process.exitcode}).")
+                continue
+            try:
+                message = self._conn.recv()
+            except EOFError:
+                raise RuntimeError("Replay process closed the connection.")
+            if message[0] == 'progress':
+                if on_pass is not None:
+                    on_pass(message[1])
+            elif message[0] == 'done':
+                _, result, child_telemetry = message
+                if telemetry is not None and child_telemetry is not None:
+                    telemetry.__dict__.update(child_telemetry.__dict__)
+                return result
+            elif message[0] == 'error':
+                raise RuntimeError(message[1])
+
+    def shutdown(self, timeout=2):
+        """ Stops the child process (after its current replay released its keys). """
+        if self._process is None:
+            return
+        try:
+            self._conn.send(('quit',))
+        except (OSError, BrokenPipeError):
+            pass
+        self._process.join(timeout)
+        if self._process.is_alive():
+            print("Replay process did not exit, terminating it.")
+            self._process.terminate()
+            self._process.join(timeout)
+        self._conn.close()
+        self._process = self._conn = None
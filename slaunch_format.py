@@ -0,0 +1,161 @@
+import math
+
+from event_codec import decode_record_section
+
+# --- Streaming reader for .slaunch files ---
+# A .slaunch file is:
+#
+#   title=<title>
+#   type=<standard|on_off|recorded>
+#   icon=<icon file or 'none'>
+#   script= / script_on= / script_off=   (followed by the script lines)
+#   on_off_state=<True|False>
+#   how_many=<repetitions>
+#   speed=<replay speed, 0 = as fast as possible>      (recorded presets)
+#   max_idle_gap=<seconds, 0 = no cap>                 (recorded presets)
+#   loop_gap=<seconds between repetitions, -1 = default> (recorded presets)
+#   postprocess=<pipeline stages, empty = default>     (recorded presets)
+#   record=                              (followed by the recording, always last)
+#
+# The reader makes a single pass over a binary stream: section lines are kept
+# as raw bytes and joined/decoded once per section, and the byte offset of the
+# record= section is tracked so the recording can be read (or skipped) lazily.
+
+RECORD_MARKER = b"record="
+SECTION_MARKERS = {
+    b"script=": 'script',
+    b"script_on=": 'script_on',
+    b"script_off=": 'script_off',
+}
+
+
+def new_preset_data(file_name):
+    """ Returns a preset dict with every field at its default. """
+    return {
+        'file_name': file_name,
+        'title': "",
+        'type': "standard",
+        'icon': "none",
+        # Initialize all possible fields
+        'script': "",
+        'script_on': "",
+        'script_off': "",
+        'on_off_state': False,
+        'recorded_events': None,
+        'how_many': 1,
+        'speed': 1.0,
+        'max_idle_gap': 0.0,
+        'loop_gap': -1.0,
+        'postprocess': ""
+    }
+
+
+def _parse_non_negative(raw, default):
+    """ Parses a float field, falling back to default if it is invalid or negative. """
+    try:
+        value = float(raw)
+    except ValueError:
+        return default
+    return value if math.isfinite(value) and value >= 0 else default
+
+
+def parse_preset_stream(stream, file_name, read_record=False):
+    """
+    Parses a .slaunch file from a binary stream (file, zip member, ...).
+
+    Returns (preset_data, record_offset). record_offset is the byte offset just
+    after the 'record=' line, or None if there is no such line. Reading stops
+    there unless read_record is True, in which case the rest of the stream is
+    decoded into preset_data['recorded_events'] (recorded presets only).
+    Returns (None, None) if the file is too short to hold a header.
+    """
+    offset = 0
+    header = []
+    for _ in range(3):
+        raw = stream.readline()
+        offset += len(raw)
+        header.append(raw)
+
+    # Basic validation (at least title, type, icon)
+    if not header[2]:
+        print(f"Warning: Skipping malformed preset file (too short): {file_name}")
+        return None, None
+
+    preset_data = new_preset_data(file_name)
+    preset_data['title'] = header[0].decode('utf-8').strip().replace("title=", "")
+    preset_data['type'] = header[1].decode('utf-8').strip().replace("type=", "")
+    preset_data['icon'] = header[2].decode('utf-8').strip().replace("icon=", "")
+
+    sections = {name: [] for name in SECTION_MARKERS.values()}
+    current = None # Raw line list of the active script section
+    record_offset = None
+    # Replay settings are only written for recorded presets (whose script is empty):
+    # elsewhere a line like 'speed=10' is part of a script
+    recorded = preset_data['type'] == "recorded"
+
+    for raw in stream: # Content starts from the 4th line
+        offset += len(raw)
+        stripped = raw.strip()
+
+        # --- Stop at the record marker, the recording is always last ---
+        if stripped == RECORD_MARKER:
+            record_offset = offset
+            break
+
+        # Detect section headers
+        section = SECTION_MARKERS.get(stripped)
+        if section is not None:
+            current = sections[section]
+        elif stripped.startswith(b"on_off_state="):
+            preset_data['on_off_state'] = stripped[len(b"on_off_state="):] == b"True"
+            current = None
+        elif stripped.startswith(b"how_many="):
+            try:
+                preset_data['how_many'] = int(stripped[len(b"how_many="):])
+            except ValueError:
+                preset_data['how_many'] = 1 # Default if invalid
+            current = None
+        elif recorded and stripped.startswith(b"speed="):
+            preset_data['speed'] = _parse_non_negative(stripped[len(b"speed="):], 1.0)
+            current = None
+        elif recorded and stripped.startswith(b"max_idle_gap="):
+            preset_data['max_idle_gap'] = _parse_non_negative(stripped[len(b"max_idle_gap="):], 0.0)
+            current = None
+        elif recorded and stripped.startswith(b"loop_gap="):
+            preset_data['loop_gap'] = _parse_non_negative(stripped[len(b"loop_gap="):], -1.0) # Negative = default
+            current = None
+        elif recorded and stripped.startswith(b"postprocess="):
+            preset_data['postprocess'] = stripped[len(b"postprocess="):].decode('utf-8', 'replace') # Checked when used
+            current = None
+        elif current is not None:
+            current.append(raw) # Append line to the current section
+
+    # Join + decode each section once, then strip trailing newlines from scripts
+    for name, lines in sections.items():
+        if lines:
+            preset_data[name] = b"".join(lines).decode('utf-8').replace('\r\n', '\n').rstrip('\n')
+
+    if read_record and preset_data['type'] == "recorded":
+        if record_offset is None:
+            print(f"Warning: 'record=' section missing or empty in recorded preset: {file_name}")
+        else:
+            preset_data['recorded_events'] = decode_recorded_events(stream.read(), file_name)
+
+    return preset_data, record_offset
+
+
+def decode_recorded_events(data, file_name):
+    """ Decodes a record= section (bytes or str), logging and returning None when it is unusable. """
+    if not data or data.isspace(): # No strip(): that would copy the whole payload
+        print(f"Warning: 'record=' section missing or empty in recorded preset: {file_name}")
+        return None
+    try:
+        # Handles both the packed form and the older plain JSON list
+        events = decode_record_section(data)
+    except ValueError as e: # json.JSONDecodeError is a ValueError
+        print(f"Error decoding embedded recording in {file_name}: {e}")
+        return None
+    if not isinstance(events, list):
+        print(f"Warning: Parsed JSON for {file_name} is not a list. Resetting.")
+        return None
+    return events
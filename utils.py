@@ -1,3 +1,4 @@
+import io
 import os
 import sys
 import platform
@@ -8,6 +9,12 @@ from PyQt6.QtWidgets import QMessageBox # type: ignore
 import platformdirs # <-- Import platformdirs
 import time # For cleanup delay
 import threading # For cleanup thread
+from collections import OrderedDict
+from event_codec import write_record_section
+from slaunch_format import parse_preset_stream, decode_recorded_events
+from preset_state import PresetStateStore
+from preset_db import PresetDatabase, encode_recording, read_slaunch_for_db
+from recording_segment import SpilledRecording
 
 # --- Application Info for platformdirs ---
 APP_NAME = "ScriptLauncher"
@@ -30,6 +37,14 @@ ICONS_FOLDER = os.path.join(ASSETS_FOLDER, "app_icons")
 # Presets go into the user's data directory
 USER_DATA_DIR = platformdirs.user_data_dir(APP_NAME, APP_AUTHOR)
 PRESETS_FOLDER = os.path.join(USER_DATA_DIR, "presets") # <-- User-specific presets path
+PRESET_INDEX_FILE = os.path.join(USER_DATA_DIR, "preset_index.json") # Cached parsed headers, see load_presets
+PRESET_STATE_FILE = os.path.join(USER_DATA_DIR, "preset_state.jsonl") # On/off state and run stats journal
+PRESET_DB_FILE = os.path.join(USER_DATA_DIR, "presets.sqlite3") # Used by the "sqlite" backend only
+
+# --- Preset storage backend ---
+# "files": one .slaunch file per preset in PRESETS_FOLDER (default).
+# "sqlite": all presets in PRESET_DB_FILE; the folder is migrated into it once.
+PRESET_BACKEND = os.environ.get("SCRIPTLAUNCHER_PRESET_BACKEND", "files").strip().lower()
 
 # --- Ensure necessary folders exist ---
 # Ensure user data and presets folder exist
@@ -75,6 +90,9 @@ def copy_default_presets_if_needed():
 copy_default_presets_if_needed()
 # --- End First Run Logic ---
 
+# Runtime state (on/off state, last run, run count) lives outside the preset files
+preset_state = PresetStateStore(PRESET_STATE_FILE)
+
 
 def resource_path(relative_path):
     """ Get absolute path to resource within the bundle/script dir. """
@@ -88,12 +106,368 @@ def get_icon_path(icon_name):
     # Uses the ICONS_FOLDER defined above, which is relative to BUNDLE_DIR
     return os.path.join(ICONS_FOLDER, icon_name)
 
+# --- Lazy access to recorded events ---
+# load_presets only parses the header and script sections of each file. For
+# recorded presets it stores a RecordedEventsHandle pointing at the record=
+# section; the events are read and decoded when a replay or the edit dialog
+# actually needs them. Decoded recordings are kept in a small shared LRU cache.
+RECORDED_EVENTS_CACHE_LIMIT = 4 # Max decoded recordings kept in memory (None = no limit)
+_recorded_events_cache = OrderedDict() # {(path, offset, mtime_ns, size): events}
+_recorded_events_lock = threading.Lock()
+
+
+def set_recorded_events_cache_limit(limit):
+    """ Sets how many decoded recordings stay cached (None disables the cap, 0 disables caching). """
+    global RECORDED_EVENTS_CACHE_LIMIT
+    RECORDED_EVENTS_CACHE_LIMIT = limit
+    with _recorded_events_lock:
+        _trim_recorded_events_cache()
+
+
+def _trim_recorded_events_cache():
+    """ Drops least recently used recordings above the limit. Caller holds the lock. """
+    if RECORDED_EVENTS_CACHE_LIMIT is None:
+        return
+    while len(_recorded_events_cache) > RECORDED_EVENTS_CACHE_LIMIT:
+        _recorded_events_cache.popitem(last=False)
+
+
+def _get_cached_recording(key):
+    with _recorded_events_lock:
+        events = _recorded_events_cache.get(key)
+        if events is not None:
+            _recorded_events_cache.move_to_end(key)
+        return events
+
+
+def _cache_recording(key, events):
+    if events is not None and RECORDED_EVENTS_CACHE_LIMIT != 0:
+        with _recorded_events_lock:
+            _recorded_events_cache[key] = events
+            _trim_recorded_events_cache()
+
+
+class RecordedEventsHandle:
+    """ Lazy reference to the record= section of a recorded preset file. """
+    __slots__ = ('path', 'offset', 'mtime_ns', 'size')
+
+    def __init__(self, path, offset, mtime_ns, size):
+        self.path = path
+        self.offset = offset # Byte offset of the first line after 'record='
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+    def __repr__(self):
+        return f"RecordedEventsHandle({os.path.basename(self.path)!r}, offset={self.offset})"
+
+    def load(self):
+        """ Returns the decoded event list (cached), or None if missing/invalid. """
+        key = (self.path, self.offset, self.mtime_ns, self.size)
+        stat = os.stat(self.path)
+        if (stat.st_mtime_ns, stat.st_size) == (self.mtime_ns, self.size): # Else the cached events are stale
+            events = _get_cached_recording(key)
+            if events is not None:
+                return events
+
+        file_name = os.path.basename(self.path)
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if (stat.st_mtime_ns, stat.st_size) != (self.mtime_ns, self.size):
+                # File was rewritten since it was listed: the offset may be stale
+                print(f"Warning: {file_name} changed on disk since it was loaded. Re-reading it.")
+                fresh = _read_preset_file(self.path, file_name)
+                handle = fresh.get('recorded_events') if fresh else None
+                return handle.load() if isinstance(handle, RecordedEventsHandle) else None
+            f.seek(self.offset)
+            record_data = f.read() # Bytes go straight to the decoder, no str copy
+
+        events = decode_recorded_events(record_data, file_name)
+        _cache_recording(key, events)
+        return events
+
+
+class StoredRecordingHandle:
+    """ Lazy reference to the recording of a preset kept in the SQLite store. """
+    __slots__ = ('file_name', 'revision')
+
+    def __init__(self, file_name, revision):
+        self.file_name = file_name
+        self.revision = revision # Row revision when listed, part of the cache key
+
+    def __repr__(self):
+        return f"StoredRecordingHandle({self.file_name!r}, revision={self.revision})"
+
+    def load(self):
+        """ Returns the decoded event list (cached), or None if missing/invalid. """
+        events = _get_cached_recording((PRESET_DB_FILE, self.file_name, self.revision))
+        if events is not None:
+            return events
+        record_data, revision = get_preset_db().load_recording(self.file_name)
+        if revision != self.revision:
+            print(f"Warning: {self.file_name} changed in the preset store since it was loaded.")
+        events = decode_recorded_events(record_data, self.file_name)
+        if revision is not None:
+            _cache_recording((PRESET_DB_FILE, self.file_name, revision), events)
+        return events
+
+
+def get_recorded_events(preset_data):
+    """ Returns the recorded events of a preset as a list (loading them if needed), or None. """
+    events = preset_data.get('recorded_events')
+    if isinstance(events, (RecordedEventsHandle, StoredRecordingHandle)):
+        try:
+            events = events.load()
+        except Exception as e:
+            print(f"Error loading recorded events for {preset_data.get('file_name')}: {e}")
+            return None
+    return events if isinstance(events, list) and events else None
+
+
+def get_recording_to_save(preset_data):
+    """
+    Like get_recorded_events, but a new long recording (SpilledRecording) is
+    returned as is, to be streamed into the preset instead of loaded as a list.
+    """
+    events = preset_data.get('recorded_events')
+    if isinstance(events, SpilledRecording):
+        return events if len(events) else None
+    return get_recorded_events(preset_data)
+
+
+# --- SQLite backend ---
+_preset_db = None
+_preset_db_lock = threading.Lock()
+
+
+def using_preset_db():
+    """ True when presets are stored in the SQLite database instead of .slaunch files. """
+    return PRESET_BACKEND == "sqlite"
+
+
+def get_preset_db():
+    """ Opens the preset database on first use, migrating the .slaunch folder into it once. """
+    global _preset_db
+    with _preset_db_lock:
+        if _preset_db is None:
+            _preset_db = PresetDatabase(PRESET_DB_FILE)
+            _preset_db.migrate_from_folder(PRESETS_FOLDER)
+        return _preset_db
+
+
+def _preset_from_db(preset_data, revision, has_recording):
+    if preset_data['type'] == "recorded":
+        if has_recording:
+            preset_data['recorded_events'] = StoredRecordingHandle(preset_data['file_name'], revision)
+        else:
+            print(f"Warning: No recording stored for recorded preset: {preset_data['file_name']}")
+    return _apply_runtime_state(preset_data)
+
+
+def _recording_for_db(preset_data):
+    """ Returns the recording blob to store for a preset (None if it has none). """
+    if preset_data.get('type') != "recorded":
+        return None
+    events = preset_data.get('recorded_events')
+    if isinstance(events, StoredRecordingHandle) and events.file_name == preset_data.get('file_name'):
+        # Unchanged recording of an edited preset: keep the stored bytes, no decode/encode
+        record_data, _ = get_preset_db().load_recording(events.file_name)
+        return record_data
+    return encode_recording(get_recording_to_save(preset_data)) # A SpilledRecording is encoded as a stream
+
+
+def store_preset_in_db(preset_data):
+    """ Inserts or replaces a preset in the SQLite store (raises on failure). """
+    get_preset_db().save(preset_data, _recording_for_db(preset_data))
+
+
+def search_presets(text=None, preset_type=None):
+    """ File names of presets whose title contains `text` and/or of type `preset_type`. """
+    if using_preset_db():
+        return get_preset_db().search(text, preset_type)
+    text = text.lower() if text else None
+    return [p['file_name'] for p in load_presets()
+            if (not text or text in p['title'].lower()) and (not preset_type or p['type'] == preset_type)]
+
+
+def bulk_update_presets(file_names, fields):
+    """
+    Sets the same fields (e.g. {'icon': 'terminal.png'}) on many presets.
+    One transaction with the SQLite backend, one atomic rewrite per file otherwise.
+    Returns the number of presets updated.
+    """
+    if using_preset_db():
+        return get_preset_db().update_fields(file_names, fields)
+    updated = 0
+    for file_name in file_names:
+        preset_data = load_preset(file_name)
+        if preset_data is None:
+            continue
+        preset_data.update(fields)
+        write_preset_text(file_name, serialize_preset(preset_data))
+        updated += 1
+    return updated
+
+
 # --- load_presets, save_preset, delete_preset ---
 # These functions should now correctly use the user-specific PRESETS_FOLDER
 # No changes needed inside them as they rely on the global PRESETS_FOLDER variable.
 
-def load_presets():
-    """ Loads all presets from the user's presets folder. """ # <-- Docstring updated
+def _read_preset_file(preset_path, file_name):
+    """
+    Parses the header and script sections of a .slaunch file.
+    The record= section is not read: recorded presets get a RecordedEventsHandle.
+    Returns None for malformed files.
+    """
+    with open(preset_path, "rb") as f: # Binary so the record= offset is exact
+        stat = os.fstat(f.fileno())
+        preset_data, record_offset = parse_preset_stream(f, file_name)
+    if preset_data is None:
+        return None
+
+    # --- Recorded type: keep a handle, the events are decoded on demand ---
+    if preset_data['type'] == "recorded":
+        if record_offset is not None and record_offset < stat.st_size:
+            preset_data['recorded_events'] = RecordedEventsHandle(
+                preset_path, record_offset, stat.st_mtime_ns, stat.st_size)
+        else:
+            print(f"Warning: 'record=' section missing or empty in recorded preset: {file_name}")
+
+    return preset_data
+
+
+def _apply_runtime_state(preset_data):
+    """ Overlays the journaled runtime state on a preset parsed from its file. """
+    state = preset_state.get(preset_data['file_name'])
+    if 'on_off_state' in state:
+        preset_data['on_off_state'] = state['on_off_state']
+    preset_data['last_run'] = state.get('last_run')
+    preset_data['run_count'] = state.get('run_count', 0)
+    return preset_data
+
+
+def set_on_off_state(file_name, state, runs=0):
+    """ Persists a toggle of an on/off preset (one small journal append, the file is untouched). """
+    return preset_state.set_on_off_state(file_name, state, runs)
+
+
+def record_preset_run(file_name):
+    """ Updates the last-run time and run count of a preset. """
+    return preset_state.record_run(file_name)
+
+
+def forget_preset_state(file_name):
+    """ Drops the journaled state of a preset removed outside the app (a new preset may reuse its name). """
+    return preset_state.forget(file_name)
+
+
+def forget_missing_preset_states(file_names):
+    """ Drops the journaled state of presets that are gone (e.g. deleted while the app was closed). """
+    count = preset_state.forget_missing(file_names)
+    if count:
+        print(f"Dropped the saved state of {count} missing preset(s).")
+
+
+# --- Preset metadata index ---
+# Parsed headers (and script bodies) of every preset file, keyed by file name
+# and validated against the file's mtime/size. load_presets only re-reads the
+# files whose stat changed; everything else comes straight from the index.
+PRESET_INDEX_VERSION = 4 # 2: speed/max_idle_gap, 3: loop_gap, 4: postprocess
+_INDEXED_FIELDS = ('title', 'type', 'icon', 'script', 'script_on', 'script_off', 'on_off_state', 'how_many',
+                   'speed', 'max_idle_gap', 'loop_gap', 'postprocess')
+
+
+def _load_preset_index():
+    """ Returns the cached {file_name: entry} index, or {} if missing/stale/corrupt. """
+    try:
+        with open(PRESET_INDEX_FILE, "r", encoding='utf-8') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable preset index {PRESET_INDEX_FILE}: {e}")
+        return {}
+    if (not isinstance(index, dict) or index.get('version') != PRESET_INDEX_VERSION
+            or index.get('folder') != PRESETS_FOLDER or not isinstance(index.get('files'), dict)):
+        return {}
+    return index['files']
+
+
+def _save_preset_index(entries):
+    """ Writes the index atomically (temp file + replace). Failures are only logged. """
+    tmp_path = f"{PRESET_INDEX_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            # dumps + one write is much faster than json.dump's chunked writes
+            f.write(json.dumps({'version': PRESET_INDEX_VERSION, 'folder': PRESETS_FOLDER, 'files': entries},
+                               separators=(',', ':')))
+        os.replace(tmp_path, PRESET_INDEX_FILE)
+    except OSError as e:
+        print(f"Warning: Could not write preset index {PRESET_INDEX_FILE}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _index_entry(preset_data, stat):
+    """ Builds the index entry for a freshly parsed file (preset_data None = malformed). """
+    entry = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'data': None}
+    if preset_data is not None:
+        data = {field: preset_data[field] for field in _INDEXED_FIELDS}
+        handle = preset_data.get('recorded_events')
+        data['record_offset'] = handle.offset if isinstance(handle, RecordedEventsHandle) else None
+        entry['data'] = data
+    return entry
+
+
+def _preset_from_index(entry, preset_path, file_name):
+    """ Rebuilds a preset dict from a valid index entry without opening the file. """
+    data = entry['data']
+    preset_data = {field: data[field] for field in _INDEXED_FIELDS}
+    preset_data['file_name'] = file_name
+    preset_data['recorded_events'] = None
+    if preset_data['type'] == "recorded" and data.get('record_offset') is not None:
+        preset_data['recorded_events'] = RecordedEventsHandle(
+            preset_path, data['record_offset'], entry['mtime_ns'], entry['size'])
+    return preset_data
+
+
+# --- Parallel loading ---
+# On network-mounted home directories, loading is dominated by per-file open
+# latency, so files that have to be (re)parsed can be read by a thread pool.
+# Results are put back in file-name order and errors stay per file.
+PARALLEL_LOAD = True # Set to False to always parse serially
+PARALLEL_LOAD_MIN_FILES = 16 # Below this many files to parse, a pool costs more than it saves
+PARALLEL_FILES_PER_WORKER = 32
+PARALLEL_MAX_WORKERS = 16
+
+
+def _load_worker_count(file_count, min_files=PARALLEL_LOAD_MIN_FILES):
+    """ Picks a thread pool size from the number of files to parse (1 means serial). """
+    if file_count < min_files:
+        return 1
+    return max(2, min(PARALLEL_MAX_WORKERS, -(-file_count // PARALLEL_FILES_PER_WORKER)))
+
+
+def _parse_for_load(job):
+    """ Parses one file for load_presets. Never raises: returns (preset_data, error, traceback). """
+    preset_path, file_name = job
+    try:
+        return _read_preset_file(preset_path, file_name), None, None
+    except Exception as e:
+        import traceback
+        return None, e, traceback.format_exc()
+
+
+def load_presets(parallel=None):
+    """
+    Loads all presets from the user's presets folder (recordings are loaded lazily).
+    parallel: None picks serial or a thread pool from the number of files to parse,
+    True/False forces it.
+    """
+    if using_preset_db():
+        return [_preset_from_db(*row) for row in get_preset_db().load_all()]
+
     presets = []
     # PRESETS_FOLDER now points to the user data directory
     if not os.path.exists(PRESETS_FOLDER):
@@ -102,153 +476,163 @@ def load_presets():
         os.makedirs(PRESETS_FOLDER, exist_ok=True)
         return presets # Return empty list if just created
 
-    for file_name in sorted(os.listdir(PRESETS_FOLDER)):
-        if file_name.endswith(".slaunch"):
-            preset_path = os.path.join(PRESETS_FOLDER, file_name)
-            try:
-                with open(preset_path, "r", encoding='utf-8') as f: # Specify encoding
-                    lines = f.readlines()
-
-                # Basic validation (at least title, type, icon)
-                if len(lines) < 3:
-                    print(f"Warning: Skipping malformed preset file (too short): {file_name}")
-                    continue
-
-                preset_data = {
-                    'file_name': file_name,
-                    'title': lines[0].strip().replace("title=", ""),
-                    'type': lines[1].strip().replace("type=", ""),
-                    'icon': lines[2].strip().replace("icon=", ""),
-                    # Initialize all possible fields
-                    'script': "",
-                    'script_on': "",
-                    'script_off': "",
-                    'on_off_state': False,
-                    # --- Remove record_path, add recorded_events ---
-                    # 'record_path': None,
-                    'recorded_events': None, # To store the parsed JSON data
-                    'how_many': 1
-                }
-
-                content_lines = lines[3:] # Content starts from the 4th line
-                current_section = None
-                json_lines = []
-                in_record_section = False
-
-                for i, line in enumerate(content_lines):
-                    stripped_line = line.strip()
-
-                    # --- Stop processing other sections if we hit the record marker ---
-                    if stripped_line == "record=":
-                        in_record_section = True
-                        current_section = None # Ensure no other section is active
-                        continue
-
-                    # --- If in record section, collect lines for JSON ---
-                    if in_record_section:
-                        json_lines.append(line) # Keep original lines including indentation/newlines
-                        continue
-
-                    # Detect section headers (only if not in record section)
-                    if stripped_line == "script=":
-                        current_section = "script"
-                        continue
-                    elif stripped_line == "script_on=":
-                        current_section = "script_on"
-                        continue
-                    elif stripped_line == "script_off=":
-                        current_section = "script_off"
-                        continue
-                    elif stripped_line.startswith("on_off_state="):
-                        preset_data['on_off_state'] = stripped_line.replace("on_off_state=", "") == "True"
-                        current_section = None
-                        continue
-                    elif stripped_line.startswith("how_many="):
-                        try:
-                            preset_data['how_many'] = int(stripped_line.replace("how_many=", ""))
-                        except ValueError:
-                            preset_data['how_many'] = 1 # Default if invalid
-                        current_section = None
-                        continue
-
-                    # Append line to the current section if it's active
-                    if current_section == "script":
-                        preset_data['script'] += line
-                    elif current_section == "script_on":
-                        preset_data['script_on'] += line
-                    elif current_section == "script_off":
-                        preset_data['script_off'] += line
-
-                # Strip trailing newlines from scripts
-                preset_data['script'] = preset_data['script'].rstrip('\n')
-                preset_data['script_on'] = preset_data['script_on'].rstrip('\n')
-                preset_data['script_off'] = preset_data['script_off'].rstrip('\n')
-
-                # --- Process collected JSON lines for recorded type ---
-                if preset_data['type'] == "recorded":
-                    if json_lines:
-                        json_string = "".join(json_lines)
-                        try:
-                            preset_data['recorded_events'] = json.loads(json_string)
-                            if not isinstance(preset_data['recorded_events'], list):
-                                 print(f"Warning: Parsed JSON for {file_name} is not a list. Resetting.")
-                                 preset_data['recorded_events'] = None
-                        except json.JSONDecodeError as e:
-                            print(f"Error decoding embedded JSON in {file_name}: {e}")
-                            preset_data['recorded_events'] = None # Set to None if JSON is invalid
-                    else:
-                        print(f"Warning: 'record=' section missing or empty in recorded preset: {file_name}")
-                        preset_data['recorded_events'] = None
-
-                presets.append(preset_data)
-            except Exception as e:
-                print(f"Error loading preset {file_name}: {e}")
-                import traceback
-                traceback.print_exc()
+    index = _load_preset_index()
+    new_index = {}
+
+    # One scandir pass gives the stat of every file; only changed files are opened
+    with os.scandir(PRESETS_FOLDER) as it:
+        entries = sorted((e for e in it if e.name.endswith(".slaunch")), key=lambda e: e.name)
+
+    slots = [] # In file-name order: preset dict from the index, or a pending parse job
+    jobs = [] # (preset_path, file_name) of the files that must be parsed
+    stats = {}
+    for dir_entry in entries:
+        file_name = dir_entry.name
+        preset_path = dir_entry.path
+        try:
+            if not dir_entry.is_file():
+                continue
+            stat = dir_entry.stat()
+            cached = index.get(file_name)
+            if cached and cached.get('mtime_ns') == stat.st_mtime_ns and cached.get('size') == stat.st_size:
+                new_index[file_name] = cached
+                if cached['data'] is not None:
+                    slots.append(_preset_from_index(cached, preset_path, file_name))
+                continue
+            stats[file_name] = stat
+            slots.append(len(jobs)) # Placeholder: index into jobs
+            jobs.append((preset_path, file_name))
+        except Exception as e:
+            print(f"Error loading preset {file_name}: {e}")
+            import traceback
+            traceback.print_exc()
+
+    workers = 1
+    if parallel or (parallel is None and PARALLEL_LOAD):
+        # Forcing parallel mode skips the small-folder threshold
+        workers = _load_worker_count(len(jobs), min_files=2 if parallel else PARALLEL_LOAD_MIN_FILES)
+    if workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="PresetLoad") as pool:
+            results = list(pool.map(_parse_for_load, jobs)) # map() keeps the input order
+    else:
+        results = [_parse_for_load(job) for job in jobs]
+
+    for slot in slots:
+        if not isinstance(slot, int):
+            presets.append(_apply_runtime_state(slot))
+            continue
+        preset_path, file_name = jobs[slot]
+        preset_data, error, error_traceback = results[slot]
+        if error is not None:
+            print(f"Error loading preset {file_name}: {error}")
+            print(error_traceback, end="")
+            continue
+        new_index[file_name] = _index_entry(preset_data, stats[file_name])
+        if preset_data is not None:
+            presets.append(_apply_runtime_state(preset_data))
+
+    if new_index != index:
+        _save_preset_index(new_index)
     return presets
 
 
-def save_preset(preset_data):
-    """ Saves a single preset data dictionary to the user's .slaunch file. """ # <-- Docstring updated
+def load_preset(file_name):
+    """ Loads a single preset from the user's presets folder, or returns None. """
+    if using_preset_db():
+        row = get_preset_db().load(file_name)
+        return _preset_from_db(*row) if row is not None else None
+    preset_path = os.path.join(PRESETS_FOLDER, file_name)
+    try:
+        preset_data = _read_preset_file(preset_path, file_name)
+        return _apply_runtime_state(preset_data) if preset_data is not None else None
+    except FileNotFoundError:
+        print(f"Preset not found: {preset_path}")
+    except Exception as e:
+        print(f"Error loading preset {file_name}: {e}")
+    return None
+
+
+def assign_preset_file_name(preset_data, reserved=()):
+    """ Gives a new preset a free 'presetN.slaunch' name (also avoiding names in `reserved`). """
     file_name = preset_data.get('file_name')
-    is_new = not file_name
-    if is_new:
+    if not file_name:
         # Generate a new file name if one doesn't exist in the user's folder
-        existing = [f for f in os.listdir(PRESETS_FOLDER) if f.endswith(".slaunch")]
+        if using_preset_db():
+            existing = get_preset_db().file_names()
+        else:
+            existing = {f for f in os.listdir(PRESETS_FOLDER) if f.endswith(".slaunch")}
+        existing.update(reserved)
         next_index = 1
         while f"preset{next_index}.slaunch" in existing:
             next_index += 1
         file_name = f"preset{next_index}.slaunch"
         preset_data['file_name'] = file_name # Update the dict with the new name
+    return file_name
+
 
+def serialize_preset(preset_data):
+    """ Returns the .slaunch text of a preset (loads a lazy recording if needed). """
+    recorded_events = get_recording_to_save(preset_data) if preset_data.get('type') == "recorded" else None
+    buf = io.StringIO()
+    _write_preset(buf, preset_data, recorded_events)
+    return buf.getvalue()
+
+
+def write_preset_text(file_name, text):
+    """
+    Atomically replaces a preset file with `text`: write + fsync a temp file next
+    to it, then os.replace. A crash leaves either the old or the new file, never
+    a truncated one. Returns the os.stat_result of the new file.
+    """
+    return _replace_preset_file(file_name, lambda f: f.write(text))
+
+
+def write_preset_file(file_name, preset_data):
+    """
+    Same as write_preset_text(file_name, serialize_preset(preset_data)), but the
+    preset is written straight into the temp file: a SpilledRecording goes from
+    its segment file to the preset without the text being built in memory.
+    """
+    recorded_events = get_recording_to_save(preset_data) if preset_data.get('type') == "recorded" else None
+    return _replace_preset_file(file_name, lambda f: _write_preset(f, preset_data, recorded_events))
+
+
+def _replace_preset_file(file_name, write):
+    """ write(f) into a temp file, fsync, os.replace (see write_preset_text). Returns the new os.stat_result. """
+    preset_path = os.path.join(PRESETS_FOLDER, file_name)
+    tmp_path = f"{preset_path}.{threading.get_ident()}.tmp" # Not *.slaunch, so never listed
+    try:
+        with open(tmp_path, "w", encoding='utf-8') as f: # Specify encoding
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, preset_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return os.stat(preset_path)
+
+
+def save_preset(preset_data):
+    """ Saves a single preset data dictionary to the user's .slaunch file (blocking). """
+    file_name = assign_preset_file_name(preset_data)
     # PRESETS_FOLDER now points to the user data directory
     preset_path = os.path.join(PRESETS_FOLDER, file_name)
 
     try:
-        with open(preset_path, "w", encoding='utf-8') as f: # Specify encoding
-            f.write(f"title={preset_data.get('title', '')}\n")
-            f.write(f"type={preset_data.get('type', 'standard')}\n")
-            f.write(f"icon={preset_data.get('icon', 'none')}\n")
-
-            preset_type = preset_data.get('type')
-            if preset_type == "on_off":
-                f.write(f"script_on=\n{preset_data.get('script_on', '')}\n")
-                f.write(f"script_off=\n{preset_data.get('script_off', '')}\n")
-                f.write(f"on_off_state={preset_data.get('on_off_state', False)}\n")
-            elif preset_type == "recorded":
-                f.write(f"script=\n") # Empty script section for recorded type
-                f.write(f"how_many={preset_data.get('how_many', 1)}\n")
-                # --- Embed JSON data ---
-                f.write("record=\n") # Marker for embedded JSON
-                recorded_events = preset_data.get('recorded_events')
-                if recorded_events and isinstance(recorded_events, list):
-                    json.dump(recorded_events, f, indent=2) # Write JSON with indentation
-                    f.write("\n") # Add a final newline for clarity
-                else:
-                    f.write("[]\n") # Write empty JSON array if no data
-            else: # Standard
-                f.write(f"script=\n{preset_data.get('script', '')}\n")
+        if using_preset_db():
+            store_preset_in_db(preset_data)
+            preset_path = f"{PRESET_DB_FILE}:{file_name}"
+        else:
+            write_preset_file(file_name, preset_data)
 
+        if preset_data.get('type') == "on_off":
+            # The file now holds the state chosen in the dialog; keep the journal in line
+            set_on_off_state(file_name, preset_data.get('on_off_state', False))
         print(f"Preset saved: {preset_path}") # Path is now user-specific
         return True, preset_data
     except Exception as e:
@@ -258,13 +642,99 @@ def save_preset(preset_data):
         return False, error_message # Return failure and the error message
 
 
+def _write_preset(f, preset_data, recorded_events):
+    """ Writes a preset in .slaunch format to an open text file. """
+    f.write(f"title={preset_data.get('title', '')}\n")
+    f.write(f"type={preset_data.get('type', 'standard')}\n")
+    f.write(f"icon={preset_data.get('icon', 'none')}\n")
+
+    preset_type = preset_data.get('type')
+    if preset_type == "on_off":
+        f.write(f"script_on=\n{preset_data.get('script_on', '')}\n")
+        f.write(f"script_off=\n{preset_data.get('script_off', '')}\n")
+        f.write(f"on_off_state={preset_data.get('on_off_state', False)}\n")
+    elif preset_type == "recorded":
+        f.write(f"script=\n") # Empty script section for recorded type
+        f.write(f"how_many={preset_data.get('how_many', 1)}\n")
+        f.write(f"speed={float(preset_data.get('speed', 1.0))}\n")
+        f.write(f"max_idle_gap={float(preset_data.get('max_idle_gap', 0.0))}\n")
+        f.write(f"loop_gap={float(preset_data.get('loop_gap', -1.0))}\n")
+        f.write(f"postprocess={preset_data.get('postprocess', '')}\n")
+        # --- Embed recorded events (packed when possible, JSON otherwise) ---
+        f.write("record=\n") # Marker for embedded recording
+        if recorded_events:
+            write_record_section(f, recorded_events)
+        else:
+            f.write("[]\n") # Write empty JSON array if no data
+    else: # Standard
+        f.write(f"script=\n{preset_data.get('script', '')}\n")
+
+
+def export_preset_file(preset_data, dest_path):
+    """
+    Exports a preset to dest_path as a standalone .slaunch file.
+    On/off presets are re-serialized so the file carries the current (journaled)
+    state; other types are copied as-is (or written from the SQLite store).
+    """
+    source_path = os.path.join(PRESETS_FOLDER, preset_data['file_name'])
+    if using_preset_db():
+        with open(dest_path, "w", encoding='utf-8') as f:
+            f.write(serialize_preset(preset_data))
+    elif preset_data.get('type') == "on_off":
+        with open(dest_path, "w", encoding='utf-8') as f:
+            _write_preset(f, preset_data, None)
+    else:
+        shutil.copy2(source_path, dest_path)
+
+
+def import_preset_file(source_path):
+    """
+    Imports a standalone .slaunch file under a free name (name_1.slaunch, ...).
+    Returns the new file name; raises on failure.
+    """
+    base_name = os.path.basename(source_path)
+    name, ext = os.path.splitext(base_name)
+    if using_preset_db():
+        with open(source_path, "rb") as f:
+            preset_data, recording = read_slaunch_for_db(f, base_name)
+        if preset_data is None:
+            raise ValueError(f"'{base_name}' is not a valid preset file.")
+        db = get_preset_db()
+        existing = db.file_names()
+        file_name, count = base_name, 1
+        while file_name in existing:
+            file_name = f"{name}_{count}{ext}"
+            count += 1
+        preset_data['file_name'] = file_name
+        db.save(preset_data, recording)
+        print(f"Imported '{source_path}' into the preset store as '{file_name}'")
+        return file_name
+
+    dest_path = os.path.join(PRESETS_FOLDER, base_name)
+    count = 1
+    while os.path.exists(dest_path):
+        dest_path = os.path.join(PRESETS_FOLDER, f"{name}_{count}{ext}")
+        count += 1
+    shutil.copy2(source_path, dest_path)
+    print(f"Imported '{source_path}' to '{dest_path}'")
+    return os.path.basename(dest_path)
+
+
 def delete_preset(file_name):
     """ Deletes a preset file from the user's presets folder. """ # <-- Docstring updated
     # PRESETS_FOLDER now points to the user data directory
     preset_path = os.path.join(PRESETS_FOLDER, file_name)
     try:
+        if using_preset_db():
+            if get_preset_db().delete(file_name):
+                preset_state.forget(file_name)
+                print(f"Preset deleted from the preset store: {file_name}")
+                return True
+            print(f"Preset not found for deletion: {file_name}")
+            return False
         if os.path.exists(preset_path):
             os.remove(preset_path)
+            preset_state.forget(file_name)
             print(f"Preset deleted: {preset_path}") # Path is now user-specific
             return True
         else: